@@ -0,0 +1,199 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from auth import AuthKeyError
+from bulk import BulkSummary, run_windowed
+from retry import PHOTO_RETRY_STATUSES
+
+# Методы PetFriends, создающие питомца (его id запоминается за создавшей записью),
+# и методы, первым аргументом после ключа принимающие id питомца: они идут записи-владельцу
+CREATE_METHODS = ('post_new_pet', 'post_new_pet_simple')
+PET_METHODS = ('put_update_pet', 'delete_pet', 'post_add_photo')
+
+
+class NoAccountAvailable(RuntimeError):
+    """ В пуле не нашлось учётной записи, готовой принять запрос, за отведённое время """
+
+
+class Account:
+    """ Учётная запись пула: свой клиент PetFriends (а значит, свой транспорт и пул соединений),
+    свой кэшированный ключ api (auth.Credential) и своя статистика запросов (bulk.BulkSummary) """
+
+    def __init__(self, email: str, password: str, client):
+        self.email = email
+        self.client = client
+        self.credential = client.credential(email, password)
+        self.summary = BulkSummary()
+        self.in_flight = 0
+        self.failures = 0
+        self.rotations = 0
+        self.cooldown_until = 0.0
+
+    def available(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+    def as_dict(self) -> dict:
+        stats = self.summary.as_dict()
+        stats.update(in_flight=self.in_flight, rotations=self.rotations,
+                     cooldown=max(0.0, self.cooldown_until - time.monotonic()), keys=self.credential.stats)
+        return stats
+
+    def __repr__(self):
+        return 'Account(%r)' % self.email
+
+
+class AccountPool:
+    """ Пул учётных записей, по которым распределяются запросы, чтобы не упираться в лимиты сервера
+    на одного пользователя. accounts - [(email, password), ...], по умолчанию settings.load_accounts().
+    Для каждой записи создаётся свой клиент client_factory() (по умолчанию PetFriends(base_url)
+    со своим HttpTransport), поэтому ключи и соединения разных записей не смешиваются.
+    Запрос получает запись с наименьшим числом выполняющихся запросов (при равенстве - с меньшим
+    числом выполненных). Питомец принадлежит записи, которая его создала: пул запоминает id питомцев,
+    созданных через call/run, и отправляет put_update_pet, delete_pet и post_add_photo для них
+    записи-владельцу. Запись, не сумевшая получить ключ или получившая 403 (Credential к этому моменту
+    уже обновил ключ, значит, сервер отвергает саму запись), сразу выводится из ротации на cooldown
+    секунд. Исключение - 403 на питомца, которого пул не создавал: это ответ про чужого питомца.
+    После max_failures ошибок подряд (исключение или 5xx, кроме 500 на не-картинку в set_photo)
+    запись тоже выводится из ротации. Когда нужные записи на паузе, запрос ждёт ближайшую, но не дольше
+    timeout секунд (None - без ограничения), иначе выбрасывается NoAccountAvailable """
+
+    def __init__(self, accounts=None, base_url: str = None, client_factory=None, cooldown: float = 30.0,
+                 max_failures: int = 3, timeout: float = None):
+        if accounts is None:
+            from settings import load_accounts
+            accounts = load_accounts()
+        if client_factory is None:
+            from api import PetFriends
+
+            def client_factory():
+                return PetFriends(base_url)
+        self.cooldown = cooldown
+        self.max_failures = max_failures
+        self.timeout = timeout
+        self.accounts = [Account(email, password, client_factory()) for email, password in accounts]
+        if not self.accounts:
+            raise ValueError('пул учётных записей пуст')
+        self._condition = threading.Condition()
+        self._owners = {}
+
+    def owner_of(self, pet_id: str):
+        """ Запись, создавшая питомца pet_id через пул, или None, если пул его не создавал """
+        with self._condition:
+            return self._owners.get(pet_id)
+
+    def _pick(self, now: float, candidates: list):
+        ready = [account for account in candidates if account.available(now)]
+        if not ready:
+            return None
+        return min(ready, key=lambda account: (account.in_flight, account.summary.total))
+
+    @contextmanager
+    def acquire(self, timeout: float = None, account: Account = None):
+        """ Выдаёт наименее загруженную запись (или именно account, когда она не на паузе) на время блока with """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        candidates = self.accounts if account is None else [account]
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                account = self._pick(now, candidates)
+                if account is not None:
+                    account.in_flight += 1
+                    break
+                delay = min(account.cooldown_until for account in candidates) - now
+                if deadline is not None:
+                    if now >= deadline:
+                        raise NoAccountAvailable('все учётные записи выведены из ротации')
+                    delay = min(delay, deadline - now)
+                self._condition.wait(delay)
+        try:
+            yield account
+        finally:
+            with self._condition:
+                account.in_flight -= 1
+                self._condition.notify()
+
+    def report(self, account: Account, method: str, status, error: Exception = None, owned: bool = False):
+        """ Учитывает исход вызова method записи account и при необходимости выводит её из ротации.
+        owned - для методов PET_METHODS: питомец создан этой записью через пул """
+        if method == 'post_add_photo' and status is not None and status >= 500:
+            server_error = status in PHOTO_RETRY_STATUSES
+        else:
+            server_error = status is not None and status >= 500
+        with self._condition:
+            if isinstance(error, AuthKeyError):
+                self._rotate_out(account)
+            elif status == 403:
+                if method not in PET_METHODS or owned:
+                    self._rotate_out(account)
+            elif error is not None or status is None or server_error:
+                account.failures += 1
+                if account.failures >= self.max_failures:
+                    self._rotate_out(account)
+            else:
+                account.failures = 0
+
+    def _rotate_out(self, account: Account):
+        account.cooldown_until = time.monotonic() + self.cooldown
+        account.failures = 0
+        account.rotations += 1
+
+    def call(self, method: str, *args, **kwargs) -> tuple:
+        """ Вызывает метод PetFriends method от имени наименее загруженной записи или, для метода
+        из PET_METHODS, владельца питомца args[0]: ключ подставляется первым аргументом, остальные
+        аргументы передаются как есть. Возвращает (status, result) """
+        owner = self.owner_of(args[0]) if method in PET_METHODS and args else None
+        with self.acquire(account=owner) as account:
+            return self._call(account, method, *args, **kwargs)
+
+    def _call(self, account: Account, method: str, *args, **kwargs) -> tuple:
+        owned = method in PET_METHODS and bool(args) and self.owner_of(args[0]) is account
+        started = time.perf_counter()
+        try:
+            status, result = getattr(account.client, method)(account.credential, *args, **kwargs)
+        except Exception as e:
+            account.summary.add(None, time.perf_counter() - started, e)
+            self.report(account, method, None, e, owned)
+            raise
+        account.summary.add(status, time.perf_counter() - started)
+        self.report(account, method, status, owned=owned)
+        if status == 200:
+            with self._condition:
+                if method in CREATE_METHODS and isinstance(result, dict) and 'id' in result:
+                    self._owners[result['id']] = account
+                elif method == 'delete_pet':
+                    self._owners.pop(args[0], None)
+        return status, result
+
+    def run(self, calls, workers: int = None, window: int = None):
+        """ Выполняет вызовы calls - (method, args) или (method, args, kwargs) - в пуле из workers потоков
+        (по умолчанию 4 на запись) и отдаёт (method, args, status, result) по мере завершения.
+        Ошибка отдельного вызова не останавливает остальные: status = None, в result - исключение.
+        Входные данные читаются лениво, окнами по window вызовов """
+        def run_one(call):
+            method, args, kwargs = call if len(call) == 3 else (call[0], call[1], {})
+            try:
+                return self.call(method, *args, **kwargs)
+            except Exception as e:
+                return None, e
+
+        for _, call, result in run_windowed(run_one, calls, workers or 4 * len(self.accounts), window,
+                                            thread_name_prefix='account-pool'):
+            yield (call[0], call[1]) + result
+
+    def stats(self) -> dict:
+        """ Статистика по записям: {email: {total, ok, errors, throughput, p50, p99, in_flight, rotations,
+        cooldown, keys}} """
+        with self._condition:
+            return {account.email: account.as_dict() for account in self.accounts}
+
+    def close(self):
+        for account in self.accounts:
+            account.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,14 +1,184 @@
-import requests
 import json
-from requests_toolbelt.multipart.encoder import MultipartEncoder
+import os
+import time
+
+from auth import AuthKeyCache, Credential
+from instrumentation import TimingRecord, body_size
+from ratelimit import endpoint_of
+from responses import check_mode, discard, read_result
+from transport import HttpTransport
+from uploads import open_photo
 
 
 class PetFriends:
     """ библиотека API к приложению PetFriends """
-    def __init__(self):
-        self.base_url = 'https://petfriends.skillfactory.ru/'
+    def __init__(self, base_url: str = None, transport=None, retry=None, rate_limiter=None, preprocessor=None,
+                 result_mode: str = 'json'):
+        """ base_url по умолчанию берётся из переменной окружения PETFRIENDS_BASE_URL, а без неё -
+        https://petfriends.skillfactory.ru/.
+        transport - объект с методом request(method, url, **kwargs), возвращающий ответ
+        с интерфейсом requests.Response. По умолчанию создаётся HttpTransport с пулом keep-alive
+        соединений, в тестах вместо него можно передать заглушку.
+        retry - retry.RetryPolicy с повторами, паузами и автоматом-предохранителем; без неё
+        каждый запрос отправляется один раз, как раньше.
+        rate_limiter - ratelimit.RateLimiter, ограничивающий частоту запросов по эндпоинтам.
+        preprocessor - imaging.PhotoPreprocessor: фото для post_new_pet и post_add_photo уменьшаются
+        и перекодируются перед отправкой, повторно загружаемые фото берутся из его кэша.
+        result_mode - как методы разбирают ответ по умолчанию (responses.RESULT_MODES): 'json' - сразу,
+        'lazy' - при первом обращении, 'bytes' - не разбирать, 'status' - не читать тело вовсе;
+        каждый метод принимает и свой result_mode """
+        self.base_url = base_url or os.environ.get('PETFRIENDS_BASE_URL', 'https://petfriends.skillfactory.ru/')
+        self.transport = transport if transport is not None else HttpTransport()
+        self.retry = retry
+        self.rate_limiter = rate_limiter
+        self.preprocessor = preprocessor
+        self.result_mode = check_mode(result_mode)
+        self.keys = AuthKeyCache(self)
+        self._hooks = ()
+
+    def add_hook(self, hook):
+        """ Регистрирует hook(record) - функцию, которая получает instrumentation.TimingRecord
+        после каждого HTTP-запроса (включая повторы). Пока хуков нет, время не замеряется """
+        self._hooks = self._hooks + (hook,)
+
+    def remove_hook(self, hook):
+        self._hooks = tuple(h for h in self._hooks if h is not hook)
+
+    def credential(self, email: str = None, password: str = None) -> Credential:
+        """ Возвращает кэшируемые учётные данные (по умолчанию - из settings.py), которые можно
+        передавать в любой метод вместо auth_key: ключ api запрашивается один раз и обновляется
+        автоматически, когда сервер отвечает 403 """
+        return self.keys.get(email, password)
+
+    def close(self):
+        """ Закрывает соединения транспорта """
+        self.transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
-    def get_api_key(self, email: str, password: str) -> json:
+    def _request(self, method: str, path: str, auth_key=None, headers: dict = None, data=None,
+                 result_mode: str = None, as_models: bool = False, **kwargs):
+        """ Отправляет запрос к base_url + path через транспорт клиента и возвращает ответ, а если задан
+        result_mode - пару (status, result), разобранную responses.read_result (время разбора попадает
+        в фазу decode записи TimingRecord).
+        auth_key - словарь {'key': ...} из get_api_key либо Credential; в случае Credential
+        на ответ 403 ключ обновляется и запрос повторяется один раз.
+        data может быть функцией без аргументов, собирающей тело заново для каждой попытки
+        (нужно для MultipartEncoder, который читается только один раз).
+        Повторы после 5xx и обрывов соединения выполняются по политике self.retry """
+        policy = self.retry
+        attempt = 0
+        refreshed = False
+        if result_mode is not None and check_mode(result_mode) == 'status':
+            kwargs['stream'] = True
+        while True:
+            attempt += 1
+            hooks = self._hooks
+            started = time.perf_counter() if hooks else None
+            request_headers = dict(headers or {})
+            if isinstance(auth_key, Credential):
+                key = auth_key.key()
+            else:
+                key = auth_key['key'] if auth_key is not None else None
+            if key is not None:
+                request_headers['auth_key'] = key
+            body = data() if callable(data) else data
+            if hasattr(body, 'content_type'):
+                request_headers['Content-Type'] = body.content_type
+
+            trial = policy.before_request(attempt) if policy is not None else False
+            prepared = time.perf_counter() if hooks else None
+            waited = 0.0
+            try:
+                waited = self.rate_limiter.acquire(path) if self.rate_limiter is not None else 0.0
+                res = self.transport.request(method, self.base_url + path, headers=request_headers, data=body,
+                                             **kwargs)
+            except OSError as e:
+                if hooks:
+                    self._emit(hooks, method, path, attempt, (started, prepared, waited), body, error=e)
+                # Исключения requests (ConnectionError, Timeout) - тоже наследники OSError
+                if policy is None:
+                    raise
+                policy.record(error=e, path=path)
+                if not policy.should_retry(method, path, attempt, error=e):
+                    raise
+                policy.wait(attempt)
+                continue
+            except BaseException:
+                # Пробный запрос полуоткрытого автомата не получил ни ответа, ни обрыва соединения
+                # (CassetteMiss, ошибка ограничителя, KeyboardInterrupt): место для пробы освобождается,
+                # иначе автомат навсегда остался бы без пробного запроса
+                if trial:
+                    policy.release_trial()
+                raise
+
+            retry = False
+            if policy is not None:
+                policy.record(status=res.status_code, path=path)
+                retry = policy.should_retry(method, path, attempt, status=res.status_code)
+            refresh = not retry and res.status_code == 403 and isinstance(auth_key, Credential) and not refreshed
+            if retry or refresh or result_mode is None:
+                if (retry or refresh) and kwargs.get('stream'):
+                    discard(res)
+                if hooks:
+                    self._emit(hooks, method, path, attempt, (started, prepared, waited), body, res=res,
+                               streamed=kwargs.get('stream', False))
+                if retry:
+                    policy.wait(attempt, res.headers.get('Retry-After'))
+                    continue
+                if refresh:
+                    refreshed = True
+                    auth_key.refresh(key)
+                    continue
+                return res
+
+            received = time.perf_counter() if hooks else None
+            result = read_result(res, result_mode, as_models)
+            if hooks:
+                self._emit(hooks, method, path, attempt, (started, prepared, waited), body, res=res,
+                           streamed=kwargs.get('stream', False), received=received)
+            return res.status_code, result
+
+    @staticmethod
+    def _emit(hooks, method: str, path: str, attempt: int, timings: tuple, body, res=None, error=None,
+              streamed: bool = False, received: float = None):
+        """ Собирает TimingRecord по отметкам времени из _request и передаёт его хукам.
+        received - момент получения ответа перед разбором тела (для фазы decode) """
+        finished = time.perf_counter()
+        started, prepared, waited = timings
+        decode = finished - received if received is not None else 0.0
+        finished -= decode
+        record = TimingRecord(method, endpoint_of(path), path, attempt, time.time() - (finished - started))
+        record.total = finished - started
+        record.bytes_sent = body_size(body)
+        exchange = finished - prepared - waited
+        request = exchange
+        if res is not None:
+            record.status = res.status_code
+            elapsed = getattr(res, 'elapsed', None)
+            if elapsed:
+                request = min(exchange, elapsed.total_seconds())
+            if streamed:
+                record.bytes_received = int(res.headers.get('Content-Length') or 0)
+            else:
+                record.bytes_received = len(res.content)
+        else:
+            record.error = type(error).__name__
+        record.total += decode
+        record.phases = {'prepare': prepared - started, 'rate_limit': waited, 'request': request,
+                         'download': exchange - request, 'decode': decode}
+        for hook in hooks:
+            try:
+                hook(record)
+            except Exception:
+                import logging
+                logging.getLogger(__name__).exception('ошибка в хуке %r', hook)
+
+    def get_api_key(self, email: str, password: str, result_mode: str = None) -> json:
         """ Метод делает запрос к API сервера и возвращает статус запроса, а также результат в формате
         json с уникальным ключом пользователя, найденного по указанным email и password"""
 
@@ -16,117 +186,116 @@ class PetFriends:
             'email': email,
             'password': password
         }
-        res = requests.get(self.base_url+'api/key', headers=headers)
-        status = res.status_code
-        result = ""
-        try:
-            result = res.json()
-        except json.decoder.JSONDecodeError:
-            result = res.text
-        return status, result
+        return self._request('GET', 'api/key', headers=headers, result_mode=result_mode or self.result_mode)
 
-    def get_list_of_pets(self, auth_key: json, filter: str = '') -> json:
+    def get_list_of_pets(self, auth_key: json, filter: str = '', as_models: bool = False,
+                         result_mode: str = None) -> json:
         """Метод делает запрос к API сервера и возвращает статус запроса, а также результат в формате json
         со списком найденных питомцев, совпадающих с фильтром. На данный момент фильтр может иметь либо
-        пустое значение - получить список всех питомцев. Либо 'my_pets' - получить список собственных питомцев"""
+        пустое значение - получить список всех питомцев. Либо 'my_pets' - получить список собственных питомцев.
+        При as_models=True вместо json возвращается models.PetList из компактных объектов Pet"""
 
-        headers = {'auth_key': auth_key['key']}
         filter = {'filter': filter}
 
-        res = requests.get(self.base_url + 'api/pets', headers=headers, params=filter)
-        status = res.status_code
-        result = ""
+        return self._request('GET', 'api/pets', auth_key=auth_key, params=filter,
+                             result_mode=result_mode or self.result_mode, as_models=as_models)
+
+    def iter_pets(self, auth_key: json, filter: str = '', predicate=None, as_models: bool = False,
+                  chunk_size: int = 64 * 1024):
+        """ Генератор питомцев из api/pets по одному: тело ответа читается кусками по chunk_size
+        и разбирается по мере поступления, поэтому первый питомец доступен до загрузки всего списка,
+        а память не растёт с его длиной. filter передаётся серверу ('' или 'my_pets'; постраничной
+        выдачи API не поддерживает), predicate(pet) отбирает питомцев на стороне клиента.
+        as_models=True - отдавать models.Pet вместо dict. Если сервер ответил не 200,
+        выбрасывается streaming.PetListingError """
+        from models import Pet
+        from streaming import PetListingError, iter_json_items
+
+        res = self._request('GET', 'api/pets', auth_key=auth_key, params={'filter': filter}, stream=True)
         try:
-            result = res.json()
-        except json.decoder.JSONDecodeError:
-            result = res.text
-        return status, result
+            if res.status_code != 200:
+                raise PetListingError(res.status_code, res.text)
+            for pet in iter_json_items(res.iter_content(chunk_size), 'pets'):
+                if as_models:
+                    pet = Pet.from_dict(pet)
+                if predicate is None or predicate(pet):
+                    yield pet
+        finally:
+            res.close()
 
-    def post_new_pet(self, auth_key: json, name: str, animal_type: str, age: str, pet_photo: str) -> json:
+    def post_new_pet(self, auth_key: json, name: str, animal_type: str, age: str, pet_photo: str,
+                     progress=None, result_mode: str = None) -> json:
         """Метод посылает на API сервера POST-запрос, принимает в поле 'data' параметры питомца:
           кличку, вид животного, возраст, в заголовках - аутентификационный ключ, в файлах отправляет
-        фотографию животного. Возвращает статус-код запроса и отправленные данные питомца в формате json"""
+        фотографию животного. Возвращает статус-код запроса и отправленные данные питомца в формате json.
+        pet_photo - путь к файлу, bytes/memoryview, открытый файл или uploads.PhotoUpload; фото
+        отправляется потоком, тип содержимого определяется по файлу. progress(sent, total, elapsed) -
+        необязательная функция для отслеживания загрузки"""
 
         # data = {'name': name,
         #         'animal_type': animal_type,
         #         'age': age,
         #         }
-        data = MultipartEncoder(
-            fields={
-                'name': name,
-                'animal_type': animal_type,
-                'age': age,
-                'pet_photo': (pet_photo, open(pet_photo, 'rb'), 'image/jpeg')
-            })
-
-        headers = {'auth_key': auth_key['key'], 'Content-Type': data.content_type}
-        # file = {'pet_photo': (pet_photo, open(pet_photo, 'rb'), 'image/jpg')}
+        owned = self.preprocessor is not None
+        if owned:
+            pet_photo = self.preprocessor.prepare(pet_photo)
+        from requests_toolbelt.multipart.encoder import MultipartEncoder
 
-        res = requests.post(self.base_url + 'api/pets', headers=headers, data=data)
+        with open_photo(pet_photo, progress, owned) as photo:
+            def data():
+                photo.rewind()
+                return MultipartEncoder(
+                    fields={
+                        'name': name,
+                        'animal_type': animal_type,
+                        'age': age,
+                        'pet_photo': photo.field()
+                    })
 
-        status = res.status_code
-        result = ""
-        try:
-            result = res.json()
-        except json.decoder.JSONDecodeError:
-            result = res.text
-        return status, result
+            return self._request('POST', 'api/pets', auth_key=auth_key, data=data,
+                                 result_mode=result_mode or self.result_mode)
 
-    def put_update_pet(self, auth_key: json, pet_id: str, name: str, animal_type: str, age: int) -> json:
+    def put_update_pet(self, auth_key: json, pet_id: str, name: str, animal_type: str, age: int,
+                       result_mode: str = None) -> json:
         """Метод отправляет запрос на сервер об обновлении данных питомца по указанному ID и
         возвращает статус запроса и result в формате JSON с обновлёнными данными питомца"""
 
         data = dict(name=name, animal_type=animal_type, age=age)
-        headers = {'auth_key': auth_key['key'], 'pet_id': pet_id}
-
-        res = requests.put(self.base_url + 'api/pets/' + pet_id, headers=headers, data=data)
-        status = res.status_code
-        result = ""
-        try:
-            result = res.json()
-        except json.decoder.JSONDecodeError:
-            result = res.text
+        headers = {'pet_id': pet_id}
 
-        return status, result
+        return self._request('PUT', 'api/pets/' + pet_id, auth_key=auth_key, headers=headers, data=data,
+                             result_mode=result_mode or self.result_mode)
 
-    def delete_pet(self, auth_key: json, pet_id: str) -> json:
+    def delete_pet(self, auth_key: json, pet_id: str, result_mode: str = None) -> json:
         """Метод отправляет на сервер запрос на удаление питомца по указаному ID и возвращает
         статус запроса и результат в формате JSON с текстом уведомления об успешном удалении.
         На сегодняшний день тут есть баг - в result приходит пустая строка, но status при этом = 200"""
-        headers = {'auth_key': auth_key['key']}
-        res = requests.delete(self.base_url + 'api/pets/' + pet_id, headers=headers)
-        status = res.status_code
+        return self._request('DELETE', 'api/pets/' + pet_id, auth_key=auth_key,
+                             result_mode=result_mode or self.result_mode)
 
-        result = ""
-        try:
-            result = res.json()
-        except json.decoder.JSONDecodeError:
-            result = res.text
-
-        return status, result
-
-    def post_add_photo(self, auth_key: json, pet_id: str, pet_photo: str) -> json:
+    def post_add_photo(self, auth_key: json, pet_id: str, pet_photo: str, progress=None,
+                       result_mode: str = None) -> json:
         """ Метод отправляет на сервер фото и добавляет его в карточку ранее созданного питомца.
-        Возвращает статус запроса и данные питомца в json"""
+        Возвращает статус запроса и данные питомца в json. pet_photo и progress - как в post_new_pet"""
 
-        data = MultipartEncoder(
-            fields={
-                'pet_photo': (pet_photo, open(pet_photo, 'rb'), 'image/jpeg')
-            })
-        headers = {'auth_key': auth_key['key'], 'Content-Type': data.content_type}
-        # file = {'pet_photo': (pet_photo, open(pet_photo, 'rb'), 'image/jpg')}
+        owned = self.preprocessor is not None
+        if owned:
+            pet_photo = self.preprocessor.prepare(pet_photo)
+        from requests_toolbelt.multipart.encoder import MultipartEncoder
 
-        res = requests.post(self.base_url + 'api/pets/set_photo/' + pet_id, headers=headers, data=data)
-        status = res.status_code
+        with open_photo(pet_photo, progress, owned) as photo:
+            def data():
+                photo.rewind()
+                return MultipartEncoder(
+                    fields={
+                        'pet_photo': photo.field()
+                    })
 
-        result = ""
-        try:
-            result = res.json()
-        except json.decoder.JSONDecodeError:
-            result = res.text
-        return status, result
+            return self._request('POST', 'api/pets/set_photo/' + pet_id, auth_key=auth_key, data=data,
+                                 result_mode=result_mode or self.result_mode)
 
-    def post_new_pet_simple(self, auth_key: json, name: str, animal_type: str, age: str) -> json:
+    def post_new_pet_simple(self, auth_key: json, name: str, animal_type: str, age: str,
+                            result_mode: str = None) -> json:
         """Метод посылает на API сервера POST-запрос на создание нового питомца без фото.
           Возвращает статус-код запроса и отправленные данные питомца в формате json"""
 
@@ -143,16 +312,8 @@ class PetFriends:
         #         'pet_photo': (pet_photo, open(pet_photo, 'rb'), 'image/jpeg')
         #     })
         data = {'name': name, 'animal_type': animal_type, 'age': age}
-        headers = {'auth_key': auth_key['key']}
-
-        res = requests.post(self.base_url + 'api/create_pet_simple', headers=headers, data=data)
 
-        status = res.status_code
-        result = ""
-        try:
-            result = res.json()
-        except json.decoder.JSONDecodeError:
-            result = res.text
-        return status, result
+        return self._request('POST', 'api/create_pet_simple', auth_key=auth_key, data=data,
+                             result_mode=result_mode or self.result_mode)
 
 
@@ -0,0 +1,107 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from api import PetFriends
+from transport import HttpTransport
+
+# Эндпоинт каждого метода - для ограничения частоты до передачи вызова в пул потоков
+_ENDPOINTS = {
+    'get_api_key': 'api/key',
+    'get_list_of_pets': 'api/pets',
+    'post_new_pet': 'api/pets',
+    'put_update_pet': 'api/pets',
+    'delete_pet': 'api/pets',
+    'post_add_photo': 'api/pets/set_photo',
+    'post_new_pet_simple': 'api/create_pet_simple',
+}
+
+
+class AsyncPetFriends:
+    """ Асинхронная версия библиотеки API к приложению PetFriends с тем же набором методов.
+    Запросы выполняются в пуле потоков через общий PetFriends, то есть через одну сессию
+    с пулом keep-alive соединений. Число одновременных запросов ограничивается семафором
+    concurrency, под него же подбирается размер пула соединений и потоков.
+    Вместо base_url/transport можно передать уже настроенный клиент через client.
+    rate_limiter - ratelimit.RateLimiter: ожидание лимита идёт в цикле событий через asyncio.sleep
+    и не занимает потоки пула (у самого client при этом ограничитель задавать не нужно)"""
+
+    def __init__(self, base_url: str = None, concurrency: int = 16, transport=None, client: PetFriends = None,
+                 rate_limiter=None):
+        if client is None:
+            if transport is None:
+                transport = HttpTransport(pool_maxsize=concurrency)
+            client = PetFriends(base_url=base_url, transport=transport)
+        self.client = client
+        self.concurrency = concurrency
+        self.rate_limiter = rate_limiter
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='petfriends')
+
+    async def _call(self, method: str, *args, **kwargs):
+        """ Выполняет метод синхронного клиента в пуле потоков, не превышая лимит concurrency """
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire_async(_ENDPOINTS[method])
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            call = functools.partial(getattr(self.client, method), *args, **kwargs)
+            return await loop.run_in_executor(self._executor, call)
+
+    async def get_api_key(self, email: str, password: str, result_mode: str = None):
+        return await self._call('get_api_key', email, password, result_mode)
+
+    async def get_list_of_pets(self, auth_key, filter: str = '', as_models: bool = False, result_mode: str = None):
+        return await self._call('get_list_of_pets', auth_key, filter, as_models, result_mode)
+
+    async def post_new_pet(self, auth_key, name: str, animal_type: str, age: str, pet_photo: str, progress=None,
+                           result_mode: str = None):
+        return await self._call('post_new_pet', auth_key, name, animal_type, age, pet_photo, progress, result_mode)
+
+    async def put_update_pet(self, auth_key, pet_id: str, name: str, animal_type: str, age: int,
+                             result_mode: str = None):
+        return await self._call('put_update_pet', auth_key, pet_id, name, animal_type, age, result_mode)
+
+    async def delete_pet(self, auth_key, pet_id: str, result_mode: str = None):
+        return await self._call('delete_pet', auth_key, pet_id, result_mode)
+
+    async def post_add_photo(self, auth_key, pet_id: str, pet_photo: str, progress=None, result_mode: str = None):
+        return await self._call('post_add_photo', auth_key, pet_id, pet_photo, progress, result_mode)
+
+    async def post_new_pet_simple(self, auth_key, name: str, animal_type: str, age: str, result_mode: str = None):
+        return await self._call('post_new_pet_simple', auth_key, name, animal_type, age, result_mode)
+
+    async def gather(self, method: str, auth_key, items, return_exceptions: bool = True) -> list:
+        """ Вызывает метод для каждого набора аргументов из items параллельно (в пределах concurrency).
+        Элемент items - кортеж позиционных аргументов после auth_key либо dict именованных.
+        Результаты возвращаются в порядке items; при return_exceptions=True исключение
+        отдельного вызова кладётся на его место в списке и не прерывает остальные"""
+
+        def make_call(item):
+            if isinstance(item, dict):
+                return self._call(method, auth_key, **item)
+            return self._call(method, auth_key, *item)
+
+        return await asyncio.gather(*(make_call(item) for item in items), return_exceptions=return_exceptions)
+
+    async def gather_new_pets_simple(self, auth_key, pets) -> list:
+        """ Массовое создание питомцев без фото, pets - кортежи (name, animal_type, age) или dict """
+        return await self.gather('post_new_pet_simple', auth_key, pets)
+
+    async def gather_new_pets(self, auth_key, pets) -> list:
+        """ Массовое создание питомцев с фото, pets - кортежи (name, animal_type, age, pet_photo) или dict """
+        return await self.gather('post_new_pet', auth_key, pets)
+
+    async def gather_delete_pets(self, auth_key, pet_ids) -> list:
+        """ Массовое удаление питомцев по списку ID; тело ответа не читается, result = None """
+        return await self.gather('delete_pet', auth_key, [(pet_id, 'status') for pet_id in pet_ids])
+
+    async def aclose(self):
+        """ Дожидается завершения потоков и закрывает соединения """
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+        self.client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
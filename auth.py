@@ -0,0 +1,127 @@
+import functools
+import threading
+
+
+class AuthKeyError(Exception):
+    """ Не удалось получить ключ api по учётным данным: в status и result - ответ сервера на api/key """
+
+    def __init__(self, email: str, status, result):
+        super().__init__('api/key для %s вернул статус %s' % (email, status))
+        self.email = email
+        self.status = status
+        self.result = result
+
+
+class Credential:
+    """ Учётные данные пользователя с кэшированным ключом api. Объект можно передавать в методы
+    PetFriends вместо словаря auth_key: ключ запрашивается один раз, общий для всех потоков,
+    и перезапрашивается только после ответа 403. Если несколько потоков одновременно упёрлись
+    в 403, на сервер уходит один запрос api/key, остальные ждут его результата"""
+
+    def __init__(self, email: str, password: str, fetch):
+        """ fetch(email, password) -> (status, result) - функция получения ключа, обычно
+        PetFriends.get_api_key """
+        self.email = email
+        self.password = password
+        self._fetch = fetch
+        self._stats = {'hits': 0, 'misses': 0, 'refreshes': 0, 'waits': 0}
+        self._lock = threading.Lock()
+        self._key = None
+        self._in_flight = None
+
+    def key(self) -> str:
+        """ Возвращает ключ из кэша, при отсутствии - запрашивает его у сервера """
+        with self._lock:
+            if self._key is not None:
+                self._stats['hits'] += 1
+                return self._key
+        return self._load(stale_key=None)
+
+    @property
+    def stats(self) -> dict:
+        """ Счётчики: hits - ключ выдан из кэша, misses - запросы api/key, refreshes - из них
+        перезапросы после 403, waits - вызовы, дождавшиеся чужого запроса api/key """
+        with self._lock:
+            return dict(self._stats)
+
+    def as_auth_key(self) -> dict:
+        """ Ключ в формате ответа get_api_key - для кода, который ожидает словарь {'key': ...} """
+        return {'key': self.key()}
+
+    def refresh(self, stale_key: str) -> str:
+        """ Сообщает, что сервер отверг stale_key, и возвращает новый ключ. Если другой поток уже
+        успел обновить ключ, повторного запроса не будет """
+        return self._load(stale_key=stale_key)
+
+    def _load(self, stale_key):
+        with self._lock:
+            if self._key is not None and self._key != stale_key:
+                self._stats['hits'] += 1
+                return self._key
+            in_flight = self._in_flight
+            leader = in_flight is None
+            if leader:
+                in_flight = self._in_flight = threading.Event()
+                self._stats['misses'] += 1
+                if stale_key is not None:
+                    self._stats['refreshes'] += 1
+            else:
+                self._stats['waits'] += 1
+
+        if not leader:
+            in_flight.wait()
+            with self._lock:
+                if self._key is not None:
+                    return self._key
+            raise AuthKeyError(self.email, None, 'ключ не получен в параллельном запросе')
+
+        key = None
+        try:
+            status, result = self._fetch(self.email, self.password)
+            if status != 200 or not isinstance(result, dict) or 'key' not in result:
+                raise AuthKeyError(self.email, status, result)
+            key = result['key']
+        finally:
+            with self._lock:
+                self._key = key
+                self._in_flight = None
+            in_flight.set()
+        return key
+
+
+class AuthKeyCache:
+    """ Потокобезопасный кэш учётных данных по паре (email, password) для одного клиента PetFriends.
+    По умолчанию email и password берутся из settings.py. stats - сумма счётчиков Credential.stats
+    по всем учётным записям кэша """
+
+    def __init__(self, client):
+        self._client = client
+        self._lock = threading.Lock()
+        self._credentials = {}
+
+    def get(self, email: str = None, password: str = None) -> Credential:
+        if email is None and password is None:
+            from settings import load_credentials
+            email, password = load_credentials()
+        with self._lock:
+            credential = self._credentials.get((email, password))
+            if credential is None:
+                # ключ нужен разобранным при любом result_mode клиента
+                fetch = functools.partial(self._client.get_api_key, result_mode='json')
+                credential = Credential(email, password, fetch)
+                self._credentials[(email, password)] = credential
+            return credential
+
+    @property
+    def stats(self) -> dict:
+        total = {'hits': 0, 'misses': 0, 'refreshes': 0, 'waits': 0}
+        with self._lock:
+            credentials = list(self._credentials.values())
+        for credential in credentials:
+            for name, value in credential.stats.items():
+                total[name] += value
+        return total
+
+    def clear(self):
+        with self._lock:
+            self._credentials.clear()
@@ -0,0 +1,157 @@
+import csv
+import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from stats import LatencyHistogram
+
+
+def iter_csv_specs(path: str):
+    """ Лениво читает описания питомцев из CSV с заголовком name,animal_type,age[,pet_photo] """
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            yield row
+
+
+def iter_jsonl_specs(path: str):
+    """ Лениво читает описания питомцев из JSONL: по одному объекту на строку """
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class BulkSummary:
+    """ Итоги массового создания: число вызовов, пропускная способность, перцентили задержки
+    и разбивка ошибок по статус-коду (или по имени исключения, если ответа не было).
+    Задержки копятся в stats.LatencyHistogram, поэтому память не растёт с числом вызовов """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = 0
+        self.ok = 0
+        self.errors = Counter()
+        self.latencies = LatencyHistogram()
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def add(self, status, latency: float, error: Exception = None):
+        with self._lock:
+            self.total += 1
+            self.latencies.record(latency)
+            if error is not None:
+                self.errors[type(error).__name__] += 1
+            elif status == 200:
+                self.ok += 1
+            else:
+                self.errors[status] += 1
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def throughput(self) -> float:
+        """ Вызовов в секунду """
+        return self.total / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            p50, p99 = self.latencies.percentile(50), self.latencies.percentile(99)
+        return {
+            'total': self.total,
+            'ok': self.ok,
+            'errors': dict(self.errors),
+            'elapsed': self.elapsed,
+            'throughput': self.throughput,
+            'p50': p50,
+            'p99': p99,
+        }
+
+
+def run_windowed(func, items, workers: int = 8, window: int = None, ordered: bool = False,
+                 thread_name_prefix: str = 'bulk'):
+    """ Выполняет func(item) для каждого элемента items в пуле из workers потоков и отдаёт
+    (input_index, item, результат func) по мере завершения, а при ordered=True - в порядке items.
+    Задачи подаются окнами: в работе и в ожидании выдачи одновременно не больше window элементов
+    (по умолчанию workers * 4), поэтому items читается лениво и может быть генератором любой длины """
+    window = window or workers * 4
+    items = enumerate(items)
+    pending = {}
+    done = {}
+    next_index = 0
+    exhausted = False
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=thread_name_prefix) as pool:
+        while True:
+            while not exhausted and len(pending) + len(done) < window:
+                try:
+                    index, item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[pool.submit(func, item)] = index, item
+
+            if not pending:
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                index, item = pending.pop(future)
+                if not ordered:
+                    yield index, item, future.result()
+                else:
+                    done[index] = item, future.result()
+            while next_index in done:
+                yield (next_index,) + done.pop(next_index)
+                next_index += 1
+
+
+class BulkCreator:
+    """ Массовое создание питомцев через PetFriends в пуле потоков.
+    Описание питомца - dict с ключами name, animal_type, age и необязательным pet_photo:
+    с фото вызывается post_new_pet, без фото - post_new_pet_simple.
+    Все потоки работают через один клиент, а значит и через один пул соединений - размер
+    пула транспорта (pool_maxsize) стоит задавать не меньше workers.
+    Входные данные читаются лениво: в работе и в буфере одновременно не больше window описаний,
+    поэтому генератор по многомиллионному файлу не загружается в память целиком """
+
+    def __init__(self, client, auth_key, workers: int = 8, window: int = None):
+        self.client = client
+        self.auth_key = auth_key
+        self.workers = workers
+        self.window = window or workers * 4
+        self.summary = BulkSummary()
+
+    def _create(self, spec: dict):
+        started = time.perf_counter()
+        try:
+            if spec.get('pet_photo'):
+                status, result = self.client.post_new_pet(self.auth_key, spec['name'], spec['animal_type'],
+                                                          str(spec['age']), spec['pet_photo'])
+            else:
+                status, result = self.client.post_new_pet_simple(self.auth_key, spec['name'], spec['animal_type'],
+                                                                 str(spec['age']))
+        except Exception as e:
+            self.summary.add(None, time.perf_counter() - started, e)
+            return None, e
+        self.summary.add(status, time.perf_counter() - started)
+        return status, result
+
+    def run(self, specs, ordered: bool = False):
+        """ Генератор (input_index, status, result) по мере завершения вызовов, а при ordered=True -
+        в порядке входных данных. Ошибка отдельного вызова не останавливает пакет: для неё
+        status = None, а в result лежит исключение """
+        self.summary = BulkSummary()
+        for index, _, (status, result) in run_windowed(self._create, specs, self.workers, self.window, ordered,
+                                                       'bulk-create'):
+            yield index, status, result
+        self.summary.finished = time.perf_counter()
+
+
+def bulk_create(client, auth_key, specs, workers: int = 8, ordered: bool = False) -> tuple:
+    """ Создаёт всех питомцев из specs и возвращает (список (input_index, status, result), BulkSummary) """
+    creator = BulkCreator(client, auth_key, workers=workers)
+    results = list(creator.run(specs, ordered=ordered))
+    return results, creator.summary
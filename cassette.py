@@ -0,0 +1,375 @@
+import base64
+import hashlib
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from urllib.parse import urlencode, urlsplit
+
+from bulk import BulkSummary
+from ratelimit import endpoint_of
+
+# Заголовки, значения которых не попадают в файл
+REDACTED_HEADERS = ('auth_key', 'password')
+
+
+class CassetteMiss(LookupError):
+    """ В кассете не осталось записанного ответа на такой запрос """
+
+    def __init__(self, method: str, path: str):
+        super().__init__('в кассете нет ответа на %s %s' % (method, path))
+        self.method = method
+        self.path = path
+
+
+def _path(url: str) -> str:
+    return urlsplit(url).path.lstrip('/')
+
+
+def _key(method: str, path: str, params, headers) -> tuple:
+    # api/key разных пользователей различаются только заголовком email (он не скрывается при записи)
+    email = (headers or {}).get('email') if path.endswith('api/key') else None
+    return method, path, tuple(sorted((params or {}).items())), email
+
+
+class _HashingReader:
+    """ Обёртка потокового тела запроса (MultipartEncoder), считающая sha1 и размер по мере отправки """
+
+    def __init__(self, body):
+        self._body = body
+        self.sha1 = hashlib.sha1()
+        self.size = 0
+
+    @property
+    def len(self) -> int:
+        return self._body.len
+
+    def read(self, size: int = -1):
+        chunk = self._body.read(size)
+        self.sha1.update(chunk)
+        self.size += len(chunk)
+        return chunk
+
+
+# Обмены, тела ответов которых нужны для воспроизведения: ключ и id созданных питомцев
+REPLAY_BODIES = (('GET', 'api/key'), ('POST', 'api/pets'), ('POST', 'api/create_pet_simple'))
+
+
+class _RecordingBody:
+    """ Обёртка res.raw потокового ответа (stream=True): считает sha1 и размер тела по мере того,
+    как его читает клиент, и передаёт итог в finish, когда тело дочитано или ответ закрыт раньше.
+    Сам ответ при записи не читается - result_mode='status' и iter_pets остаются потоковыми """
+
+    def __init__(self, raw, finish, keep: bool):
+        self._raw = raw
+        self._finish = finish
+        self._chunks = [] if keep else None
+        self._done = False
+        self.sha1 = hashlib.sha1()
+        self.size = 0
+
+    def _feed(self, chunk: bytes):
+        self.sha1.update(chunk)
+        self.size += len(chunk)
+        if self._chunks is not None:
+            self._chunks.append(chunk)
+
+    def complete(self, truncated: bool):
+        if self._done:
+            return
+        self._done = True
+        body = b''.join(self._chunks) if self._chunks is not None and not truncated else None
+        self._finish(self.sha1.hexdigest(), self.size, body, truncated)
+
+    def stream(self, amt: int = 2 ** 16, decode_content=None):
+        if hasattr(self._raw, 'stream'):
+            chunks = self._raw.stream(amt, decode_content=decode_content)
+        else:
+            chunks = iter(lambda: self._raw.read(amt), b'')
+        for chunk in chunks:
+            self._feed(chunk)
+            yield chunk
+        self.complete(truncated=False)
+
+    def read(self, *args, **kwargs):
+        chunk = self._raw.read(*args, **kwargs)
+        if chunk:
+            self._feed(chunk)
+        else:
+            self.complete(truncated=False)
+        return chunk
+
+    def close(self):
+        self.complete(truncated=True)
+        self._raw.close()
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class RecordingTransport:
+    """ Транспорт-обёртка, который передаёт запросы в transport и дописывает каждый обмен
+    в файл JSONL path (одна компактная строка на запрос): время от начала записи, метод, URL,
+    параметры, заголовки (auth_key и password, как и ключ в ответе api/key, заменяются на '***'),
+    размер и sha1 тела запроса, статус (или имя исключения, если ответа не было), длительность,
+    Content-Type, размер и sha1 тела ответа. Тело ответа сохраняется только для обменов из
+    REPLAY_BODIES (без них replay_traffic не восстановит ключ и id питомцев); store_bodies=True -
+    для всех обменов (ReplayTransport отвечает на любой запрос как при записи), False - ни для какого.
+    Ответы с stream=True не читаются заранее: строка дописывается, когда клиент дочитал тело
+    или закрыл ответ (тогда в ней truncated). Подключается как
+    PetFriends(transport=RecordingTransport(HttpTransport(), 'run.jsonl')) """
+
+    def __init__(self, transport, path: str, store_bodies: bool = None):
+        self.transport = transport
+        self.path = path
+        self.store_bodies = store_bodies
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+        self._started = time.perf_counter()
+        self._streams = set()
+
+    def _keep_body(self, method: str, url: str) -> bool:
+        if self.store_bodies is None:
+            return (method, endpoint_of(_path(url))) in REPLAY_BODIES
+        return self.store_bodies
+
+    def request(self, method: str, url: str, **kwargs):
+        data = kwargs.get('data')
+        digest = None
+        if hasattr(data, 'read'):
+            data = kwargs['data'] = _HashingReader(data)
+        elif data is not None:
+            raw = urlencode(data).encode('utf-8') if isinstance(data, dict) else data
+            raw = raw.encode('utf-8') if isinstance(raw, str) else bytes(raw)
+            digest = hashlib.sha1(raw).hexdigest(), len(raw)
+        started = time.perf_counter()
+        res = error = None
+        try:
+            res = self.transport.request(method, url, **kwargs)
+        except OSError as e:
+            error = e
+        elapsed = time.perf_counter() - started
+        if isinstance(data, _HashingReader):
+            digest = data.sha1.hexdigest(), data.size
+
+        entry = {
+            't': round(started - self._started, 6),
+            'method': method,
+            'url': url,
+            'params': kwargs.get('params') or None,
+            'headers': {name: '***' if name in REDACTED_HEADERS else value
+                        for name, value in (kwargs.get('headers') or {}).items()},
+            'body': {'size': digest[1], 'sha1': digest[0]} if digest else None,
+            'status': res.status_code if res is not None else None,
+            'error': type(error).__name__ if error is not None else None,
+            'elapsed': round(elapsed, 6),
+            'content_type': res.headers.get('Content-Type') if res is not None else None,
+        }
+        if error is not None:
+            self._write(entry)
+            raise error
+
+        keep = self._keep_body(method, url)
+
+        def finish(sha1: str, size: int, body: bytes, truncated: bool = False):
+            entry['response_size'], entry['response_sha1'] = size, sha1
+            if truncated:
+                entry['truncated'] = True
+            if body is not None:
+                if _path(url).endswith('api/key') and res.status_code == 200:
+                    # сам ключ - такой же секрет, как заголовок auth_key
+                    body = b'{"key": "***"}'
+                try:
+                    entry['response'] = body.decode('utf-8')
+                except UnicodeDecodeError:
+                    entry['response_b64'] = base64.b64encode(body).decode('ascii')
+            self._write(entry)
+
+        if kwargs.get('stream') and not res._content_consumed:
+            def finish_stream(*args):
+                with self._lock:
+                    self._streams.discard(wrapper)
+                finish(*args)
+
+            wrapper = _RecordingBody(res.raw, finish_stream, keep)
+            with self._lock:
+                self._streams.add(wrapper)
+            res.raw = wrapper
+        else:
+            body = res.content
+            finish(hashlib.sha1(body).hexdigest(), len(body), body if keep else None)
+        return res
+
+    def _write(self, entry: dict):
+        line = json.dumps({name: value for name, value in entry.items() if value is not None},
+                          ensure_ascii=False, separators=(',', ':'))
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def close(self):
+        # потоковые ответы, которые так и не дочитали и не закрыли, записываются как оборванные
+        with self._lock:
+            streams = list(self._streams)
+        for wrapper in streams:
+            wrapper.complete(truncated=True)
+        with self._lock:
+            self._file.close()
+        self.transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_cassette(path: str) -> list:
+    """ Записи кассеты в порядке отправки запросов """
+    with open(path, encoding='utf-8') as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    entries.sort(key=lambda entry: entry['t'])
+    return entries
+
+
+class ReplayTransport:
+    """ Транспорт, отвечающий записанными RecordingTransport ответами без сети. Запрос сопоставляется
+    с записью по методу, пути URL и параметрам, а api/key - ещё и по email (base_url не важен);
+    одинаковые запросы получают ответы в порядке записи. speed=None - отвечать сразу, иначе ждать
+    записанную длительность запроса, делённую на speed (1.0 - с исходной скоростью). Записанный обрыв
+    соединения воспроизводится как ConnectionError. Ответ, тело которого не сохранялось, приходит
+    с пустым телом. Если подходящего ответа нет, выбрасывается CassetteMiss """
+
+    def __init__(self, path: str, speed: float = None):
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._responses = {}
+        for entry in load_cassette(path):
+            self._responses.setdefault(_key(entry['method'], _path(entry['url']), entry.get('params'),
+                                            entry.get('headers')),
+                                       deque()).append(entry)
+
+    @property
+    def remaining(self) -> int:
+        with self._lock:
+            return sum(len(entries) for entries in self._responses.values())
+
+    def request(self, method: str, url: str, params: dict = None, **kwargs):
+        from requests.models import Response
+
+        path = _path(url)
+        with self._lock:
+            entries = self._responses.get(_key(method, path, params, kwargs.get('headers')))
+            entry = entries.popleft() if entries else None
+        if entry is None:
+            raise CassetteMiss(method, path)
+        if self.speed:
+            time.sleep(entry['elapsed'] / self.speed)
+        if 'error' in entry:
+            raise ConnectionError('записанная ошибка: %s' % entry['error'])
+
+        res = Response()
+        res.status_code = entry['status']
+        res.url = url
+        res.encoding = 'utf-8'
+        if 'response_b64' in entry:
+            res._content = base64.b64decode(entry['response_b64'])
+        else:
+            res._content = entry.get('response', '').encode('utf-8')
+        res._content_consumed = True
+        res.headers['Content-Length'] = str(len(res._content))
+        if entry.get('content_type'):
+            res.headers['Content-Type'] = entry['content_type']
+        return res
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _synthetic_photo(size: int) -> bytes:
+    """ Тело фото заданного размера с сигнатурой JPEG - локальный сервер примет его как картинку """
+    return b'\xff\xd8\xff' + b'\0' * max(0, size - 3)
+
+
+def replay_traffic(path: str, client, auth_key, speed: float = 1.0, workers: int = 16) -> BulkSummary:
+    """ Воспроизводит форму записанного трафика на клиенте client (например, направленном на
+    локальный PetFriendsServer): те же методы и эндпоинты в том же темпе (интервалы между запросами
+    делятся на speed; speed=None - без пауз), не больше workers запросов одновременно.
+    Тела запросов в кассете не хранятся, поэтому питомцы создаются с подставными полями, а фото -
+    подставные той же длины, что и в записи. Идентификаторы питомцев, созданных в записи (если
+    кассета записана с телами ответов), заменяются идентификаторами новых питомцев.
+    auth_key - auth.Credential (pf.credential(...)): его учётные данные нужны для запросов api/key.
+    Возвращает bulk.BulkSummary с пропускной способностью, задержками и ошибками """
+    entries = load_cassette(path)
+    new_ids = {}
+    last = {}
+    summary = BulkSummary()
+
+    def recorded_id(entry):
+        """ id питомца, к которому относится запрос: созданного (из записанного ответа) или из пути """
+        method, path = entry['method'], _path(entry['url'])
+        endpoint = endpoint_of(path)
+        if method == 'POST' and endpoint in ('api/pets', 'api/create_pet_simple'):
+            try:
+                return json.loads(entry.get('response', ''))['id']
+            except (ValueError, KeyError, TypeError):
+                return None
+        if method in ('PUT', 'DELETE') or endpoint == 'api/pets/set_photo':
+            return path.rsplit('/', 1)[-1]
+        return None
+
+    def send(entry, pet_id, after: Future, done: Future):
+        if after is not None:
+            wait([after])
+        method, endpoint = entry['method'], endpoint_of(_path(entry['url']))
+        target = new_ids.get(pet_id, pet_id)
+        size = (entry.get('body') or {}).get('size', 0)
+        started = time.perf_counter()
+        try:
+            if endpoint == 'api/key':
+                status, _ = client.get_api_key(auth_key.email, auth_key.password, result_mode='status')
+            elif method == 'GET':
+                status, _ = client.get_list_of_pets(auth_key, (entry.get('params') or {}).get('filter', ''),
+                                                    result_mode='status')
+            elif endpoint == 'api/create_pet_simple':
+                status, result = client.post_new_pet_simple(auth_key, 'Replay', 'cat', '1')
+            elif endpoint == 'api/pets/set_photo':
+                status, _ = client.post_add_photo(auth_key, target, _synthetic_photo(size), result_mode='status')
+            elif method == 'POST':
+                status, result = client.post_new_pet(auth_key, 'Replay', 'cat', '1', _synthetic_photo(size))
+            elif method == 'PUT':
+                status, _ = client.put_update_pet(auth_key, target, 'Replay', 'dog', '2', result_mode='status')
+            else:
+                status, _ = client.delete_pet(auth_key, target, result_mode='status')
+            summary.add(status, time.perf_counter() - started)
+            if method == 'POST' and endpoint != 'api/pets/set_photo' and pet_id is not None and status == 200:
+                new_ids[pet_id] = result['id']
+        except Exception as e:
+            summary.add(None, time.perf_counter() - started, e)
+        finally:
+            done.set_result(None)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(workers, thread_name_prefix='replay') as executor:
+        for entry in entries:
+            if speed:
+                delay = started + entry['t'] / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            # Запросы к одному питомцу выполняются в порядке записи: изменение ждёт создания,
+            # удаление - изменения. Пул берёт задачи по очереди, поэтому предыдущая уже выполняется
+            pet_id = recorded_id(entry)
+            done = Future()
+            after = last.get(pet_id) if pet_id is not None else None
+            if pet_id is not None:
+                last[pet_id] = done
+            executor.submit(send, entry, pet_id, after, done)
+    summary.finished = time.perf_counter()
+    return summary
@@ -0,0 +1,185 @@
+import asyncio
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from uploads import PhotoUpload, guess_content_type
+
+_EXTENSIONS = {'image/jpeg': '.jpg', 'image/png': '.png', 'image/webp': '.webp', 'image/gif': '.gif'}
+
+
+def require_pillow():
+    """ Проверяет, что установлен Pillow, который нужен только для предобработки фото """
+    try:
+        import PIL.Image  # noqa: F401
+    except ImportError:
+        raise ImportError('для предобработки фото нужен Pillow: pip install Pillow') from None
+
+
+def encode_photo(data: bytes, max_size: int = 1280, format: str = 'JPEG', quality: int = 85) -> bytes:
+    """ Уменьшает картинку так, чтобы большая сторона была не больше max_size (пропорции
+    сохраняются, маленькие картинки не увеличиваются), и перекодирует её в format с качеством
+    quality; format=None - оставить исходный формат. Если результат не меньше исходника
+    того же формата и размера, возвращается исходник. Не-картинки возвращаются как есть:
+    проверять, как сервер их обрабатывает, - дело вызывающего кода. Выполняется в дочернем процессе """
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        image = Image.open(io.BytesIO(data))
+    except UnidentifiedImageError:
+        return data
+    with image:
+        source_format = image.format
+        target_format = format or source_format
+        resized = image.width > max_size or image.height > max_size
+        if resized:
+            image.thumbnail((max_size, max_size))
+        if target_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        out = io.BytesIO()
+        image.save(out, target_format, quality=quality, optimize=True)
+    encoded = out.getvalue()
+    if not resized and target_format == source_format and len(encoded) >= len(data):
+        return data
+    return encoded
+
+
+class PhotoPreprocessor:
+    """ Предобработка фото перед загрузкой: уменьшение до max_size и перекодирование в format
+    (по умолчанию JPEG с качеством 85) в пуле процессов, чтобы разбор и сжатие картинок не держали
+    GIL потоков, отправляющих запросы. Результаты кэшируются по sha256 содержимого исходника (не больше
+    cache_bytes байт, вытесняются давно не использованные), а для путей - ещё и по (путь, mtime, размер),
+    поэтому повторная загрузка того же фото не читает файл и не кодирует его заново. Одно и то же фото,
+    запрошенное из нескольких потоков одновременно, кодируется один раз.
+    Подключается через PetFriends(preprocessor=...) или вызовом prepare(source) вручную.
+    Нужен Pillow; без него конструктор выбрасывает ImportError с понятным сообщением """
+
+    def __init__(self, max_size: int = 1280, format: str = 'JPEG', quality: int = 85, workers: int = None,
+                 cache_bytes: int = 64 * 1024 * 1024, executor=None):
+        require_pillow()
+        self.max_size = max_size
+        self.format = format
+        self.quality = quality
+        self.cache_bytes = cache_bytes
+        self._executor = executor if executor is not None else ProcessPoolExecutor(workers)
+        self._own_executor = executor is None
+        self._lock = threading.Lock()
+        self._paths = {}
+        self._encoded = OrderedDict()
+        self._cached = 0
+        self._stats = {'hits': 0, 'misses': 0, 'bytes_in': 0, 'bytes_out': 0}
+
+    @property
+    def stats(self) -> dict:
+        """ hits/misses кэша и объём исходных и подготовленных фото, которые были закодированы """
+        with self._lock:
+            return dict(self._stats, cached_bytes=self._cached)
+
+    def _path_key(self, path) -> tuple:
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+    def _digest(self, source) -> tuple:
+        """ (sha256 исходника, его bytes или None, если они не понадобятся) """
+        path_key = None
+        if isinstance(source, (str, os.PathLike)):
+            path_key = self._path_key(source)
+            with self._lock:
+                digest = self._paths.get(path_key)
+            if digest is not None:
+                return digest, None
+        if isinstance(source, PhotoUpload):
+            source.rewind()
+            data = bytes(source.read())
+            source.rewind()
+        else:
+            with PhotoUpload(source) as photo:
+                data = bytes(photo.read())
+        digest = hashlib.sha256(data).hexdigest()
+        if path_key is not None:
+            with self._lock:
+                self._paths[path_key] = digest
+        return digest, data
+
+    def submit(self, source) -> Future:
+        """ Future с подготовленными bytes для source: путь, bytes/memoryview, открытый файл или PhotoUpload """
+        digest, data = self._digest(source)
+        if data is None:
+            with self._lock:
+                future = self._encoded.get(digest)
+                if future is not None:
+                    self._encoded.move_to_end(digest)
+                    self._stats['hits'] += 1
+                    return future
+            # путь уже встречался, но результат вытеснен из кэша
+            with PhotoUpload(source) as photo:
+                data = bytes(photo.read())
+        with self._lock:
+            future = self._encoded.get(digest)
+            if future is not None:
+                self._encoded.move_to_end(digest)
+                self._stats['hits'] += 1
+                return future
+            self._stats['misses'] += 1
+            future = self._executor.submit(encode_photo, data, self.max_size, self.format, self.quality)
+            self._encoded[digest] = future
+        future.add_done_callback(lambda f: self._done(digest, len(data), f))
+        return future
+
+    def _done(self, digest: str, source_size: int, future: Future):
+        with self._lock:
+            if self._encoded.get(digest) is not future:
+                return
+            if future.cancelled() or future.exception() is not None:
+                del self._encoded[digest]
+                return
+            size = len(future.result())
+            self._stats['bytes_in'] += source_size
+            self._stats['bytes_out'] += size
+            self._cached += size
+            while self._cached > self.cache_bytes and len(self._encoded) > 1:
+                oldest, evicted = next(iter(self._encoded.items()))
+                if not evicted.done():
+                    break
+                del self._encoded[oldest]
+                self._cached -= len(evicted.result())
+
+    @staticmethod
+    def _filename(source, data: bytes) -> str:
+        """ Имя исходника с расширением, соответствующим подготовленному содержимому """
+        if isinstance(source, (str, os.PathLike)):
+            name = os.path.basename(os.fspath(source))
+        else:
+            name = os.path.basename(getattr(source, 'filename', None) or 'pet_photo')
+        extension = _EXTENSIONS.get(guess_content_type(data[:16]))
+        return os.path.splitext(name)[0] + extension if extension else name
+
+    def prepare(self, source, progress=None) -> PhotoUpload:
+        """ Готовит фото и возвращает PhotoUpload, который можно передать в post_new_pet/post_add_photo """
+        data = self.submit(source).result()
+        return PhotoUpload(data, filename=self._filename(source, data), progress=progress)
+
+    async def prepare_async(self, source, progress=None) -> PhotoUpload:
+        """ То же, что prepare, но ожидание кодирования не блокирует цикл событий """
+        future = await asyncio.get_running_loop().run_in_executor(None, self.submit, source)
+        data = await asyncio.wrap_future(future)
+        return PhotoUpload(data, filename=self._filename(source, data), progress=progress)
+
+    def clear(self):
+        with self._lock:
+            self._paths.clear()
+            self._encoded.clear()
+            self._cached = 0
+
+    def close(self):
+        if self._own_executor:
+            self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,132 @@
+import json
+import threading
+
+from stats import LatencyHistogram
+
+
+class TimingRecord:
+    """ Запись о времени одного HTTP-запроса PetFriends, которую получают хуки pf.add_hook(...).
+    phases - длительности этапов в секундах:
+    rate_limit - ожидание в ограничителе частоты, prepare - сборка тела запроса,
+    request - от отправки запроса до получения заголовков ответа (соединение, TLS, выгрузка тела
+    и время сервера - requests не даёт разделить их точнее), download - чтение тела ответа,
+    decode - разбор тела в выбранном result_mode (для lazy и status почти нулевой). total включает все этапы.
+    error - имя исключения, если ответа не было (status при этом None) """
+
+    __slots__ = ('method', 'endpoint', 'path', 'status', 'bytes_sent', 'bytes_received', 'attempt', 'started',
+                 'total', 'phases', 'error')
+
+    def __init__(self, method: str, endpoint: str, path: str, attempt: int, started: float):
+        self.method = method
+        self.endpoint = endpoint
+        self.path = path
+        self.attempt = attempt
+        self.started = started
+        self.status = None
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.total = 0.0
+        self.phases = {}
+        self.error = None
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class HistogramSink:
+    """ Хук, собирающий длительности запросов по эндпоинтам в stats.LatencyHistogram (память не растёт
+    с числом запросов): p50/p95/p99, число ошибок (5xx или нет ответа) и объём трафика.
+    by_method=True - разделять эндпоинты по методу ('GET api/pets', 'DELETE api/pets').
+    prometheus_text() выдаёт те же данные в текстовом формате Prometheus """
+
+    def __init__(self, by_method: bool = False):
+        self.by_method = by_method
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def __call__(self, record: TimingRecord):
+        name = '%s %s' % (record.method, record.endpoint) if self.by_method else record.endpoint
+        with self._lock:
+            data = self._endpoints.get(name)
+            if data is None:
+                data = self._endpoints[name] = {'histogram': LatencyHistogram(), 'errors': 0, 'bytes_sent': 0,
+                                                'bytes_received': 0}
+            data['histogram'].record(record.total)
+            data['bytes_sent'] += record.bytes_sent
+            data['bytes_received'] += record.bytes_received
+            if record.status is None or record.status >= 500:
+                data['errors'] += 1
+
+    def snapshot(self) -> dict:
+        """ Копия собранных данных: {эндпоинт: {histogram, errors, bytes_sent, bytes_received}} """
+        with self._lock:
+            endpoints = {}
+            for name, data in self._endpoints.items():
+                histogram = LatencyHistogram(data['histogram'].sub_bits)
+                histogram.merge(data['histogram'])
+                endpoints[name] = dict(data, histogram=histogram)
+        return endpoints
+
+    def summary(self) -> dict:
+        endpoints = self.snapshot()
+        return {
+            endpoint: {
+                'count': data['histogram'].count,
+                'sum': data['histogram'].total,
+                'p50': data['histogram'].percentile(50),
+                'p95': data['histogram'].percentile(95),
+                'p99': data['histogram'].percentile(99),
+                'errors': data['errors'],
+                'bytes_sent': data['bytes_sent'],
+                'bytes_received': data['bytes_received'],
+            }
+            for endpoint, data in endpoints.items()
+        }
+
+    def prometheus_text(self, prefix: str = 'petfriends') -> str:
+        lines = ['# TYPE %s_request_duration_seconds summary' % prefix]
+        summary = self.summary()
+        for endpoint, data in sorted(summary.items()):
+            for quantile, name in (('0.5', 'p50'), ('0.95', 'p95'), ('0.99', 'p99')):
+                lines.append('%s_request_duration_seconds{endpoint="%s",quantile="%s"} %.6f' % (
+                    prefix, endpoint, quantile, data[name]))
+            lines.append('%s_request_duration_seconds_sum{endpoint="%s"} %.6f' % (prefix, endpoint, data['sum']))
+            lines.append('%s_request_duration_seconds_count{endpoint="%s"} %d' % (prefix, endpoint, data['count']))
+        for metric in ('errors', 'bytes_sent', 'bytes_received'):
+            lines.append('# TYPE %s_%s_total counter' % (prefix, metric))
+            for endpoint, data in sorted(summary.items()):
+                lines.append('%s_%s_total{endpoint="%s"} %d' % (prefix, metric, endpoint, data[metric]))
+        return '\n'.join(lines) + '\n'
+
+
+class JsonlSink:
+    """ Хук, дописывающий каждую запись в файл JSONL (одна строка - один запрос) """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def __call__(self, record: TimingRecord):
+        line = json.dumps(record.as_dict(), ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def body_size(body) -> int:
+    """ Размер тела запроса в байтах без его чтения """
+    if body is None:
+        return 0
+    if hasattr(body, 'len'):
+        return body.len
+    if isinstance(body, dict):
+        from urllib.parse import urlencode
+        return len(urlencode(body))
+    try:
+        return len(body)
+    except TypeError:
+        return 0
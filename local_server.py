@@ -0,0 +1,286 @@
+import base64
+import json
+import random
+import secrets
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from uploads import guess_content_type
+
+
+class PetStore:
+    """ Данные локального сервера: пользователи, их ключи api и питомцы (новые - в начале списка) """
+
+    def __init__(self, accounts: dict):
+        self.lock = threading.Lock()
+        self.accounts = dict(accounts)
+        self.users = {email: uuid.uuid4().hex for email in self.accounts}
+        self.keys = {}
+        self.pets = OrderedDict()
+
+    def issue_key(self, email: str, password: str):
+        with self.lock:
+            if email not in self.accounts or self.accounts[email] != password:
+                return None
+            key = secrets.token_hex(28)
+            self.keys[key] = self.users[email]
+            return key
+
+    def user_of(self, key: str):
+        with self.lock:
+            return self.keys.get(key)
+
+    def add(self, user_id: str, name: str, animal_type: str, age: str, pet_photo: str = '') -> dict:
+        pet = {'age': age, 'animal_type': animal_type, 'created_at': str(time.time()), 'id': uuid.uuid4().hex,
+               'name': name, 'pet_photo': pet_photo, 'user_id': user_id}
+        with self.lock:
+            self.pets[pet['id']] = pet
+            self.pets.move_to_end(pet['id'], last=False)
+        return pet
+
+    def list(self, user_id: str = None) -> list:
+        with self.lock:
+            pets = list(self.pets.values())
+        if user_id is not None:
+            pets = [pet for pet in pets if pet['user_id'] == user_id]
+        return pets
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'PetFriendsLocal/1.0'
+    # Заголовки и тело уходят отдельными записями в сокет: без TCP_NODELAY keep-alive соединение
+    # ловит задержку подтверждения ~40 мс на каждый ответ
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    # --- ответы ---
+
+    def _send(self, status: int, body=b'', content_type: str = 'text/html; charset=utf-8'):
+        if isinstance(body, (dict, list)):
+            body, content_type = json.dumps(body).encode('utf-8'), 'application/json'
+        elif isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _forbidden(self):
+        self._send(403, '<h1>Forbidden</h1><p>Please provide \'auth_key\' Header</p>')
+
+    # --- разбор запроса ---
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _form(self) -> tuple:
+        """ Поля формы и файлы: {name: value}, {name: (filename, content_type, bytes)} """
+        body = self._body()
+        content_type = self.headers.get('Content-Type', '')
+        if content_type.startswith('multipart/form-data'):
+            message = BytesParser(policy=HTTP).parsebytes(
+                b'Content-Type: ' + content_type.encode('latin-1') + b'\r\n\r\n' + body)
+            fields, files = {}, {}
+            for part in message.iter_parts():
+                name = part.get_param('name', header='content-disposition')
+                payload = part.get_payload(decode=True) or b''
+                if part.get_filename() is not None:
+                    files[name] = (part.get_filename(), part.get_content_type(), payload)
+                else:
+                    fields[name] = payload.decode('utf-8')
+            return fields, files
+        parsed = parse_qs(body.decode('utf-8'), keep_blank_values=True)
+        return {name: values[0] for name, values in parsed.items()}, {}
+
+    def _user(self):
+        return self.server.store.user_of(self.headers.get('auth_key', ''))
+
+    # --- маршрутизация ---
+
+    def _dispatch(self):
+        server = self.server
+        if server.latency:
+            low, high = server.latency
+            time.sleep(server.random.uniform(low, high))
+        if server.error_rate and server.random.random() < server.error_rate:
+            self._body()
+            return self._send(server.error_status, '<h1>Internal Server Error</h1>')
+
+        url = urlsplit(self.path)
+        parts = url.path.strip('/').split('/')
+        route = (self.command, '/'.join(parts[:3]) if parts[:3] == ['api', 'pets', 'set_photo'] else
+                 '/'.join(parts[:2]))
+        handler = {
+            ('GET', 'api/key'): self._get_key,
+            ('GET', 'api/pets'): self._get_pets,
+            ('POST', 'api/pets'): self._post_pet,
+            ('PUT', 'api/pets'): self._put_pet,
+            ('DELETE', 'api/pets'): self._delete_pet,
+            ('POST', 'api/pets/set_photo'): self._set_photo,
+            ('POST', 'api/create_pet_simple'): self._create_pet_simple,
+        }.get(route)
+        if handler is None:
+            self._body()
+            return self._send(404, '<h1>Not Found</h1>')
+        with server.stats_lock:
+            server.requests[route] = server.requests.get(route, 0) + 1
+        handler(url, parts)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _dispatch
+
+    def _get_key(self, url, parts):
+        key = self.server.store.issue_key(self.headers.get('email'), self.headers.get('password'))
+        if key is None:
+            return self._send(403, "<h1>Forbidden</h1><p>This user wasn't found in database</p>")
+        self._send(200, {'key': key})
+
+    def _get_pets(self, url, parts):
+        user_id = self._user()
+        if user_id is None:
+            return self._forbidden()
+        filter = parse_qs(url.query).get('filter', [''])[0]
+        if filter not in ('', 'my_pets'):
+            return self._send(500, '<h1>Internal Server Error</h1>')
+        self._send(200, {'pets': self.server.store.list(user_id if filter == 'my_pets' else None)})
+
+    @staticmethod
+    def _photo_uri(photo: tuple):
+        """ Фото в виде data URI, как его отдаёт сервер; None - файл не является картинкой """
+        filename, content_type, payload = photo
+        detected = guess_content_type(payload[:16])
+        if not detected.startswith('image/'):
+            return None
+        return 'data:%s;base64,%s' % (detected, base64.b64encode(payload).decode('ascii'))
+
+    def _post_pet(self, url, parts):
+        user_id = self._user()
+        fields, files = self._form()
+        if user_id is None:
+            return self._forbidden()
+        if 'pet_photo' not in files:
+            return self._send(400, '<h1>Bad Request</h1>')
+        # Как и настоящий сервер, не проверяет имя, вид и возраст питомца
+        pet = self.server.store.add(user_id, fields.get('name', ''), fields.get('animal_type', ''),
+                                    fields.get('age', ''), self._photo_uri(files['pet_photo']) or '')
+        self._send(200, pet)
+
+    def _create_pet_simple(self, url, parts):
+        user_id = self._user()
+        fields, _ = self._form()
+        if user_id is None:
+            return self._forbidden()
+        pet = self.server.store.add(user_id, fields.get('name', ''), fields.get('animal_type', ''),
+                                    fields.get('age', ''))
+        self._send(200, pet)
+
+    def _own_pet(self, parts):
+        """ (user_id, pet) для /api/pets/<id>; pet = None, если питомца нет """
+        user_id = self._user()
+        pet_id = parts[-1] if len(parts) > 2 else ''
+        with self.server.store.lock:
+            pet = self.server.store.pets.get(pet_id)
+        return user_id, pet
+
+    def _put_pet(self, url, parts):
+        fields, _ = self._form()
+        user_id, pet = self._own_pet(parts)
+        if user_id is None or (pet is not None and pet['user_id'] != user_id):
+            return self._forbidden()
+        if pet is None:
+            return self._send(400, '<h1>Bad Request</h1><p>Pet with this id wasn\'t found!</p>')
+        with self.server.store.lock:
+            for name in ('name', 'animal_type', 'age'):
+                if name in fields:
+                    pet[name] = fields[name]
+            pet = dict(pet)
+        self._send(200, pet)
+
+    def _delete_pet(self, url, parts):
+        self._body()
+        user_id, pet = self._own_pet(parts)
+        if user_id is None or (pet is not None and pet['user_id'] != user_id):
+            return self._forbidden()
+        if pet is not None:
+            with self.server.store.lock:
+                self.server.store.pets.pop(pet['id'], None)
+        # Настоящий сервер отвечает на удаление 200 с пустым телом
+        self._send(200, b'')
+
+    def _set_photo(self, url, parts):
+        _, files = self._form()
+        user_id, pet = self._own_pet(parts)
+        if user_id is None or (pet is not None and pet['user_id'] != user_id):
+            return self._forbidden()
+        if pet is None or 'pet_photo' not in files:
+            return self._send(400, '<h1>Bad Request</h1>')
+        photo = self._photo_uri(files['pet_photo'])
+        if photo is None:
+            # Как и настоящий сервер, падает на файлах, которые не являются картинками
+            return self._send(500, '<h1>Internal Server Error</h1>')
+        with self.server.store.lock:
+            pet['pet_photo'] = photo
+            pet = dict(pet)
+        self._send(200, pet)
+
+
+class PetFriendsServer(ThreadingHTTPServer):
+    """ Локальная замена https://petfriends.skillfactory.ru/ для тестов и нагрузочных прогонов без сети.
+    Поддерживает те же эндпоинты, что использует PetFriends, с особенностями настоящего сервера
+    (пустое тело 200 при удалении, 500 на не-картинку в set_photo, отсутствие проверок полей).
+    accounts - {email: password} пользователей, которым выдаётся ключ.
+    latency - задержка ответа в секундах: число или диапазон (min, max);
+    error_rate - доля запросов, на которые сервер отвечает error_status (по умолчанию 500).
+    seed_pets - сколько чужих питомцев создать заранее, чтобы общий список не был пустым.
+    Запускается в фоновом потоке: start() / stop() или через with """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, accounts: dict, host: str = '127.0.0.1', port: int = 0, latency=0, error_rate: float = 0,
+                 error_status: int = 500, seed: int = None, seed_pets: int = 0):
+        super().__init__((host, port), _Handler)
+        self.store = PetStore(accounts)
+        for i in range(seed_pets):
+            self.store.add('0' * 32, 'pet%d' % i, 'cat', str(i % 20))
+        self.latency = (latency, latency) if isinstance(latency, (int, float)) and latency else latency or None
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.stats_lock = threading.Lock()
+        self.requests = {}
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return 'http://%s:%d/' % (host, port)
+
+    def start(self) -> 'PetFriendsServer':
+        self._thread = threading.Thread(target=self.serve_forever, args=(0.05,), name='petfriends-local',
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
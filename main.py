@@ -1,16 +1,258 @@
-# This is a sample Python script.
+""" Нагрузочный прогон и бенчмарк PetFriends.
 
-# Press Shift+F10 to execute it or replace it with your code.
-# Press Double Shift to search everywhere for classes, files, tool windows, actions, and settings.
+Примеры:
+    python main.py --local --scenario list --users 8 --duration 30 --output list.json
+    python main.py --scenario churn --mode open --rate 20 --duration 60
+    python main.py --local --scenario list --users 8 --duration 30 --baseline list.json --threshold 0.2
 
+closed - замкнутая модель: users пользователей выполняют сценарий друг за другом без пауз;
+open - открытая модель: итерации запускаются с постоянной частотой rate в секунду независимо
+от того, успел ли сервер ответить на предыдущие. Задержка итерации в open считается от
+запланированного момента запуска, поэтому очередь на стороне клиента не скрывает медленный сервер.
+Код выхода 1 - результат хуже --baseline больше чем на --threshold; сравнивать можно только прогоны
+с тем же сценарием и режимом (иначе код выхода 2) """
 
-def print_hi(name):
-    # Use a breakpoint in the code line below to debug your script.
-    print(f'Hi, {name}')  # Press Ctrl+F8 to toggle the breakpoint.
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+from api import PetFriends
+from instrumentation import HistogramSink
+from stats import LatencyHistogram
+from transport import HttpTransport
 
-# Press the green button in the gutter to run the script.
-if __name__ == '__main__':
-    print_hi('PyCharm')
+PHOTOS = sorted(path for path in glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'images', '*'))
+                if path.lower().endswith(('.jpg', '.jpeg', '.png')))
+
+
+# --- сценарии: одна итерация одного пользователя ---
+
+def scenario_list(pf, auth_key, rng):
+    """ Чтение: общий список питомцев и, реже, список своих """
+    pf.get_list_of_pets(auth_key, 'my_pets' if rng.random() < 0.3 else '')
+
+
+def scenario_churn(pf, auth_key, rng):
+    """ Создание, изменение и удаление питомца """
+    status, pet = pf.post_new_pet_simple(auth_key, 'Load', 'cat', str(rng.randint(1, 20)))
+    if status == 200:
+        pf.put_update_pet(auth_key, pet['id'], 'Load2', 'dog', str(rng.randint(1, 20)))
+        pf.delete_pet(auth_key, pet['id'], result_mode='status')
+
+
+def scenario_upload(pf, auth_key, rng):
+    """ Создание питомца с фото из images/, замена фото и удаление """
+    status, pet = pf.post_new_pet(auth_key, 'Load', 'cat', '1', rng.choice(PHOTOS))
+    if status == 200:
+        pf.post_add_photo(auth_key, pet['id'], rng.choice(PHOTOS))
+        pf.delete_pet(auth_key, pet['id'], result_mode='status')
+
+
+SCENARIOS = {'list': scenario_list, 'churn': scenario_churn, 'upload': scenario_upload}
+
+
+class LoadRecorder(HistogramSink):
+    """ instrumentation.HistogramSink с эндпоинтами по методу ('GET api/pets', ...), который
+    отдельно считает итерации сценария целиком """
+
+    def __init__(self):
+        super().__init__(by_method=True)
+        self.iterations = LatencyHistogram()
+        self.iteration_errors = 0
+
+    def iteration(self, latency: float, error: Exception = None):
+        with self._lock:
+            self.iterations.record(latency)
+            if error is not None:
+                self.iteration_errors += 1
+
+
+def _summary(histogram: LatencyHistogram, errors: int, elapsed: float) -> dict:
+    return {
+        'count': histogram.count,
+        'errors': errors,
+        'throughput': histogram.count / elapsed if elapsed else 0.0,
+        'mean': histogram.mean,
+        'p50': histogram.percentile(50),
+        'p90': histogram.percentile(90),
+        'p99': histogram.percentile(99),
+        'p999': histogram.percentile(99.9),
+        'max': histogram.max or 0.0,
+        'histogram': histogram.to_dict(),
+    }
+
+
+def _iterate(scenario, pf, auth_key, rng, recorder: LoadRecorder, scheduled: float):
+    error = None
+    try:
+        scenario(pf, auth_key, rng)
+    except Exception as e:
+        error = e
+    recorder.iteration(time.perf_counter() - scheduled, error)
+
+
+def run_closed(pf, auth_key, scenario, users: int, duration: float, recorder: LoadRecorder, seed: int = None):
+    """ users потоков выполняют сценарий подряд, пока не выйдет duration секунд """
+    deadline = time.perf_counter() + duration
 
-# See PyCharm help at https://www.jetbrains.com/help/pycharm/
+    def user(index):
+        rng = random.Random(None if seed is None else seed + index)
+        while time.perf_counter() < deadline:
+            _iterate(scenario, pf, auth_key, rng, recorder, time.perf_counter())
+
+    threads = [threading.Thread(target=user, args=(i,), name='load-user-%d' % i) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_open(pf, auth_key, scenario, rate: float, duration: float, recorder: LoadRecorder, workers: int = 64,
+             seed: int = None):
+    """ Запускает итерации с частотой rate в секунду в течение duration секунд; не больше workers
+    итераций выполняются одновременно, остальные ждут в очереди, и это ожидание входит в их задержку """
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(workers, thread_name_prefix='load') as executor:
+        for i in range(int(rate * duration)):
+            scheduled = started + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(_iterate, scenario, pf, auth_key, random.Random(rng.random()), recorder, scheduled)
+
+
+def load_workers(mode: str, users: int) -> int:
+    """ Сколько потоков одновременно отправляют запросы в режиме mode: по ним же задаётся размер
+    пула соединений транспорта, иначе лишние соединения открываются и закрываются на каждый запрос
+    и прогон измеряет их установку, а не клиент """
+    return users if mode == 'closed' else max(users, 64)
+
+
+def run_load(pf, auth_key, scenario: str = 'list', mode: str = 'closed', users: int = 8, rate: float = 10,
+             duration: float = 10, seed: int = None) -> dict:
+    """ Прогоняет сценарий на клиенте pf и возвращает результат, пригодный для json.dump """
+    recorder = LoadRecorder()
+    pf.add_hook(recorder)
+    started = time.perf_counter()
+    try:
+        if mode == 'closed':
+            run_closed(pf, auth_key, SCENARIOS[scenario], users, duration, recorder, seed)
+        elif mode == 'open':
+            run_open(pf, auth_key, SCENARIOS[scenario], rate, duration, recorder, load_workers(mode, users), seed)
+        else:
+            raise ValueError('неизвестный режим нагрузки: %s' % mode)
+    finally:
+        pf.remove_hook(recorder)
+    elapsed = time.perf_counter() - started
+    return {
+        'scenario': scenario,
+        'mode': mode,
+        'users': users if mode == 'closed' else None,
+        'rate': rate if mode == 'open' else None,
+        'duration': elapsed,
+        'timestamp': time.time(),
+        'iterations': _summary(recorder.iterations, recorder.iteration_errors, elapsed),
+        'endpoints': {name: _summary(data['histogram'], data['errors'], elapsed)
+                      for name, data in sorted(recorder.snapshot().items())},
+    }
+
+
+def compare(result: dict, baseline: dict, threshold: float = 0.1, min_count: int = 10) -> list:
+    """ Регрессии относительно baseline: рост p50/p99 или падение пропускной способности
+    эндпоинта больше чем на долю threshold. Эндпоинты, у которых в baseline меньше min_count
+    запросов (например, api/key), не сравниваются: по нескольким замерам перцентили случайны.
+    Прогоны с разными сценарием или режимом нагрузки несравнимы - в этом случае ValueError.
+    Возвращает список описаний (пустой - регрессий нет) """
+    for field in ('scenario', 'mode'):
+        if result.get(field) != baseline.get(field):
+            raise ValueError('baseline получен с %s=%s, а текущий прогон - с %s=%s' % (
+                field, baseline.get(field), field, result.get(field)))
+    regressions = []
+    for name, base in sorted(baseline.get('endpoints', {}).items()):
+        if base['count'] < min_count:
+            continue
+        current = result.get('endpoints', {}).get(name)
+        if current is None:
+            regressions.append('%s: нет запросов в текущем прогоне' % name)
+            continue
+        for metric in ('p50', 'p99'):
+            if base[metric] and current[metric] > base[metric] * (1 + threshold):
+                regressions.append('%s: %s %.1f мс -> %.1f мс' % (name, metric, base[metric] * 1e3,
+                                                                  current[metric] * 1e3))
+        if base['throughput'] and current['throughput'] < base['throughput'] * (1 - threshold):
+            regressions.append('%s: throughput %.1f/с -> %.1f/с' % (name, base['throughput'], current['throughput']))
+    return regressions
+
+
+def _print_result(result: dict):
+    print('%-28s %8s %7s %9s %9s %9s %9s' % ('endpoint', 'count', 'errors', 'rps', 'p50, мс', 'p99, мс',
+                                            'max, мс'))
+    rows = dict(result['endpoints'], iteration=result['iterations'])
+    for name, data in rows.items():
+        print('%-28s %8d %7d %9.1f %9.2f %9.2f %9.2f' % (name, data['count'], data['errors'], data['throughput'],
+                                                         data['p50'] * 1e3, data['p99'] * 1e3, data['max'] * 1e3))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Нагрузочный прогон PetFriends')
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='list')
+    parser.add_argument('--mode', choices=('closed', 'open'), default='closed')
+    parser.add_argument('--users', type=int, default=8, help='число пользователей в режиме closed')
+    parser.add_argument('--rate', type=float, default=10, help='итераций в секунду в режиме open')
+    parser.add_argument('--duration', type=float, default=10, help='длительность прогона в секундах')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--base-url', default=None, help='адрес сервера (по умолчанию PETFRIENDS_BASE_URL)')
+    parser.add_argument('--local', action='store_true', help='поднять локальный PetFriendsServer')
+    parser.add_argument('--local-latency', type=float, default=0, help='задержка ответа локального сервера, с')
+    parser.add_argument('--output', help='сохранить результат в JSON')
+    parser.add_argument('--baseline', help='JSON предыдущего прогона для сравнения')
+    parser.add_argument('--threshold', type=float, default=0.1, help='допустимое ухудшение, доля (0.1 = 10%%)')
+    args = parser.parse_args(argv)
+
+    from settings import load_credentials
+
+    server = None
+    base_url = args.base_url
+    email, password = load_credentials()
+    if args.local:
+        from local_server import PetFriendsServer
+        email, password = email or 'user@example.com', password or 'password'
+        server = PetFriendsServer({email: password}, seed_pets=20, latency=args.local_latency).start()
+        base_url = server.base_url
+    try:
+        transport = HttpTransport(pool_maxsize=load_workers(args.mode, args.users))
+        with PetFriends(base_url=base_url, transport=transport) as pf:
+            result = run_load(pf, pf.credential(email, password), args.scenario, args.mode, args.users, args.rate,
+                              args.duration, args.seed)
+    finally:
+        if server is not None:
+            server.stop()
+
+    _print_result(result)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        try:
+            regressions = compare(result, baseline, args.threshold)
+        except ValueError as e:
+            print('ОШИБКА', e)
+            return 2
+        for regression in regressions:
+            print('РЕГРЕССИЯ', regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+import base64
+import sys
+
+try:
+    import orjson as _json
+    JSON_BACKEND = 'orjson'
+except ImportError:
+    try:
+        import ujson as _json
+        JSON_BACKEND = 'ujson'
+    except ImportError:
+        import json as _json
+        JSON_BACKEND = 'json'
+
+
+def loads(data):
+    """ Разбирает JSON самым быстрым из установленных парсеров: orjson, ujson или стандартный json """
+    return _json.loads(data)
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Pet:
+    """ Компактная запись о питомце. Благодаря __slots__ занимает заметно меньше памяти,
+    чем dict из res.json(). Часто повторяющиеся значения (вид, возраст, владелец) хранятся
+    в одном экземпляре строки. Фото хранится как есть (data URI с base64) и декодируется
+    в байты только при обращении к photo_bytes """
+
+    __slots__ = ('id', 'name', 'animal_type', 'age', 'created_at', 'user_id', 'pet_photo', '_photo_bytes')
+
+    def __init__(self, id: str, name: str = '', animal_type: str = '', age: str = '', created_at: str = '',
+                 user_id: str = '', pet_photo: str = ''):
+        self.id = id
+        self.name = name
+        self.animal_type = animal_type
+        self.age = age
+        self.created_at = created_at
+        self.user_id = user_id
+        self.pet_photo = pet_photo
+        self._photo_bytes = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Pet':
+        """ Поля, пришедшие как null, остаются None, как в dict из res.json() """
+        age = data.get('age', '')
+        return cls(data['id'], data.get('name', ''), _intern(data.get('animal_type', '')),
+                   _intern(age if age is None else str(age)), data.get('created_at', ''),
+                   _intern(data.get('user_id', '')), data.get('pet_photo', ''))
+
+    @property
+    def photo_bytes(self) -> bytes:
+        """ Фото в байтах; base64 декодируется при первом обращении """
+        if self._photo_bytes is None:
+            _, _, encoded = (self.pet_photo or '').partition('base64,')
+            self._photo_bytes = base64.b64decode(encoded) if encoded else b''
+        return self._photo_bytes
+
+    def to_dict(self) -> dict:
+        return {'id': self.id, 'name': self.name, 'animal_type': self.animal_type, 'age': self.age,
+                'created_at': self.created_at, 'user_id': self.user_id, 'pet_photo': self.pet_photo}
+
+    def __eq__(self, other):
+        return isinstance(other, Pet) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return 'Pet(id=%r, name=%r, animal_type=%r, age=%r)' % (self.id, self.name, self.animal_type, self.age)
+
+
+class PetList(list):
+    """ Список Pet, который get_list_of_pets возвращает при as_models=True вместо {'pets': [...]} """
+
+    @classmethod
+    def from_json(cls, data) -> 'PetList':
+        """ data - тело ответа api/pets (bytes или str) """
+        return cls(Pet.from_dict(pet) for pet in loads(data)['pets'])
+
+    def to_dict(self) -> dict:
+        return {'pets': [pet.to_dict() for pet in self]}
@@ -0,0 +1,228 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from auth import Credential
+from models import loads
+
+
+class PetIndex:
+    """ Список питомцев с индексами по id, name и animal_type: поиск за O(1) вместо перебора
+    result['pets']. pets - питомцы в порядке ответа сервера (новые, добавленные через кэш, - в начале) """
+
+    def __init__(self, pets: list = ()):
+        self._by_id = OrderedDict()
+        self._by_name = {}
+        self._by_type = {}
+        for pet in pets:
+            self._by_id[pet['id']] = pet
+            self._link(pet)
+
+    def _link(self, pet: dict):
+        self._by_name.setdefault(pet.get('name'), {})[pet['id']] = pet
+        self._by_type.setdefault(pet.get('animal_type'), {})[pet['id']] = pet
+
+    def _unlink(self, pet: dict):
+        for index, field in ((self._by_name, 'name'), (self._by_type, 'animal_type')):
+            group = index.get(pet.get(field))
+            if group is not None:
+                group.pop(pet['id'], None)
+                if not group:
+                    del index[pet.get(field)]
+
+    @property
+    def pets(self) -> list:
+        return list(self._by_id.values())
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __contains__(self, pet_id):
+        return pet_id in self._by_id
+
+    def get(self, pet_id: str):
+        return self._by_id.get(pet_id)
+
+    def find_by_name(self, name: str) -> list:
+        return list(self._by_name.get(name, {}).values())
+
+    def find_by_type(self, animal_type: str) -> list:
+        return list(self._by_type.get(animal_type, {}).values())
+
+    def add(self, pet: dict):
+        """ Добавляет нового питомца в начало списка, как его показывает сервер """
+        self.remove(pet['id'])
+        self._by_id[pet['id']] = pet
+        self._by_id.move_to_end(pet['id'], last=False)
+        self._link(pet)
+
+    def update(self, pet: dict):
+        old = self._by_id.get(pet['id'])
+        if old is None:
+            return
+        self._unlink(old)
+        merged = dict(old, **pet)
+        self._by_id[pet['id']] = merged
+        self._link(merged)
+
+    def remove(self, pet_id: str):
+        pet = self._by_id.pop(pet_id, None)
+        if pet is not None:
+            self._unlink(pet)
+
+
+class _Entry:
+    __slots__ = ('index', 'etag', 'digest', 'checked')
+
+    def __init__(self, index, etag, digest, checked):
+        self.index = index
+        self.etag = etag
+        self.digest = digest
+        self.checked = checked
+
+
+class PetListCache:
+    """ Кэш результатов get_list_of_pets по паре (учётные данные, filter) с вытеснением по TTL и LRU.
+    По истечении ttl секунд список перепроверяется: с If-None-Match, если сервер отдал ETag,
+    а иначе сравнением хэша тела ответа - при совпадении JSON заново не разбирается и индекс
+    не перестраивается. Создание, изменение и удаление питомцев через методы кэша сразу
+    отражаются в закэшированных списках без повторной загрузки. Кэш подписан на запросы клиента
+    (хук pf.add_hook), поэтому и прямые вызовы client.post_new_pet, put_update_pet, delete_pet и
+    post_add_photo не оставляют устаревших списков: удалённый питомец убирается из индексов, а списки,
+    где мог появиться новый или изменённый питомец, сбрасываются. Списки, полученные с Credential,
+    хранятся под самим Credential, поэтому переживают обновление ключа после 403.
+    stats: hits - ответ из кэша, revalidated - список не изменился, fetched - список загружен заново """
+
+    def __init__(self, client, ttl: float = 30, maxsize: int = 64):
+        self.client = client
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {'hits': 0, 'revalidated': 0, 'fetched': 0}
+        client.add_hook(self._on_request)
+
+    @staticmethod
+    def _key_of(auth_key):
+        return auth_key if isinstance(auth_key, Credential) else auth_key['key']
+
+    def get(self, auth_key, filter: str = '') -> tuple:
+        """ Возвращает статус и PetIndex со списком питомцев (None, если сервер вернул ошибку) """
+        cache_key = (self._key_of(auth_key), filter)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                self._entries.move_to_end(cache_key)
+                if time.monotonic() - entry.checked < self.ttl:
+                    self.stats['hits'] += 1
+                    return 200, entry.index
+            etag = entry.etag if entry is not None else None
+
+        headers = {'If-None-Match': etag} if etag else None
+        res = self.client._request('GET', 'api/pets', auth_key=auth_key, headers=headers,
+                                   params={'filter': filter})
+        if res.status_code == 304 and entry is not None:
+            with self._lock:
+                entry.checked = time.monotonic()
+                self.stats['revalidated'] += 1
+            return 200, entry.index
+        if res.status_code != 200:
+            return res.status_code, None
+
+        digest = hashlib.sha1(res.content).digest()
+        etag = res.headers.get('ETag')
+        with self._lock:
+            if entry is not None and entry.digest == digest:
+                entry.etag, entry.checked = etag, time.monotonic()
+                self.stats['revalidated'] += 1
+                return 200, entry.index
+
+        entry = _Entry(PetIndex(loads(res.content)['pets']), etag, digest, time.monotonic())
+        with self._lock:
+            self._entries[cache_key] = entry
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            self.stats['fetched'] += 1
+        return 200, entry.index
+
+    def invalidate(self, auth_key=None):
+        """ Сбрасывает кэш целиком или только списки, полученные с указанными учётными данными """
+        with self._lock:
+            if auth_key is None:
+                self._entries.clear()
+                return
+            key = self._key_of(auth_key)
+            for cache_key in [k for k in self._entries if k[0] == key]:
+                del self._entries[cache_key]
+
+    def _on_request(self, record):
+        """ Хук клиента: учитывает изменения, сделанные в обход методов кэша. Ключ запроса хуку
+        не виден, поэтому новый или изменённый питомец сбрасывает все списки, где он мог оказаться """
+        if getattr(self._local, 'own', False) or record.status != 200 or record.method == 'GET':
+            return
+        pet_id = record.path.rsplit('/', 1)[1] if record.path.startswith('api/pets/') else None
+        with self._lock:
+            if pet_id is None:
+                # новый питомец: api/pets или api/create_pet_simple
+                self._entries.clear()
+            elif record.method == 'DELETE':
+                for entry in self._entries.values():
+                    if pet_id in entry.index:
+                        entry.index.remove(pet_id)
+                        entry.digest = entry.etag = None
+            else:
+                # изменение питомца или новое фото
+                for cache_key in [k for k, entry in self._entries.items() if pet_id in entry.index]:
+                    del self._entries[cache_key]
+
+    def _apply(self, auth_key, change):
+        """ Применяет change(index) ко всем спискам, где изменение видно: свои питомцы этого ключа
+        и общие списки всех питомцев. Закэшированный хэш сбрасывается, чтобы следующая
+        перепроверка не приняла старое тело ответа за неизменившийся список """
+        key = self._key_of(auth_key)
+        with self._lock:
+            for (entry_key, filter), entry in self._entries.items():
+                if filter == '' or entry_key == key:
+                    change(entry.index)
+                    entry.digest = entry.etag = None
+
+    def _own(self, call, *args):
+        """ Вызов метода клиента, изменения которого кэш применит сам: хук его пропускает """
+        self._local.own = True
+        try:
+            return call(*args)
+        finally:
+            self._local.own = False
+
+    def post_new_pet(self, auth_key, name: str, animal_type: str, age: str, pet_photo, progress=None):
+        status, result = self._own(self.client.post_new_pet, auth_key, name, animal_type, age, pet_photo, progress)
+        if status == 200 and isinstance(result, dict) and 'id' in result:
+            self._apply(auth_key, lambda index: index.add(result))
+        return status, result
+
+    def post_new_pet_simple(self, auth_key, name: str, animal_type: str, age: str):
+        status, result = self._own(self.client.post_new_pet_simple, auth_key, name, animal_type, age)
+        if status == 200 and isinstance(result, dict) and 'id' in result:
+            self._apply(auth_key, lambda index: index.add(result))
+        return status, result
+
+    def put_update_pet(self, auth_key, pet_id: str, name: str, animal_type: str, age: int):
+        status, result = self._own(self.client.put_update_pet, auth_key, pet_id, name, animal_type, age)
+        if status == 200:
+            pet = dict(result, id=pet_id) if isinstance(result, dict) else \
+                {'id': pet_id, 'name': name, 'animal_type': animal_type, 'age': str(age)}
+            self._apply(auth_key, lambda index: index.update(pet))
+        return status, result
+
+    def delete_pet(self, auth_key, pet_id: str):
+        status, result = self._own(self.client.delete_pet, auth_key, pet_id)
+        if status == 200:
+            self._apply(auth_key, lambda index: index.remove(pet_id))
+        return status, result
+
+    def close(self):
+        """ Отписывает кэш от запросов клиента """
+        self.client.remove_hook(self._on_request)
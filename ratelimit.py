@@ -0,0 +1,140 @@
+import os
+import struct
+import threading
+import time
+
+ENDPOINTS = ('api/key', 'api/pets', 'api/pets/set_photo', 'api/create_pet_simple')
+
+
+def endpoint_of(path: str) -> str:
+    """ Сводит путь запроса к эндпоинту для лимитов: 'api/pets/<id>' -> 'api/pets',
+    'api/pets/set_photo/<id>' -> 'api/pets/set_photo' """
+    path = path.split('?', 1)[0].strip('/')
+    if path.startswith('api/pets/set_photo'):
+        return 'api/pets/set_photo'
+    if path.startswith('api/pets'):
+        return 'api/pets'
+    return path
+
+
+class TokenBucket:
+    """ Ведро токенов внутри одного процесса: rate токенов в секунду, не больше capacity про запас.
+    reserve() сразу забирает токен (баланс может уйти в минус) и возвращает, сколько нужно подождать,
+    поэтому ожидающие обслуживаются по очереди и без повторных попыток """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def reserve(self, tokens: float = 1) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+
+class FileTokenBucket(TokenBucket):
+    """ Ведро токенов, общее для всех процессов на машине: состояние (баланс и время обновления)
+    хранится в файле path и меняется под эксклюзивной блокировкой fcntl.flock. Работает на Unix """
+
+    _STATE = struct.Struct('dd')
+
+    def __init__(self, path: str, rate: float, capacity: float = None):
+        super().__init__(rate, capacity)
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        os.close(fd)
+
+    def reserve(self, tokens: float = 1) -> float:
+        import fcntl
+
+        with self._lock, open(self.path, 'r+b') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                now = time.time()
+                raw = f.read(self._STATE.size)
+                if len(raw) == self._STATE.size:
+                    balance, updated = self._STATE.unpack(raw)
+                    balance = min(self.capacity, balance + max(0.0, now - updated) * self.rate)
+                else:
+                    balance = self.capacity
+                balance -= tokens
+                f.seek(0)
+                f.write(self._STATE.pack(balance, now))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return -balance / self.rate if balance < 0 else 0.0
+
+
+class RateLimiter:
+    """ Ограничитель частоты запросов PetFriends по эндпоинтам.
+    limits - {'api/pets': (rate, burst), ...}: rate запросов в секунду и допустимый всплеск;
+    эндпоинты без лимита (и без default) не ограничиваются. Один объект можно использовать из
+    многих потоков (acquire) и из asyncio (acquire_async). Если задан state_dir, состояние вёдер
+    хранится в файлах этого каталога и лимит становится общим для всех процессов, которые
+    используют тот же каталог. metrics() - число запросов и время ожидания по эндпоинтам """
+
+    def __init__(self, limits: dict, default: tuple = None, state_dir: str = None):
+        self._limits = dict(limits)
+        self._default = default
+        self._state_dir = state_dir
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _bucket(self, endpoint: str):
+        with self._lock:
+            if endpoint not in self._buckets:
+                limit = self._limits.get(endpoint, self._default)
+                if limit is None:
+                    bucket = None
+                elif self._state_dir is not None:
+                    path = os.path.join(self._state_dir, endpoint.replace('/', '_') + '.bucket')
+                    bucket = FileTokenBucket(path, *limit)
+                else:
+                    bucket = TokenBucket(*limit)
+                self._buckets[endpoint] = bucket
+            return self._buckets[endpoint]
+
+    def _reserve(self, path: str) -> tuple:
+        endpoint = endpoint_of(path)
+        bucket = self._bucket(endpoint)
+        return endpoint, bucket.reserve() if bucket is not None else 0.0
+
+    def _record(self, endpoint: str, waited: float):
+        with self._lock:
+            metrics = self._metrics.setdefault(endpoint, {'requests': 0, 'delayed': 0, 'wait_total': 0.0,
+                                                          'wait_max': 0.0})
+            metrics['requests'] += 1
+            if waited > 0:
+                metrics['delayed'] += 1
+                metrics['wait_total'] += waited
+                metrics['wait_max'] = max(metrics['wait_max'], waited)
+
+    def acquire(self, path: str) -> float:
+        """ Блокирует поток, пока запрос к path не уложится в лимит; возвращает время ожидания """
+        endpoint, delay = self._reserve(path)
+        if delay > 0:
+            time.sleep(delay)
+        self._record(endpoint, delay)
+        return delay
+
+    async def acquire_async(self, path: str) -> float:
+        """ То же, что acquire, но ждёт через asyncio.sleep, не занимая поток """
+        import asyncio
+
+        endpoint, delay = self._reserve(path)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._record(endpoint, delay)
+        return delay
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {endpoint: dict(values) for endpoint, values in self._metrics.items()}
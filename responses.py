@@ -0,0 +1,100 @@
+# Режимы разбора ответа для методов PetFriends (result_mode=...):
+# json - сразу разобрать JSON, а если тело не JSON - вернуть текст (как раньше);
+# lazy - LazyJSON, который разбирает тело при первом обращении;
+# bytes - тело ответа как есть; status - тело не читается и не разбирается, result = None
+RESULT_MODES = ('json', 'lazy', 'bytes', 'status')
+
+
+def _parse(body: bytes, encoding: str = None):
+    from models import loads
+
+    try:
+        return loads(body)
+    except ValueError:
+        return body.decode(encoding or 'utf-8', 'replace')
+
+
+class LazyJSON:
+    """ Тело ответа, которое разбирается только при первом обращении к данным: result['pets'],
+    result.get('key'), 'key' in result, сравнение с dict и т. п. Пока к данным не обращались,
+    на разбор не тратится время. value - разобранный JSON или текст, если тело не JSON,
+    body - исходные bytes """
+
+    __slots__ = ('body', '_encoding', '_value', '_parsed')
+
+    def __init__(self, body: bytes, encoding: str = None):
+        self.body = body
+        self._encoding = encoding
+        self._value = None
+        self._parsed = False
+
+    @property
+    def value(self):
+        if not self._parsed:
+            self._value = _parse(self.body, self._encoding)
+            self._parsed = True
+        return self._value
+
+    def __getitem__(self, key):
+        return self.value[key]
+
+    def get(self, key, default=None):
+        return self.value.get(key, default)
+
+    def __contains__(self, item):
+        return item in self.value
+
+    def __iter__(self):
+        return iter(self.value)
+
+    def __len__(self):
+        return len(self.value)
+
+    def __eq__(self, other):
+        return self.value == (other.value if isinstance(other, LazyJSON) else other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'LazyJSON(%d bytes)' % len(self.body)
+
+
+def discard(res, limit: int = 64 * 1024):
+    """ Освобождает ответ, прочитанный с stream=True, не разбирая тело. Небольшое тело (до limit байт
+    по Content-Length) дочитывается и выбрасывается, чтобы keep-alive соединение вернулось в пул;
+    тело большего или неизвестного размера не скачивается - соединение просто закрывается """
+    length = res.headers.get('Content-Length')
+    if length is not None and length.isdigit() and int(length) <= limit:
+        for _ in res.iter_content(limit):
+            pass
+    res.close()
+
+
+def check_mode(mode: str) -> str:
+    if mode not in RESULT_MODES:
+        raise ValueError('неизвестный режим разбора ответа: %r, ожидается один из %s' % (mode, RESULT_MODES))
+    return mode
+
+
+def read_result(res, mode: str = 'json', models: bool = False):
+    """ result ответа в режиме mode (см. RESULT_MODES). models=True - для успешного ответа api/pets
+    вернуть models.PetList вместо JSON (в режимах json и lazy) """
+    # models (и парсер JSON) загружается при первом разборе ответа, а не при import api
+    from models import PetList, loads
+
+    if mode == 'status':
+        discard(res)
+        return None
+    if mode == 'bytes':
+        return res.content
+    if models and res.status_code == 200:
+        try:
+            return PetList.from_json(res.content)
+        except (ValueError, KeyError):
+            return res.text
+    if mode == 'lazy':
+        return LazyJSON(res.content, res.encoding)
+    try:
+        return loads(res.content)
+    except ValueError:
+        return res.text
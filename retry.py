@@ -0,0 +1,199 @@
+import random
+import threading
+import time
+from collections import deque
+
+
+class CircuitOpenError(Exception):
+    """ Запрос не отправлен: автомат разомкнут, потому что сервер подряд отвечал ошибками """
+
+    def __init__(self, retry_in: float):
+        super().__init__('сервер недоступен, следующая попытка через %.1f с' % retry_in)
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """ Автомат-предохранитель: после failure_threshold ошибок подряд (5xx или обрыв соединения)
+    размыкается на reset_timeout секунд и все запросы сразу получают CircuitOpenError, не занимая
+    потоки и соединения. Затем пропускает один пробный запрос: успех замыкает автомат, ошибка
+    снова размыкает его """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if self._clock() - self._opened_at < self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def before_request(self) -> bool:
+        """ Пропускает запрос или выбрасывает CircuitOpenError. True - запрос пробный: его исход нужно
+        передать в record_success/record_failure, а если исхода нет - вызвать release_trial """
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return False
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            retry_in = max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+        raise CircuitOpenError(retry_in)
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """ Пробный запрос завершился без ответа и без обрыва соединения (исключение клиента):
+        автомат остаётся полуоткрытым и пропустит следующий пробный запрос """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+            self._trial_in_flight = False
+
+
+class RetryBudget:
+    """ Общий бюджет повторов: за последние window секунд повторов может быть не больше
+    min_retries + ratio * число исходных запросов. Не даёт повторам удвоить нагрузку
+    на и без того упавший сервер """
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 10, window: float = 10, clock=time.monotonic):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._requests = deque()
+        self._retries = deque()
+
+    def _trim(self, now: float):
+        for events in (self._requests, self._retries):
+            while events and now - events[0] > self.window:
+                events.popleft()
+
+    def deposit(self):
+        """ Учитывает исходный (не повторный) запрос """
+        with self._lock:
+            now = self._clock()
+            self._trim(now)
+            self._requests.append(now)
+
+    def withdraw(self) -> bool:
+        """ Забирает из бюджета один повтор; False - бюджет исчерпан """
+        with self._lock:
+            now = self._clock()
+            self._trim(now)
+            if len(self._retries) >= self.min_retries + self.ratio * len(self._requests):
+                return False
+            self._retries.append(now)
+            return True
+
+
+def idempotent_set_photo(method: str, path: str) -> bool:
+    """ Правило по умолчанию для POST: повторная установка того же фото безопасна,
+    а повтор создания питомца может создать дубликат """
+    return path.startswith('api/pets/set_photo/')
+
+
+# Сервер отвечает 500 на любой не-картинку в set_photo - это ответ на сами данные, а не сбой сервера,
+# поэтому для загрузки фото повторяются только ошибки шлюза и обрывы соединения
+PHOTO_RETRY_STATUSES = (502, 503, 504)
+
+
+class RetryPolicy:
+    """ Политика повторов для PetFriends(retry=...).
+    Повторяются ответы со статусами из retry_statuses и обрывы соединения (OSError, в том числе
+    исключения requests). GET/PUT/DELETE идемпотентны и повторяются всегда, POST - только если
+    post_rule(method, path) возвращает True. Для api/pets/set_photo вместо retry_statuses действуют
+    photo_retry_statuses: 500 на неподходящий файл не повторяется и не считается отказом сервера.
+    Пауза перед попыткой n - случайная величина от 0 до min(backoff_max, backoff * 2 ** (n - 1))
+    (full jitter), но не меньше Retry-After от сервера.
+    budget ограничивает общую долю повторов, breaker - автомат, размыкающийся при падении сервера;
+    передайте None, чтобы отключить любой из них """
+
+    def __init__(self, max_attempts: int = 3, backoff: float = 0.2, backoff_max: float = 5, jitter: bool = True,
+                 retry_statuses=(500, 502, 503, 504), idempotent_methods=('GET', 'PUT', 'DELETE'),
+                 post_rule=idempotent_set_photo, photo_retry_statuses=PHOTO_RETRY_STATUSES, budget='default',
+                 breaker='default', sleep=time.sleep):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+        self.photo_retry_statuses = frozenset(photo_retry_statuses)
+        self.idempotent_methods = frozenset(idempotent_methods)
+        self.post_rule = post_rule
+        self.budget = RetryBudget() if budget == 'default' else budget
+        self.breaker = CircuitBreaker() if breaker == 'default' else breaker
+        self._sleep = sleep
+
+    def before_request(self, attempt: int) -> bool:
+        """ True - попытка стала пробным запросом автомата (см. CircuitBreaker.before_request) """
+        trial = self.breaker.before_request() if self.breaker is not None else False
+        if attempt == 1 and self.budget is not None:
+            self.budget.deposit()
+        return trial
+
+    def release_trial(self):
+        if self.breaker is not None:
+            self.breaker.release_trial()
+
+    def retry_statuses_for(self, path: str) -> frozenset:
+        """ Статусы, которые для запроса к path считаются временным сбоем сервера """
+        if path.startswith('api/pets/set_photo'):
+            return self.photo_retry_statuses
+        return self.retry_statuses
+
+    def record(self, status: int = None, error: Exception = None, path: str = ''):
+        if self.breaker is None:
+            return
+        if error is not None or status in self.retry_statuses_for(path):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def is_idempotent(self, method: str, path: str) -> bool:
+        if method in self.idempotent_methods:
+            return True
+        return method == 'POST' and self.post_rule is not None and self.post_rule(method, path)
+
+    def should_retry(self, method: str, path: str, attempt: int, status: int = None, error: Exception = None) -> bool:
+        if attempt >= self.max_attempts or not self.is_idempotent(method, path):
+            return False
+        if error is None and status not in self.retry_statuses_for(path):
+            return False
+        return self.budget is None or self.budget.withdraw()
+
+    def wait(self, attempt: int, retry_after=None):
+        """ Пауза перед следующей попыткой после неудачной попытки номер attempt """
+        delay = min(self.backoff_max, self.backoff * 2 ** (attempt - 1))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        try:
+            delay = max(delay, min(self.backoff_max, float(retry_after)))
+        except (TypeError, ValueError):
+            pass
+        if delay > 0:
+            self._sleep(delay)
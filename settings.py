@@ -1,7 +1,35 @@
+import functools
 import os
 
-from dotenv import load_dotenv
 
-load_dotenv()
-valid_email = os.getenv('valid_email')
-valid_password = os.getenv('valid_password')
+@functools.lru_cache(maxsize=None)
+def load_credentials(path: str = None) -> tuple:
+    """ Читает .env (или файл path) и возвращает (valid_email, valid_password) из окружения.
+    Файл читается при первом вызове, а не при импорте settings; результат кэшируется """
+    from dotenv import load_dotenv
+
+    load_dotenv(path)
+    return os.getenv('valid_email'), os.getenv('valid_password')
+
+
+def __getattr__(name: str):
+    # from settings import valid_email, valid_password по-прежнему работает, но .env читается только здесь
+    if name == 'valid_email':
+        return load_credentials()[0]
+    if name == 'valid_password':
+        return load_credentials()[1]
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+
+def load_accounts(path: str = None) -> list:
+    """ Все учётные записи из .env (или файла path) в виде [(email, password), ...]: сначала
+    valid_email/valid_password, затем пары valid_email_<N>/valid_password_<N> по возрастанию N """
+    accounts = []
+    email, password = load_credentials(path)
+    if email:
+        accounts.append((email, password))
+    numbered = sorted(int(name[len('valid_email_'):]) for name in os.environ
+                      if name.startswith('valid_email_') and name[len('valid_email_'):].isdigit())
+    for n in numbered:
+        accounts.append((os.environ['valid_email_%d' % n], os.getenv('valid_password_%d' % n)))
+    return accounts
@@ -0,0 +1,76 @@
+import codecs
+import json
+import re
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = re.compile(r'[\s,]*')
+
+
+class PetListingError(Exception):
+    """ Сервер не отдал список питомцев: status и текст ответа """
+
+    def __init__(self, status: int, result):
+        super().__init__('не удалось получить список питомцев: %s %s' % (status, result))
+        self.status = status
+        self.result = result
+
+
+def iter_json_items(chunks, key: str = 'pets'):
+    """ Разбирает JSON-объект вида {key: [...]} по мере поступления кусков bytes и отдаёт элементы
+    массива по одному. В памяти одновременно находятся только ещё не разобранный хвост и текущий
+    элемент, поэтому время до первого элемента и пиковая память не зависят от длины массива """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    start = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    chunks = iter(chunks)
+    buffer = ''
+    pos = 0
+    exhausted = False
+
+    def more() -> bool:
+        nonlocal buffer, pos, exhausted
+        if exhausted:
+            return False
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+            buffer = buffer[pos:] + decoder.decode(b'', final=True)
+        else:
+            buffer = buffer[pos:] + decoder.decode(chunk)
+        pos = 0
+        return True
+
+    while True:
+        match = start.search(buffer)
+        if match is not None:
+            pos = match.end()
+            break
+        # ключ мог разрезаться между кусками - оставляем хвост для следующего поиска
+        pos = max(0, len(buffer) - len(key) - 16)
+        if not more():
+            raise ValueError('в ответе нет массива %r' % key)
+
+    while True:
+        pos = _WHITESPACE.match(buffer, pos).end()
+        if pos == len(buffer):
+            if not more():
+                raise ValueError('ответ оборвался внутри массива %r' % key)
+            continue
+        if buffer[pos] == ']':
+            return
+        try:
+            item, end = _DECODER.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # Элемент пришёл не целиком: дочитываем, пока хвост не вырастет вдвое, и разбираем заново -
+            # суммарное время разбора большого элемента (например, фото в base64) остаётся линейным
+            pending = len(buffer) - pos
+            if not more():
+                raise
+            while len(buffer) < 2 * pending and more():
+                pass
+            continue
+        if end == len(buffer) and not exhausted and not isinstance(item, (dict, list)):
+            # число в конце буфера могло разрезаться
+            more()
+            continue
+        pos = end
+        yield item
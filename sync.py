@@ -0,0 +1,185 @@
+import base64
+import hashlib
+import time
+from collections import defaultdict
+
+from bulk import BulkSummary, iter_csv_specs, iter_jsonl_specs, run_windowed
+
+
+def load_inventory(path: str):
+    """ Лениво читает желаемый список питомцев из CSV или JSONL (по расширению файла) """
+    return iter_jsonl_specs(path) if path.endswith(('.jsonl', '.ndjson')) else iter_csv_specs(path)
+
+
+def _fields(pet: dict) -> tuple:
+    return pet.get('name', ''), pet.get('animal_type', ''), str(pet.get('age', ''))
+
+
+def _photo_digest(pet_photo: str) -> str:
+    """ sha1 фото из ответа сервера (data URI с base64); '' - фото нет """
+    _, _, encoded = (pet_photo or '').partition('base64,')
+    return hashlib.sha1(base64.b64decode(encoded)).hexdigest() if encoded else ''
+
+
+class SyncPlan:
+    """ План приведения my_pets к желаемому списку: какие питомцы создаются (creates - описания),
+    изменяются (updates - (pet_id, описание)), удаляются (deletes - pet_id) и каким ставится
+    фото (photos - (pet_id, путь)). unchanged - сколько питомцев уже совпадают с описанием """
+
+    def __init__(self):
+        self.creates = []
+        self.updates = []
+        self.deletes = []
+        self.photos = []
+        self.unchanged = 0
+
+    def __len__(self):
+        return len(self.creates) + len(self.updates) + len(self.deletes) + len(self.photos)
+
+    def actions(self):
+        """ Генератор (действие, цель) по всем операциям плана """
+        for spec in self.creates:
+            yield 'create', spec
+        for pet_id, spec in self.updates:
+            yield 'update', (pet_id, spec)
+        for pet_id, path in self.photos:
+            yield 'photo', (pet_id, path)
+        for pet_id in self.deletes:
+            yield 'delete', pet_id
+
+    def as_dict(self) -> dict:
+        return {'create': len(self.creates), 'update': len(self.updates), 'delete': len(self.deletes),
+                'photo': len(self.photos), 'unchanged': self.unchanged}
+
+
+def plan_sync(current: list, desired, prune: bool = True) -> SyncPlan:
+    """ Сравнивает текущих питомцев (dict из ответа my_pets) с желаемыми описаниями
+    (name, animal_type, age, необязательные id и pet_photo - путь к файлу) за линейное время.
+    Сначала описания с id сопоставляются с питомцами по id, затем остальные - с питомцем с теми же
+    name/animal_type/age (ничего менять не нужно), затем с питомцем с тем же name (нужно изменить);
+    для несопоставленных описаний питомец создаётся, несопоставленные питомцы удаляются (если prune).
+    Фото ставится, если sha1 файла не совпадает с фото на сервере """
+    plan = SyncPlan()
+    by_id = {pet['id']: pet for pet in current}
+    by_fields = defaultdict(list)
+    for pet in current:
+        by_fields[_fields(pet)].append(pet['id'])
+    matched = set()
+    pending = []
+    file_digests = {}
+
+    def match(spec: dict, pet: dict):
+        matched.add(pet['id'])
+        if _fields(spec) != _fields(pet):
+            plan.updates.append((pet['id'], spec))
+        else:
+            plan.unchanged += 1
+        path = spec.get('pet_photo')
+        if path:
+            if path not in file_digests:
+                with open(path, 'rb') as f:
+                    file_digests[path] = hashlib.sha1(f.read()).hexdigest()
+            if file_digests[path] != _photo_digest(pet.get('pet_photo')):
+                plan.photos.append((pet['id'], path))
+
+    # Проход 1: по id. Описания без id ждут, пока все явно указанные id не будут заняты,
+    # иначе описание без id могло бы забрать питомца, которого следующее описание называет по id
+    unkeyed = []
+    for spec in desired:
+        pet_id = spec.get('id')
+        if not pet_id:
+            unkeyed.append(spec)
+        elif pet_id in by_id and pet_id not in matched:
+            match(spec, by_id[pet_id])
+        else:
+            plan.creates.append(spec)
+
+    # Проход 2: по полному совпадению полей среди оставшихся
+    for spec in unkeyed:
+        candidates = by_fields.get(_fields(spec))
+        while candidates and candidates[-1] in matched:
+            candidates.pop()
+        if candidates:
+            match(spec, by_id[candidates.pop()])
+        else:
+            pending.append(spec)
+
+    # Проход 3: по имени среди оставшихся
+    by_name = defaultdict(list)
+    for pet in current:
+        if pet['id'] not in matched:
+            by_name[pet.get('name', '')].append(pet['id'])
+    for spec in pending:
+        candidates = by_name.get(spec.get('name', ''))
+        while candidates and candidates[-1] in matched:
+            candidates.pop()
+        if candidates:
+            match(spec, by_id[candidates.pop()])
+        else:
+            plan.creates.append(spec)
+
+    if prune:
+        plan.deletes = [pet['id'] for pet in current if pet['id'] not in matched]
+    return plan
+
+
+class PetSync:
+    """ Приводит список своих питомцев к желаемому: получает my_pets одним запросом, строит
+    SyncPlan и выполняет его в пуле из workers потоков через один клиент (размер пула соединений
+    транспорта стоит задавать не меньше workers). dry_run=True только строит план.
+    Операции отправляются окнами по window, поэтому план на сотни тысяч питомцев не превращается
+    в сотни тысяч ожидающих Future """
+
+    def __init__(self, client, auth_key, workers: int = 8, window: int = None, prune: bool = True):
+        self.client = client
+        self.auth_key = auth_key
+        self.workers = workers
+        self.window = window or workers * 4
+        self.prune = prune
+        self.summary = BulkSummary()
+
+    def plan(self, desired) -> SyncPlan:
+        status, result = self.client.get_list_of_pets(self.auth_key, 'my_pets')
+        if status != 200:
+            raise RuntimeError('не удалось получить my_pets: %s %s' % (status, result))
+        return plan_sync(result['pets'], desired, self.prune)
+
+    def _apply(self, action_target: tuple):
+        action, target = action_target
+        client, auth_key = self.client, self.auth_key
+        started = time.perf_counter()
+        try:
+            if action == 'create':
+                name, animal_type, age = _fields(target)
+                if target.get('pet_photo'):
+                    status, result = client.post_new_pet(auth_key, name, animal_type, age, target['pet_photo'])
+                else:
+                    status, result = client.post_new_pet_simple(auth_key, name, animal_type, age)
+            elif action == 'update':
+                pet_id, spec = target
+                status, result = client.put_update_pet(auth_key, pet_id, *_fields(spec))
+            elif action == 'photo':
+                status, result = client.post_add_photo(auth_key, *target)
+            else:
+                status, result = client.delete_pet(auth_key, target, result_mode='status')
+        except Exception as e:
+            self.summary.add(None, time.perf_counter() - started, e)
+            return None, e
+        self.summary.add(status, time.perf_counter() - started)
+        return status, result
+
+    def apply(self, plan: SyncPlan):
+        """ Генератор (действие, цель, status, result) по мере выполнения операций плана.
+        Ошибка отдельной операции не останавливает синхронизацию: status = None, в result - исключение """
+        self.summary = BulkSummary()
+        for _, action_target, result in run_windowed(self._apply, plan.actions(), self.workers, self.window,
+                                                     thread_name_prefix='pet-sync'):
+            yield action_target + result
+        self.summary.finished = time.perf_counter()
+
+    def sync(self, desired, dry_run: bool = False) -> tuple:
+        """ Строит план и, если не dry_run, выполняет его. Возвращает (SyncPlan, список результатов) """
+        plan = self.plan(desired)
+        if dry_run:
+            return plan, []
+        return plan, list(self.apply(plan))
@@ -0,0 +1,158 @@
+import json
+import os
+
+import pytest
+from requests.models import Response
+
+from api import PetFriends
+from local_server import PetFriendsServer
+
+
+def make_response(status: int = 200, body='', headers: dict = None, url: str = '') -> Response:
+    """ Собирает настоящий requests.Response без сети: dict/list кодируются в json, str - в utf-8 """
+    res = Response()
+    res.status_code = status
+    res.url = url
+    if isinstance(body, (dict, list)):
+        body = json.dumps(body)
+        res.headers['Content-Type'] = 'application/json'
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    res._content = body
+    res._content_consumed = True
+    res.encoding = 'utf-8'
+    res.headers.update(headers or {})
+    return res
+
+
+class StubTransport:
+    """ Заглушка транспорта PetFriends: запоминает запросы и отвечает по зарегистрированным маршрутам.
+    Маршрут - (method, префикс пути после base_url) -> статус и тело ответа либо функция
+    handler(method, url, kwargs), возвращающая requests.Response """
+
+    def __init__(self):
+        self.calls = []
+        self.routes = []
+        self.closed = False
+
+    def add(self, method: str, path: str, status: int = 200, body='', headers: dict = None, handler=None):
+        self.routes.append((method, path, status, body, headers, handler))
+        return self
+
+    def request(self, method: str, url: str, **kwargs):
+        self.calls.append((method, url, kwargs))
+        path = url.split('://', 1)[-1].split('/', 1)[-1]
+        # Берём самый длинный подходящий префикс, чтобы 'api/pets/set_photo' не перехватывался 'api/pets'
+        for m, p, status, body, headers, handler in sorted(self.routes, key=lambda r: -len(r[1])):
+            if m == method and path.startswith(p):
+                if handler is not None:
+                    return handler(method, url, kwargs)
+                return make_response(status, body, headers, url)
+        return make_response(404, 'Not Found', url=url)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def stub_transport():
+    return StubTransport()
+
+
+def pytest_addoption(parser):
+    parser.addoption('--local-server', action='store_true',
+                     help='прогнать тесты против локального PetFriendsServer вместо petfriends.skillfactory.ru')
+    parser.addoption('--local-latency', type=float, default=0,
+                     help='задержка ответа локального сервера в секундах, чтобы имитировать сеть')
+    parser.addoption('--record', metavar='PATH',
+                     help='записать запросы и ответы клиента pf в кассету JSONL (cassette.RecordingTransport)')
+    parser.addoption('--replay', metavar='PATH',
+                     help='отвечать на запросы клиента pf из кассеты без сети (cassette.ReplayTransport)')
+    parser.addoption('--replay-speed', type=float, default=None,
+                     help='воспроизводить ответы кассеты с записанной задержкой, делённой на это число')
+
+
+# Второй пользователь, под которым test_put_update_alien_pet пытается изменить чужого питомца
+ALIEN_ACCOUNT = ('igra@bk.ru', '111')
+
+
+def local_accounts() -> dict:
+    """ Учётная запись основного пользователя: из settings.py (или тестовая, если .env нет) """
+    from settings import load_credentials
+    email, password = load_credentials()
+    return {email or 'user@example.com': password or 'password'}
+
+
+def server_accounts() -> dict:
+    """ Пользователи локального сервера: основной и ALIEN_ACCOUNT для проверок с чужими питомцами """
+    return dict(local_accounts(), **{ALIEN_ACCOUNT[0]: ALIEN_ACCOUNT[1]})
+
+
+def pytest_configure(config):
+    # Сервер поднимается до сбора тестов, а клиент берёт base_url из PETFRIENDS_BASE_URL.
+    # При запуске через pytest-xdist каждый процесс поднимает свой сервер
+    if config.getoption('--local-server'):
+        config._petfriends_server = PetFriendsServer(server_accounts(), seed_pets=20,
+                                                     latency=config.getoption('--local-latency')).start()
+        os.environ['PETFRIENDS_BASE_URL'] = config._petfriends_server.base_url
+
+
+def pytest_unconfigure(config):
+    server = getattr(config, '_petfriends_server', None)
+    if server is not None:
+        server.stop()
+        os.environ.pop('PETFRIENDS_BASE_URL', None)
+
+
+@pytest.fixture(scope='session')
+def petfriends_server(pytestconfig):
+    """ Локальный сервер PetFriends на свободном порту: общий с --local-server или отдельный """
+    server = getattr(pytestconfig, '_petfriends_server', None)
+    if server is not None:
+        yield server
+        return
+    with PetFriendsServer(server_accounts(), seed_pets=20) as server:
+        yield server
+
+
+@pytest.fixture
+def local_pf(petfriends_server):
+    """ Клиент PetFriends, направленный на локальный сервер """
+    with PetFriends(base_url=petfriends_server.base_url) as pf:
+        yield pf
+
+
+def cassette_transport(config):
+    """ Транспорт клиента pf по опциям --record/--replay; None - обычный HttpTransport """
+    from cassette import RecordingTransport, ReplayTransport
+    from transport import HttpTransport
+    if config.getoption('--replay'):
+        return ReplayTransport(config.getoption('--replay'), speed=config.getoption('--replay-speed'))
+    if config.getoption('--record'):
+        # --replay должен ответить на любой запрос сессии, поэтому тела сохраняются для всех обменов
+        return RecordingTransport(HttpTransport(), config.getoption('--record'), store_bodies=True)
+    return None
+
+
+@pytest.fixture(scope='session')
+def pf(pytestconfig):
+    """ Один клиент (и один пул соединений) на всю сессию; при запуске через pytest-xdist -
+    по одному на процесс. С --record трафик записывается в кассету, с --replay - воспроизводится из неё """
+    with PetFriends(transport=cassette_transport(pytestconfig)) as client:
+        yield client
+
+
+@pytest.fixture(scope='session')
+def auth_key(pf):
+    """ Учётные данные из settings.py: ключ api запрашивается один раз за сессию и обновляется после 403 """
+    return pf.credential()
+
+
+@pytest.fixture
+def my_pet(pf, auth_key):
+    """ Собственный питомец теста: создаётся перед тестом и удаляется после, поэтому тесты не делят
+    между собой my_pets['pets'][0] и могут выполняться параллельно """
+    status, pet = pf.post_new_pet_simple(auth_key, 'Fixture', 'cat', '3')
+    assert status == 200, 'не удалось создать питомца для теста: %s' % status
+    yield pet
+    pf.delete_pet(auth_key, pet['id'])
@@ -0,0 +1,118 @@
+from accounts import AccountPool, NoAccountAvailable
+from api import PetFriends
+from auth import AuthKeyError
+from local_server import PetFriendsServer
+from tests.conftest import StubTransport, make_response
+import settings
+import pytest
+
+USERS = {'user%d@example.com' % i: 'password%d' % i for i in range(3)}
+
+
+@pytest.fixture
+def server():
+    with PetFriendsServer(USERS, latency=0.002) as server:
+        yield server
+
+
+@pytest.mark.positive
+def test_pool_spreads_work_across_accounts(server):
+    """ Каждая запись работает со своим клиентом и ключом, нагрузка делится между всеми записями """
+    with AccountPool(USERS.items(), base_url=server.base_url) as pool:
+        calls = [('post_new_pet_simple', ('Барсик', 'cat', '2')) for _ in range(60)]
+        results = list(pool.run(calls, workers=6))
+        stats = pool.stats()
+
+    assert [status for _, _, status, _ in results] == [200] * 60
+    assert len({account.client.transport for account in pool.accounts}) == 3
+    for email in USERS:
+        assert len(server.store.list(server.store.users[email])) == stats[email]['total']
+        assert stats[email]['ok'] >= 10
+        assert stats[email]['throughput'] > 0
+        assert stats[email]['keys']['misses'] == 1
+
+
+@pytest.mark.positive
+def test_pool_routes_pet_calls_to_the_owner(server):
+    """ Изменение и удаление питомца уходят записи, которая его создала: без 403 и без вывода из ротации """
+    with AccountPool(USERS.items(), base_url=server.base_url) as pool:
+        created = list(pool.run([('post_new_pet_simple', ('Барсик', 'cat', '2'))] * 9, workers=6))
+        pet_ids = [result['id'] for _, _, _, result in created]
+        assert {pool.owner_of(pet_id).email for pet_id in pet_ids} == set(USERS)
+        updated = list(pool.run([('put_update_pet', (pet_id, 'Мурзик', 'cat', '3')) for pet_id in pet_ids], workers=6))
+        deleted = list(pool.run([('delete_pet', (pet_id,)) for pet_id in pet_ids], workers=6))
+        stats = pool.stats()
+
+    assert [status for _, _, status, _ in updated + deleted] == [200] * 18
+    assert server.store.list() == []
+    assert pool.owner_of(pet_ids[0]) is None
+    for email in USERS:
+        assert stats[email]['rotations'] == 0
+        assert stats[email]['keys']['misses'] == 1
+
+
+@pytest.mark.negative
+def test_pool_rotates_out_account_with_rejected_key(server):
+    """ Запись, которой сервер не выдаёт ключ, выводится из ротации, остальные доделывают работу """
+    accounts = list(USERS.items()) + [('blocked@example.com', 'wrong')]
+    with AccountPool(accounts, base_url=server.base_url, cooldown=60) as pool:
+        results = list(pool.run([('get_list_of_pets', ('my_pets',))] * 40, workers=4))
+        stats = pool.stats()
+
+    failed = [result for _, _, status, result in results if status is None]
+    assert len(failed) <= 4
+    assert len(results) - len(failed) >= 36
+    assert stats['blocked@example.com']['rotations'] >= 1
+    assert stats['blocked@example.com']['cooldown'] > 0
+    assert stats['blocked@example.com']['ok'] == 0
+
+
+@pytest.mark.negative
+def test_pool_rotates_out_account_whose_key_is_rejected_on_create():
+    """ 403 на создание питомца (ключ отвергнут и после обновления) выводит запись из ротации,
+    а 403 на питомца, которого пул не создавал, - нет """
+    def client_factory():
+        transport = StubTransport()
+        transport.add('GET', 'api/key', handler=lambda method, url, kwargs: make_response(
+            200, {'key': kwargs['headers']['email']}))
+
+        def create(method, url, kwargs):
+            if kwargs['headers']['auth_key'] == 'a@example.com':
+                return make_response(403, 'Forbidden')
+            return make_response(200, {'id': 'pet'})
+
+        transport.add('POST', 'api/create_pet_simple', handler=create)
+        transport.add('DELETE', 'api/pets/', status=403, body='Forbidden')
+        return PetFriends(base_url='http://stub/', transport=transport)
+
+    accounts = [('a@example.com', 'a'), ('b@example.com', 'b')]
+    with AccountPool(accounts, client_factory=client_factory, cooldown=60) as pool:
+        results = [pool.call('post_new_pet_simple', 'Барсик', 'cat', '2')[0] for _ in range(20)]
+        assert results.count(403) == 1
+        assert pool.call('delete_pet', 'alien')[0] == 403
+        stats = pool.stats()
+
+    assert stats['a@example.com']['rotations'] == 1 and stats['a@example.com']['cooldown'] > 0
+    assert stats['b@example.com']['rotations'] == 0
+
+
+@pytest.mark.negative
+def test_pool_raises_when_every_account_is_cooling_down(server):
+    with AccountPool([('blocked@example.com', 'wrong')], base_url=server.base_url, cooldown=60,
+                     timeout=0.05) as pool:
+        [(_, _, status, result)] = pool.run([('get_list_of_pets', ())])
+        assert status is None and isinstance(result, AuthKeyError)
+        with pytest.raises(NoAccountAvailable):
+            pool.call('get_list_of_pets')
+
+
+@pytest.mark.additional_positive
+def test_load_accounts_reads_numbered_credentials(monkeypatch):
+    monkeypatch.setattr(settings, 'load_credentials', lambda path=None: ('main@example.com', 'main'))
+    monkeypatch.setenv('valid_email_10', 'ten@example.com')
+    monkeypatch.setenv('valid_password_10', 'p10')
+    monkeypatch.setenv('valid_email_2', 'two@example.com')
+    monkeypatch.setenv('valid_password_2', 'p2')
+
+    assert settings.load_accounts() == [('main@example.com', 'main'), ('two@example.com', 'p2'),
+                                        ('ten@example.com', 'p10')]
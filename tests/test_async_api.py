@@ -0,0 +1,39 @@
+from async_api import AsyncPetFriends
+from tests.conftest import make_response
+import asyncio
+import threading
+import time
+import pytest
+
+
+@pytest.mark.positive
+def test_gather_keeps_input_order_and_limits_concurrency(stub_transport):
+    """ Массовое создание идёт параллельно, но не больше concurrency запросов одновременно,
+    а результаты возвращаются в порядке входных данных """
+    lock = threading.Lock()
+    state = {'active': 0, 'peak': 0}
+
+    def slow_create(method, url, kwargs):
+        with lock:
+            state['active'] += 1
+            state['peak'] = max(state['peak'], state['active'])
+        time.sleep(0.02)
+        with lock:
+            state['active'] -= 1
+        return make_response(200, {'name': kwargs['data']['name']})
+
+    stub_transport.add('POST', 'api/create_pet_simple', handler=slow_create)
+
+    async def run():
+        async with AsyncPetFriends(base_url='http://stub/', concurrency=5, transport=stub_transport) as apf:
+            pets = [('pet%d' % i, 'cat', '1') for i in range(20)]
+            return await apf.gather_new_pets_simple({'key': 'abc'}, pets)
+
+    started = time.perf_counter()
+    results = asyncio.run(run())
+    elapsed = time.perf_counter() - started
+
+    assert [result['name'] for _, result in results] == ['pet%d' % i for i in range(20)]
+    assert state['peak'] == 5
+    # 20 запросов по 20 мс в 5 потоков - около 80 мс, а не 400 мс последовательно
+    assert elapsed < 0.3
@@ -0,0 +1,97 @@
+from api import PetFriends
+from auth import AuthKeyError
+from tests.conftest import make_response
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import pytest
+
+
+def key_server(stub_transport, keys):
+    """ Настраивает заглушку: api/key выдаёт ключи из keys по очереди, api/pets принимает только
+    последний выданный. Чтобы "просрочить" ключ, достаточно добавить в issued любую строку """
+    issued = []
+
+    def get_key(method, url, kwargs):
+        time.sleep(0.02)
+        issued.append(keys[len(issued)])
+        return make_response(200, {'key': issued[-1]})
+
+    def get_pets(method, url, kwargs):
+        if kwargs['headers'].get('auth_key') != issued[-1]:
+            return make_response(403, 'Forbidden')
+        return make_response(200, {'pets': []})
+
+    stub_transport.add('GET', 'api/key', handler=get_key)
+    stub_transport.add('GET', 'api/pets', handler=get_pets)
+    return issued
+
+
+@pytest.mark.positive
+def test_credential_fetches_key_once_for_many_threads(stub_transport):
+    """ Двадцать потоков с одним Credential запрашивают api/key ровно один раз """
+    issued = key_server(stub_transport, ['k1'])
+    pf = PetFriends(base_url='http://stub/', transport=stub_transport)
+    credential = pf.credential('email', 'password')
+
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        statuses = list(pool.map(lambda _: pf.get_list_of_pets(credential, 'my_pets')[0], range(20)))
+
+    assert statuses == [200] * 20
+    assert issued == ['k1']
+    assert pf.credential('email', 'password') is credential
+    stats = pf.keys.stats
+    assert stats['misses'] == 1
+    assert stats['hits'] + stats['waits'] == 19
+
+
+@pytest.mark.positive
+def test_credential_single_refresh_after_403(stub_transport):
+    """ После смены ключа на сервере одновременные 403 приводят к одному перезапросу api/key """
+    issued = key_server(stub_transport, ['k1', 'expired', 'k2'])
+    pf = PetFriends(base_url='http://stub/', transport=stub_transport)
+    credential = pf.credential('email', 'password')
+    assert credential.key() == 'k1'
+
+    # Сервер "забыл" k1: следующий выданный ключ станет единственным валидным
+    issued.append('expired')
+    barrier = threading.Barrier(10)
+
+    def call(_):
+        barrier.wait()
+        return pf.get_list_of_pets(credential, 'my_pets')[0]
+
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        statuses = list(pool.map(call, range(10)))
+
+    assert statuses == [200] * 10
+    assert issued == ['k1', 'expired', 'k2']
+    assert credential.stats['refreshes'] == 1
+
+
+@pytest.mark.negative
+def test_credential_raises_for_invalid_user(stub_transport):
+    """ Неверные учётные данные дают AuthKeyError со статусом сервера, а не словарь без ключа """
+    stub_transport.add('GET', 'api/key', status=403, body='Forbidden')
+    pf = PetFriends(base_url='http://stub/', transport=stub_transport)
+
+    with pytest.raises(AuthKeyError) as error:
+        pf.get_list_of_pets(pf.credential('email', 'wrong'))
+    assert error.value.status == 403
+
+
+@pytest.mark.positive
+def test_settings_loads_credentials_on_first_use(tmp_path, monkeypatch):
+    import settings
+
+    monkeypatch.delenv('valid_email', raising=False)
+    monkeypatch.delenv('valid_password', raising=False)
+    env = tmp_path / '.env'
+    env.write_text('valid_email=lazy@example.com\nvalid_password=secret\n', encoding='utf-8')
+    settings.load_credentials.cache_clear()
+    try:
+        assert settings.load_credentials(str(env)) == ('lazy@example.com', 'secret')
+        env.write_text('valid_email=other@example.com\n', encoding='utf-8')
+        assert settings.load_credentials(str(env)) == ('lazy@example.com', 'secret')
+    finally:
+        settings.load_credentials.cache_clear()
@@ -0,0 +1,184 @@
+import json
+import time
+import tracemalloc
+import pytest
+
+import models
+from api import PetFriends
+from tests.conftest import make_response
+
+
+def synthetic_pets_response(count: int) -> bytes:
+    """ Тело ответа api/pets с count питомцами и коротким base64-фото у каждого """
+    photo = 'data:image/jpeg;base64,' + 'A' * 200
+    return json.dumps({'pets': [
+        {'id': '%032x' % i, 'name': 'pet%d' % i, 'animal_type': 'cat', 'age': str(i % 20),
+         'created_at': '1690000000.0', 'user_id': '%032x' % (i % 100), 'pet_photo': photo}
+        for i in range(count)]}).encode('utf-8')
+
+
+def measure(parse, body: bytes):
+    """ Время разбора и память, которую занимает результат после разбора """
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = parse(body)
+    elapsed = time.perf_counter() - started
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, retained, peak
+
+
+@pytest.mark.benchmark
+def test_pet_models_memory_on_100k_pets():
+    """ Pet со __slots__ занимает заметно меньше памяти, чем dict из res.json(), на 100 тыс. питомцев """
+    body = synthetic_pets_response(100_000)
+
+    dicts, dict_time, dict_memory, dict_peak = measure(lambda b: json.loads(b)['pets'], body)
+    pets, model_time, model_memory, model_peak = measure(models.PetList.from_json, body)
+
+    print('\njson.loads + dict: %.3f s, %.1f MB (peak %.1f MB)' % (dict_time, dict_memory / 2**20, dict_peak / 2**20))
+    print('%s + Pet:  %.3f s, %.1f MB (peak %.1f MB)' % (models.JSON_BACKEND, model_time, model_memory / 2**20,
+                                                       model_peak / 2**20))
+    assert len(pets) == len(dicts) == 100_000
+    assert pets[99_999].to_dict() == dicts[99_999]
+    assert model_memory < dict_memory * 0.8
+
+
+class ConstantTransport:
+    """ Транспорт без логики: всегда отдаёт один и тот же готовый ответ """
+
+    def __init__(self):
+        self.response = make_response(200, {'pets': []})
+
+    def request(self, method, url, **kwargs):
+        return self.response
+
+
+def per_call(func, repeat: int = 20000) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat
+
+
+@pytest.mark.benchmark
+def test_request_overhead_without_hooks():
+    """ Без хуков _request почти ничего не добавляет к вызову транспорта, а хук стоит единицы микросекунд """
+    transport = ConstantTransport()
+    pf = PetFriends(base_url='http://stub/', transport=transport)
+    auth_key = {'key': 'abc'}
+
+    raw = per_call(lambda: transport.request('GET', 'http://stub/api/pets', headers={'auth_key': 'abc'}))
+    bare = per_call(lambda: pf._request('GET', 'api/pets', auth_key=auth_key, params={'filter': ''}))
+    pf.add_hook(lambda record: None)
+    hooked = per_call(lambda: pf._request('GET', 'api/pets', auth_key=auth_key, params={'filter': ''}))
+
+    print('\ntransport: %.2f us, _request: %.2f us, _request + hook: %.2f us' % (raw * 1e6, bare * 1e6, hooked * 1e6))
+    # На фоне сетевого запроса в миллисекунды накладные расходы без хуков пренебрежимо малы
+    assert bare - raw < 10e-6
+
+
+@pytest.mark.benchmark
+def test_sync_plan_is_linear_on_100k_pets():
+    """ План синхронизации для 100 и 200 тыс. питомцев строится за почти линейное время """
+    from sync import plan_sync
+
+    def run(count):
+        current = [{'id': '%032x' % i, 'name': 'pet%d' % i, 'animal_type': 'cat', 'age': str(i % 20)}
+                   for i in range(count)]
+        # каждый 10-й изменён, каждый 10-й удалён и столько же новых
+        desired = [{'name': 'pet%d' % i, 'animal_type': 'cat', 'age': str(i % 20 + (i % 10 == 1))}
+                   for i in range(count) if i % 10 != 2]
+        desired += [{'name': 'new%d' % i, 'animal_type': 'dog', 'age': '1'} for i in range(count // 10)]
+        started = time.perf_counter()
+        plan = plan_sync(current, desired)
+        elapsed = time.perf_counter() - started
+        assert plan.as_dict() == {'create': count // 10, 'update': count // 10, 'delete': count // 10,
+                                  'photo': 0, 'unchanged': count * 8 // 10}
+        return elapsed
+
+    small, large = run(100_000), run(200_000)
+    print('\nplan_sync: 100k %.3f s, 200k %.3f s' % (small, large))
+    assert small < 2
+    assert large < small * 3
+
+
+@pytest.mark.benchmark
+def test_iter_pets_first_pet_and_memory_do_not_grow_with_listing():
+    """ Потоковый разбор: время до первого питомца и пиковая память почти одинаковы для 10 и 100 тыс. питомцев """
+    from tests.test_streaming import streaming_response
+
+    def run(count):
+        body = synthetic_pets_response(count)
+        transport = ConstantTransport()
+        transport.request = lambda method, url, **kwargs: streaming_response(body)
+        pf = PetFriends(transport=transport)
+        tracemalloc.start()
+        started = time.perf_counter()
+        pets = pf.iter_pets({'key': 'k'})
+        next(pets)
+        first = time.perf_counter() - started
+        total = 1 + sum(1 for _ in pets)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert total == count
+        return first, peak
+
+    (small_first, small_peak), (large_first, large_peak) = run(10_000), run(100_000)
+    print('\niter_pets: first pet %.2f/%.2f ms, peak %.0f/%.0f KB' % (small_first * 1e3, large_first * 1e3,
+                                                                     small_peak / 1024, large_peak / 1024))
+    assert large_first < max(small_first * 3, 0.005)
+    assert large_peak < small_peak * 1.5
+
+
+@pytest.mark.benchmark
+def test_result_modes_on_large_pet_list():
+    """ На большом ответе api/pets режимы status, bytes и lazy заметно дешевле разбора JSON """
+    from tests.test_streaming import streaming_response
+
+    body = synthetic_pets_response(20_000)
+    transport = ConstantTransport()
+
+    def respond(method, url, **kwargs):
+        res = streaming_response(body)
+        res.headers['Content-Length'] = str(len(body))
+        return res
+
+    transport.request = respond
+    pf = PetFriends(transport=transport)
+    auth_key = {'key': 'k'}
+    timings = {mode: per_call(lambda: pf.get_list_of_pets(auth_key, result_mode=mode), repeat=20)
+               for mode in ('json', 'lazy', 'bytes', 'status')}
+    print('\n' + ', '.join('%s %.2f ms' % (mode, t * 1e3) for mode, t in timings.items()))
+    assert timings['status'] < timings['json'] / 10
+    assert timings['lazy'] < timings['json'] / 2
+    assert timings['bytes'] < timings['json'] / 2
+
+
+@pytest.mark.benchmark
+def test_import_api_is_fast_and_lazy():
+    """ import api и settings и создание клиента не загружают requests, requests_toolbelt, dotenv, asyncio,
+    models и JSON-бэкенды orjson/ujson, а кумулятивное время импорта по -X importtime остаётся в пределах
+    примерно 2-3 замеров (api около 5-11 мс, settings около 0,2 мс) """
+    import os
+    import subprocess
+    import sys
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = ('import sys, api, settings; api.PetFriends(); '
+            'print(sorted({"requests", "requests_toolbelt", "dotenv", "asyncio", "models", "orjson", "ujson"}'
+            ' & set(sys.modules)))')
+    # первый запуск прогревает .pyc, замеряется второй
+    for _ in range(2):
+        done = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=root,
+                              capture_output=True, text=True, check=True)
+    assert done.stdout.strip() == '[]'
+    cumulative = {}
+    for line in done.stderr.splitlines():
+        _, _, fields = line.partition('import time:')
+        parts = [part.strip() for part in fields.split('|')]
+        if len(parts) == 3 and parts[1].isdigit():
+            cumulative[parts[2]] = int(parts[1])
+    print('\napi %.1f ms, settings %.1f ms' % (cumulative['api'] / 1e3, cumulative['settings'] / 1e3))
+    assert cumulative['api'] < 25_000
+    assert cumulative['settings'] < 1_000
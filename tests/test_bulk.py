@@ -0,0 +1,75 @@
+from api import PetFriends
+from bulk import BulkCreator, BulkSummary, bulk_create, iter_jsonl_specs
+from tests.conftest import make_response
+import json
+import random
+import time
+import pytest
+
+
+def create_handler(method, url, kwargs):
+    """ Питомцы с именем 'bad*' отклоняются сервером, остальные создаются со случайной задержкой """
+    time.sleep(random.uniform(0, 0.01))
+    name = kwargs['data']['name']
+    if name.startswith('bad'):
+        return make_response(400, 'Bad Request')
+    return make_response(200, {'name': name})
+
+
+@pytest.mark.positive
+def test_bulk_create_ordered_with_failures(stub_transport):
+    """ Результаты в порядке входных данных, ошибки не останавливают пакет и попадают в сводку """
+    stub_transport.add('POST', 'api/create_pet_simple', handler=create_handler)
+    pf = PetFriends(base_url='http://stub/', transport=stub_transport)
+    specs = [{'name': ('bad%d' if i % 10 == 0 else 'pet%d') % i, 'animal_type': 'cat', 'age': 1}
+             for i in range(100)]
+
+    results, summary = bulk_create(pf, {'key': 'abc'}, specs, workers=8, ordered=True)
+
+    assert [index for index, _, _ in results] == list(range(100))
+    assert results[1] == (1, 200, {'name': 'pet1'})
+    report = summary.as_dict()
+    assert report['total'] == 100
+    assert report['ok'] == 90
+    assert report['errors'] == {400: 10}
+    assert report['p50'] <= report['p99']
+    assert report['throughput'] > 0
+
+
+@pytest.mark.positive
+def test_bulk_create_consumes_input_lazily(stub_transport, tmp_path):
+    """ Из генератора берётся не больше window описаний сверх уже выданных результатов """
+    stub_transport.add('POST', 'api/create_pet_simple', handler=create_handler)
+    pf = PetFriends(base_url='http://stub/', transport=stub_transport)
+    path = tmp_path / 'pets.jsonl'
+    path.write_text('\n'.join(json.dumps({'name': 'pet%d' % i, 'animal_type': 'dog', 'age': 2})
+                              for i in range(1000)), encoding='utf-8')
+    consumed = []
+
+    def specs():
+        for spec in iter_jsonl_specs(str(path)):
+            consumed.append(spec)
+            yield spec
+
+    creator = BulkCreator(pf, {'key': 'abc'}, workers=4, window=8)
+    first = next(creator.run(specs()))
+
+    assert first[1] == 200
+    assert len(consumed) <= 8
+
+
+@pytest.mark.additional_positive
+def test_bulk_summary_keeps_latencies_in_histogram():
+    """ Сводка не хранит задержки поштучно: память не растёт с числом вызовов """
+    summary = BulkSummary()
+    for i in range(100_000):
+        summary.add(200, 0.001 + (i % 100) / 10_000)
+    buckets = len(summary.latencies.counts)
+    for i in range(100_000):
+        summary.add(200, 0.001 + (i % 100) / 10_000)
+
+    report = summary.as_dict()
+    assert report['total'] == report['ok'] == 200_000
+    assert len(summary.latencies.counts) == buckets <= 100
+    assert report['p50'] == pytest.approx(0.006, rel=0.02)
+    assert report['p99'] == pytest.approx(0.0109, rel=0.02)
@@ -0,0 +1,132 @@
+import json
+import time
+
+import pytest
+
+from api import PetFriends
+from cassette import CassetteMiss, RecordingTransport, ReplayTransport, replay_traffic
+from local_server import PetFriendsServer
+from tests.conftest import StubTransport, local_accounts
+from transport import HttpTransport
+
+
+def record_session(base_url: str, path: str, store_bodies: bool = None) -> list:
+    """ Создаёт, меняет и удаляет питомцев через записывающий транспорт; возвращает результаты вызовов """
+    (email, password), = local_accounts().items()
+    results = []
+    transport = RecordingTransport(HttpTransport(), path, store_bodies=store_bodies)
+    with PetFriends(base_url=base_url, transport=transport) as pf:
+        auth_key = pf.credential(email, password)
+        for i in range(3):
+            status, pet = pf.post_new_pet_simple(auth_key, 'Tape%d' % i, 'cat', str(i))
+            results.append((status, pet))
+            results.append(pf.put_update_pet(auth_key, pet['id'], 'Tape', 'dog', '5'))
+            results.append(pf.delete_pet(auth_key, pet['id']))
+        results.append(pf.post_new_pet(auth_key, 'Photo', 'cat', '1', 'images/cat1.jpg'))
+        results.append(pf.get_list_of_pets(auth_key, 'my_pets'))
+    return results
+
+
+@pytest.mark.positive
+def test_recorded_session_replays_identically_without_network(petfriends_server, tmp_path):
+    path = str(tmp_path / 'session.jsonl')
+    recorded = record_session(petfriends_server.base_url, path, store_bodies=True)
+
+    text = open(path, encoding='utf-8').read()
+    entries = [json.loads(line) for line in text.splitlines()]
+    assert len(entries) == 12 and [entry['status'] for entry in entries] == [200] * 12
+    assert all(entry['headers'].get('auth_key', '***') == '***' for entry in entries)
+    assert local_accounts()[entries[0]['headers']['email']] not in text
+    photo = next(entry for entry in entries if entry['url'].endswith('api/pets') and entry['method'] == 'POST')
+    assert photo['body']['size'] > 4747 and len(photo['body']['sha1']) == 40
+
+    (email, password), = local_accounts().items()
+    replay = ReplayTransport(path)
+    with PetFriends(base_url='http://replay.invalid/', transport=replay) as pf:
+        auth_key = pf.credential(email, password)
+        replayed = []
+        for status, pet in recorded[:9:3]:
+            replayed.append(pf.post_new_pet_simple(auth_key, 'other', 'x', '0'))
+            replayed.append(pf.put_update_pet(auth_key, pet['id'], 'Tape', 'dog', '5'))
+            replayed.append(pf.delete_pet(auth_key, pet['id']))
+        replayed.append(pf.post_new_pet(auth_key, 'Photo', 'cat', '1', 'images/cat1.jpg'))
+        replayed.append(pf.get_list_of_pets(auth_key, 'my_pets'))
+    assert replayed == recorded and replay.remaining == 0
+
+
+@pytest.mark.negative
+def test_replay_misses_errors_and_speed(tmp_path):
+    path = tmp_path / 'crafted.jsonl'
+    path.write_text('\n'.join(json.dumps(entry) for entry in [
+        {'t': 0, 'method': 'GET', 'url': 'http://x/api/pets', 'params': {'filter': ''}, 'status': 200,
+         'elapsed': 0.05, 'response': '{"pets": []}'},
+        {'t': 0.1, 'method': 'DELETE', 'url': 'http://x/api/pets/1', 'error': 'ConnectionError', 'elapsed': 0},
+    ]), encoding='utf-8')
+    pf = PetFriends(transport=ReplayTransport(str(path), speed=1.0))
+    started = time.perf_counter()
+    assert pf.get_list_of_pets({'key': 'k'}) == (200, {'pets': []})
+    assert time.perf_counter() - started >= 0.05
+    with pytest.raises(ConnectionError):
+        pf.delete_pet({'key': 'k'}, '1')
+    with pytest.raises(CassetteMiss):
+        pf.get_list_of_pets({'key': 'k'})
+
+
+@pytest.mark.positive
+def test_recording_keeps_original_exception(tmp_path):
+    class Broken(StubTransport):
+        def request(self, method, url, **kwargs):
+            raise ConnectionResetError('reset')
+
+    pf = PetFriends(transport=RecordingTransport(Broken(), str(tmp_path / 'broken.jsonl')))
+    with pytest.raises(ConnectionResetError):
+        pf.get_list_of_pets({'key': 'k'})
+    entry = json.loads((tmp_path / 'broken.jsonl').read_text(encoding='utf-8'))
+    assert entry['error'] == 'ConnectionResetError' and 'status' not in entry
+
+
+@pytest.mark.positive
+def test_replay_traffic_shape_against_local_server(petfriends_server, tmp_path):
+    path = str(tmp_path / 'shape.jsonl')
+    record_session(petfriends_server.base_url, path)
+    with PetFriendsServer(local_accounts()) as target, PetFriends(base_url=target.base_url) as pf:
+        (email, password), = local_accounts().items()
+        summary = replay_traffic(path, pf, pf.credential(email, password), speed=None, workers=4)
+        assert summary.total == 12 and summary.ok == 12, summary.as_dict()
+        assert target.requests[('POST', 'api/create_pet_simple')] == 3
+        assert target.requests[('DELETE', 'api/pets')] == 3
+        # созданные при воспроизведении питомцы удалены по новым id, остался только питомец с фото
+        assert len(target.store.list()) == 1
+
+
+@pytest.mark.positive
+def test_recording_keeps_lines_compact_and_responses_streaming(petfriends_server, tmp_path):
+    """ По умолчанию тела сохраняются только для api/key и создания питомцев, а потоковый ответ
+    не вычитывается записью: в status-режиме большое тело так и не скачивается """
+    from tests.test_streaming import streaming_response
+
+    path = tmp_path / 'compact.jsonl'
+    record_session(petfriends_server.base_url, str(path))
+    entries = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+    with_bodies = {(entry['method'], entry['url'].rsplit('/api/', 1)[1].split('/')[0])
+                   for entry in entries if 'response' in entry}
+    assert with_bodies == {('GET', 'key'), ('POST', 'create_pet_simple'), ('POST', 'pets')}
+    listing = entries[-1]
+    assert listing['method'] == 'GET' and listing['response_size'] > 0 and len(listing['response_sha1']) == 40
+
+    body = b'{"pets": [' + b'"x",' * (1 << 18) + b'"x"]}'
+    stub = StubTransport()
+
+    def large(method, url, kwargs):
+        res = streaming_response(body)
+        res.headers['Content-Length'] = str(len(body))
+        return res
+
+    stub.add('GET', 'api/pets', handler=large)
+    streamed = tmp_path / 'streamed.jsonl'
+    with PetFriends(transport=RecordingTransport(stub, str(streamed))) as pf:
+        assert pf.get_list_of_pets({'key': 'k'}, result_mode='status') == (200, None)
+        assert [pet for pet, _ in zip(pf.iter_pets({'key': 'k'}), range(3))] == ['x', 'x', 'x']
+    skipped, partial = [json.loads(line) for line in streamed.read_text(encoding='utf-8').splitlines()]
+    assert skipped['truncated'] and skipped['response_size'] == 0
+    assert partial['truncated'] and 0 < partial['response_size'] < len(body)
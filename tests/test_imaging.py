@@ -0,0 +1,84 @@
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from imaging import PhotoPreprocessor, encode_photo
+from uploads import PhotoUpload
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    """ Пул потоков вместо пула процессов, считающий число кодирований """
+
+    def __init__(self):
+        super().__init__(4)
+        self.submitted = 0
+        self._count_lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        with self._count_lock:
+            self.submitted += 1
+        return super().submit(fn, *args, **kwargs)
+
+
+@pytest.mark.negative
+def test_preprocessor_without_pillow_raises_clear_error(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'PIL', None)
+    monkeypatch.setitem(sys.modules, 'PIL.Image', None)
+    with pytest.raises(ImportError, match='pip install Pillow'):
+        PhotoPreprocessor()
+
+
+@pytest.mark.positive
+def test_large_png_is_downscaled_to_jpeg_in_process_pool():
+    Image = pytest.importorskip('PIL.Image')
+    with PhotoPreprocessor(max_size=640) as preprocessor:
+        photo = preprocessor.prepare('images/cat1.png')
+    assert photo.filename == 'cat1.jpg' and photo.content_type == 'image/jpeg'
+    assert photo.total < 2299665 // 10
+    with Image.open(io.BytesIO(bytes(photo.read()))) as image:
+        assert image.format == 'JPEG' and max(image.size) == 640
+
+
+@pytest.mark.positive
+def test_repeated_uploads_are_encoded_once():
+    pytest.importorskip('PIL')
+    executor = CountingExecutor()
+    with PhotoPreprocessor(executor=executor) as preprocessor:
+        with ThreadPoolExecutor(8) as pool:
+            photos = list(pool.map(lambda _: preprocessor.prepare('images/cat.jpg'), range(16)))
+        with open('images/cat.jpg', 'rb') as f:
+            same_content = preprocessor.prepare(f.read())
+    executor.shutdown()
+    assert executor.submitted == 1
+    assert {bytes(photo.read()) for photo in photos} == {bytes(same_content.read())}
+    assert preprocessor.stats['hits'] == 16 and preprocessor.stats['misses'] == 1
+
+
+@pytest.mark.negative
+def test_non_image_is_passed_through_unchanged():
+    pytest.importorskip('PIL')
+    with open('images/test.txt', 'rb') as f:
+        data = f.read()
+    assert encode_photo(data) == data
+    with PhotoPreprocessor(executor=CountingExecutor()) as preprocessor:
+        photo = preprocessor.prepare('images/test.txt')
+    assert isinstance(photo, PhotoUpload) and photo.filename == 'test.txt'
+
+
+@pytest.mark.positive
+def test_client_uploads_preprocessed_photo(petfriends_server):
+    pytest.importorskip('PIL')
+    from api import PetFriends
+    from tests.conftest import local_accounts
+    (email, password), = local_accounts().items()
+    with PhotoPreprocessor(max_size=320, executor=CountingExecutor()) as preprocessor, \
+            PetFriends(base_url=petfriends_server.base_url, preprocessor=preprocessor) as pf:
+        auth_key = pf.credential(email, password)
+        status, pet = pf.post_new_pet(auth_key, 'Small', 'cat', '2', 'images/cat3.png')
+        assert status == 200 and pet['pet_photo'].startswith('data:image/jpeg;base64,')
+        assert pf.post_add_photo(auth_key, pet['id'], 'images/cat3.png')[0] == 200
+        assert preprocessor.stats['hits'] == 1
+        pf.delete_pet(auth_key, pet['id'])
@@ -0,0 +1,69 @@
+from api import PetFriends
+from instrumentation import HistogramSink, JsonlSink, TimingRecord
+import json
+import pytest
+import requests
+
+
+@pytest.mark.positive
+def test_hooks_receive_timing_records(stub_transport, tmp_path):
+    """ Каждый запрос, включая неудачный, попадает во все зарегистрированные хуки """
+    stub_transport.add('GET', 'api/pets', body={'pets': [{'id': '1'}]})
+    stub_transport.add('POST', 'api/create_pet_simple', status=400, body='Bad Request')
+
+    def broken(method, url, kwargs):
+        raise requests.ConnectionError('connection reset')
+
+    stub_transport.add('DELETE', 'api/pets/', handler=broken)
+    pf = PetFriends(base_url='http://stub/', transport=stub_transport)
+    histogram = HistogramSink()
+    jsonl = JsonlSink(str(tmp_path / 'timings.jsonl'))
+    records = []
+    for hook in (histogram, jsonl, records.append):
+        pf.add_hook(hook)
+
+    pf.get_list_of_pets({'key': 'abc'}, 'my_pets')
+    pf.post_new_pet_simple({'key': 'abc'}, 'Joseph', 'dog', '5')
+    with pytest.raises(requests.ConnectionError):
+        pf.delete_pet({'key': 'abc'}, '1')
+    jsonl.close()
+
+    assert [(r.method, r.endpoint, r.status, r.error) for r in records] == [
+        ('GET', 'api/pets', 200, None),
+        ('POST', 'api/create_pet_simple', 400, None),
+        ('DELETE', 'api/pets', None, 'ConnectionError'),
+    ]
+    assert records[0].bytes_received == len(json.dumps({'pets': [{'id': '1'}]}))
+    assert records[1].bytes_sent == len('name=Joseph&animal_type=dog&age=5')
+    assert set(records[0].phases) == {'prepare', 'rate_limit', 'request', 'download', 'decode'}
+    assert abs(sum(records[0].phases.values()) - records[0].total) < 1e-3
+
+    lines = (tmp_path / 'timings.jsonl').read_text(encoding='utf-8').splitlines()
+    assert [json.loads(line)['endpoint'] for line in lines] == ['api/pets', 'api/create_pet_simple', 'api/pets']
+
+    summary = histogram.summary()
+    assert summary['api/pets']['count'] == 2
+    assert summary['api/pets']['errors'] == 1
+    text = histogram.prometheus_text()
+    assert 'petfriends_request_duration_seconds{endpoint="api/pets",quantile="0.99"}' in text
+    assert 'petfriends_request_duration_seconds_count{endpoint="api/create_pet_simple"} 1' in text
+
+    pf.remove_hook(histogram)
+    pf.get_list_of_pets({'key': 'abc'})
+    assert histogram.summary()['api/pets']['count'] == 2
+    assert len(records) == 4
+
+
+@pytest.mark.additional_positive
+def test_histogram_sink_memory_does_not_grow_with_requests():
+    """ Длительности копятся в гистограмме, а не списком: число корзин ограничено """
+    sink = HistogramSink(by_method=True)
+    for i in range(50_000):
+        record = TimingRecord('GET', 'api/pets', 'api/pets', 1, 0.0)
+        record.status, record.total = 200, 0.001 * (1 + i % 50)
+        sink(record)
+
+    histogram = sink.snapshot()['GET api/pets']['histogram']
+    assert histogram.count == 50_000
+    assert len(histogram.counts) <= 50
+    assert sink.summary()['GET api/pets']['p50'] == pytest.approx(0.025, rel=0.01)
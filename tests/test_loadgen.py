@@ -0,0 +1,74 @@
+import json
+import random
+
+import pytest
+
+import main
+from stats import LatencyHistogram, percentile
+
+
+@pytest.mark.positive
+def test_histogram_percentiles_within_precision():
+    """ Перцентили гистограммы отличаются от точных не больше чем на 1% """
+    rng = random.Random(1)
+    values = [rng.lognormvariate(-4, 1) for _ in range(20000)]
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+    values.sort()
+    for q in (50, 90, 99, 99.9):
+        assert histogram.percentile(q) == pytest.approx(percentile(values, q), rel=0.01)
+    assert histogram.count == 20000 and histogram.max == values[-1]
+
+
+@pytest.mark.positive
+def test_histogram_merge_and_json_round_trip():
+    first, second = LatencyHistogram(), LatencyHistogram()
+    for i in range(1, 101):
+        (first if i % 2 else second).record(i / 1000)
+    first.merge(LatencyHistogram.from_dict(json.loads(json.dumps(second.to_dict()))))
+    assert first.count == 100 and first.min == 0.001 and first.max == 0.1
+    assert first.percentile(50) == pytest.approx(0.05, rel=0.01)
+
+
+@pytest.mark.positive
+@pytest.mark.parametrize('mode', ['closed', 'open'])
+def test_run_load_against_local_server(local_pf, mode):
+    from tests.conftest import local_accounts
+    (email, password), = local_accounts().items()
+    result = main.run_load(local_pf, local_pf.credential(email, password), 'churn', mode, users=2, rate=20,
+                           duration=0.5, seed=1)
+    assert result['iterations']['count'] > 0 and result['iterations']['errors'] == 0
+    for name in ('POST api/create_pet_simple', 'PUT api/pets', 'DELETE api/pets'):
+        assert result['endpoints'][name]['count'] == result['iterations']['count']
+    json.dumps(result)
+
+
+@pytest.mark.negative
+def test_compare_reports_regressions_above_threshold():
+    def run(p99, throughput, count=100):
+        return {'endpoints': {'GET api/pets': {'count': count, 'p50': 0.01, 'p99': p99, 'throughput': throughput}}}
+
+    assert main.compare(run(0.105, 95), run(0.1, 100), threshold=0.1) == []
+    regressions = main.compare(run(0.2, 50), run(0.1, 100), threshold=0.1)
+    assert len(regressions) == 2 and all(r.startswith('GET api/pets') for r in regressions)
+    assert main.compare(run(0.2, 50), run(0.1, 100, count=1)) == []
+    with pytest.raises(ValueError):
+        main.compare(dict(run(0.1, 100), scenario='upload'), dict(run(0.1, 100), scenario='list'))
+
+
+@pytest.mark.negative
+def test_main_exit_code_on_regression(tmp_path, capsys):
+    baseline = tmp_path / 'baseline.json'
+    assert main.main(['--local', '--scenario', 'list', '--users', '2', '--duration', '0.3',
+                      '--output', str(baseline)]) == 0
+    data = json.loads(baseline.read_text(encoding='utf-8'))
+    for endpoint in data['endpoints'].values():
+        endpoint['p50'] = endpoint['p99'] = 1e-9
+    baseline.write_text(json.dumps(data), encoding='utf-8')
+    assert main.main(['--local', '--scenario', 'list', '--users', '2', '--duration', '0.3',
+                      '--baseline', str(baseline)]) == 1
+    assert 'РЕГРЕССИЯ' in capsys.readouterr().out
+    assert main.main(['--local', '--scenario', 'churn', '--users', '2', '--duration', '0.3',
+                      '--baseline', str(baseline)]) == 2
+    assert 'scenario=list' in capsys.readouterr().out
@@ -0,0 +1,50 @@
+from tests.conftest import local_accounts
+from local_server import PetFriendsServer
+from api import PetFriends
+import pytest
+
+
+@pytest.mark.positive
+def test_local_server_full_pet_lifecycle(local_pf):
+    """ Все эндпоинты клиента работают против локального сервера, включая пустой ответ на удаление """
+    (email, password), = local_accounts().items()
+    status, auth_key = local_pf.get_api_key(email, password)
+    assert status == 200
+
+    status, pet = local_pf.post_new_pet(auth_key, 'Hitch', 'cat', '10', 'images/cat.jpg')
+    assert status == 200
+    assert pet['pet_photo'].startswith('data:image/jpeg;base64,')
+    status, simple = local_pf.post_new_pet_simple(auth_key, 'Joseph', 'dog', '5')
+    assert status == 200 and simple['pet_photo'] == ''
+
+    _, my_pets = local_pf.get_list_of_pets(auth_key, 'my_pets')
+    assert [p['id'] for p in my_pets['pets'][:2]] == [simple['id'], pet['id']]
+
+    status, updated = local_pf.put_update_pet(auth_key, pet['id'], 'Hitchcock', 'old_cat', 18)
+    assert status == 200 and updated['name'] == 'Hitchcock'
+    status, photo = local_pf.post_add_photo(auth_key, simple['id'], 'images/cat2.png')
+    assert status == 200 and photo['pet_photo'].startswith('data:image/png;base64,')
+    assert local_pf.post_add_photo(auth_key, simple['id'], 'images/test.txt')[0] == 500
+
+    assert local_pf.delete_pet(auth_key, pet['id']) == (200, '')
+    _, my_pets = local_pf.get_list_of_pets(auth_key, 'my_pets')
+    assert pet['id'] not in [p['id'] for p in my_pets['pets']]
+
+
+@pytest.mark.negative
+def test_local_server_rejects_invalid_credentials(local_pf):
+    """ Неверный пароль и неверный ключ дают 403, как на настоящем сервере """
+    (email, _), = local_accounts().items()
+    assert local_pf.get_api_key(email, 'wrong')[0] == 403
+    assert local_pf.get_list_of_pets({'key': '5be340894a8d13758243db49f68e112ee516633ad80b0d67a0ce733c'})[0] == 403
+
+
+@pytest.mark.negative
+def test_local_server_injects_errors_and_latency():
+    """ error_rate и latency позволяют проверить клиент на сбоях и медленных ответах """
+    with PetFriendsServer({'a@b.c': 'p'}, error_rate=0.5, latency=0.001, seed=1) as server:
+        pf = PetFriends(base_url=server.base_url)
+        statuses = [pf.get_api_key('a@b.c', 'p')[0] for _ in range(40)]
+        pf.close()
+    assert set(statuses) == {200, 500}
+    assert 5 < statuses.count(500) < 35
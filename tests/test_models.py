@@ -0,0 +1,18 @@
+import json
+import pytest
+
+from models import PetList
+
+
+@pytest.mark.negative
+def test_pet_list_accepts_null_fields():
+    """ null в полях питомца не ломает разбор: значения остаются None, как в res.json() """
+    body = json.dumps({'pets': [
+        {'id': '1', 'name': 'Барсик', 'animal_type': None, 'age': None, 'created_at': None, 'user_id': None,
+         'pet_photo': None},
+        {'id': '2', 'name': 'Рекс', 'animal_type': 'dog', 'age': 3, 'user_id': 'u'},
+    ]})
+    first, second = PetList.from_json(body)
+    assert (first.animal_type, first.age, first.user_id, first.photo_bytes) == (None, None, None, b'')
+    assert first.to_dict()['pet_photo'] is None
+    assert (second.animal_type, second.age, second.user_id) == ('dog', '3', 'u')
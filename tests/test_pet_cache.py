@@ -0,0 +1,95 @@
+from api import PetFriends
+from pet_cache import PetListCache
+from tests.conftest import make_response
+import pytest
+
+PETS = [{'id': str(i), 'name': 'pet%d' % i, 'animal_type': 'cat' if i % 2 else 'dog', 'age': '1'}
+        for i in range(1000)]
+
+
+def pets_server(stub_transport, etag=None):
+    """ api/pets отдаёт PETS; если задан etag, на совпадающий If-None-Match отвечает 304 """
+    def handler(method, url, kwargs):
+        if etag and (kwargs['headers'] or {}).get('If-None-Match') == etag:
+            return make_response(304, b'')
+        return make_response(200, {'pets': PETS}, headers={'ETag': etag} if etag else None)
+
+    stub_transport.add('GET', 'api/pets', handler=handler)
+
+
+@pytest.mark.positive
+def test_pet_cache_indexes_and_revalidates(stub_transport):
+    """ Повторный get отдаётся из кэша, после TTL список перепроверяется через ETag или хэш тела """
+    for etag in ('"v1"', None):
+        stub_transport.calls.clear()
+        stub_transport.routes.clear()
+        pets_server(stub_transport, etag)
+        cache = PetListCache(PetFriends(base_url='http://stub/', transport=stub_transport), ttl=60)
+        auth_key = {'key': 'abc'}
+
+        status, pets = cache.get(auth_key, 'my_pets')
+        assert status == 200
+        assert pets.get('500')['name'] == 'pet500'
+        assert [pet['id'] for pet in pets.find_by_name('pet7')] == ['7']
+        assert len(pets.find_by_type('cat')) == 500
+        assert cache.get(auth_key, 'my_pets')[1] is pets
+
+        cache.ttl = 0
+        assert cache.get(auth_key, 'my_pets')[1] is pets
+        assert cache.stats == {'hits': 1, 'revalidated': 1, 'fetched': 1}
+        assert len(stub_transport.calls) == 2
+
+
+@pytest.mark.positive
+def test_pet_cache_applies_own_changes(stub_transport):
+    """ Создание, изменение и удаление через кэш обновляют индекс без новой загрузки списка """
+    pets_server(stub_transport)
+    stub_transport.add('POST', 'api/create_pet_simple', body={'id': 'new', 'name': 'Joseph', 'animal_type': 'dog',
+                                                              'age': '5'})
+    stub_transport.add('PUT', 'api/pets/', body={'name': 'Hitchcock', 'animal_type': 'old_cat', 'age': '18'})
+    stub_transport.add('DELETE', 'api/pets/', body='')
+    cache = PetListCache(PetFriends(base_url='http://stub/', transport=stub_transport))
+    auth_key = {'key': 'abc'}
+    _, pets = cache.get(auth_key, 'my_pets')
+
+    cache.post_new_pet_simple(auth_key, 'Joseph', 'dog', '5')
+    cache.put_update_pet(auth_key, '1', 'Hitchcock', 'old_cat', 18)
+    cache.delete_pet(auth_key, '2')
+
+    assert pets.pets[0]['id'] == 'new'
+    assert pets.get('1')['name'] == 'Hitchcock'
+    assert pets.find_by_name('pet1') == []
+    assert '2' not in pets
+    assert cache.get(auth_key, 'my_pets')[1] is pets
+    assert [call[0] for call in stub_transport.calls] == ['GET', 'POST', 'PUT', 'DELETE']
+
+
+@pytest.mark.additional_positive
+def test_pet_cache_follows_direct_client_writes_and_key_refresh(stub_transport):
+    """ Запись через клиент в обход кэша не оставляет устаревших списков, а обновление ключа
+    Credential не теряет закэшированные списки """
+    pets_server(stub_transport)
+    stub_transport.add('GET', 'api/key', handler=lambda method, url, kwargs: make_response(
+        200, {'key': 'key%d' % len(stub_transport.calls)}))
+    stub_transport.add('DELETE', 'api/pets/', body='')
+    stub_transport.add('POST', 'api/pets/set_photo/', body={'id': '3', 'pet_photo': 'data:image/jpeg;base64,'})
+    stub_transport.add('POST', 'api/create_pet_simple', body={'id': 'new', 'name': 'Joseph', 'animal_type': 'dog',
+                                                              'age': '5'})
+    client = PetFriends(base_url='http://stub/', transport=stub_transport)
+    cache = PetListCache(client)
+    credential = client.credential('user@example.com', 'password')
+    _, pets = cache.get(credential, 'my_pets')
+
+    credential.refresh(credential.key())
+    assert cache.get(credential, 'my_pets')[1] is pets
+
+    client.delete_pet(credential, '2')
+    assert '2' not in pets and cache.get(credential, 'my_pets')[1] is pets
+    client._request('POST', 'api/pets/set_photo/3', auth_key=credential)
+    assert cache.get(credential, 'my_pets')[1] is not pets
+    client.post_new_pet_simple(credential, 'Joseph', 'dog', '5')
+    cache.close()
+    client.delete_pet(credential, '4')
+    assert cache.stats == {'hits': 2, 'revalidated': 0, 'fetched': 2}
+    assert '4' in cache.get(credential, 'my_pets')[1]
+    assert cache.stats['fetched'] == 3
@@ -1,13 +1,13 @@
-from api import PetFriends
 from settings import valid_email, valid_password
 import pytest
 import os
 
-pf = PetFriends()
+# Клиент pf, ключ auth_key и питомец my_pet - фикстуры из conftest.py: клиент и ключ общие на сессию,
+# а питомца каждый тест создаёт и удаляет сам, поэтому тесты можно запускать параллельно (pytest -n auto)
 
 
 @pytest.mark.positive
-def test_get_api_key_for_valid_user(email=valid_email, password=valid_password):
+def test_get_api_key_for_valid_user(pf, email=valid_email, password=valid_password):
     """ Проверяем что запрос api ключа возвращает статус 200 и в результате содержится слово key"""
     # Отправляем запрос и сохраняем полученный ответ с кодом статуса в status, а текст ответа в result
     status, result = pf.get_api_key(email, password)
@@ -17,24 +17,21 @@ def test_get_api_key_for_valid_user(email=valid_email, password=valid_password):
 
 
 @pytest.mark.positive
-def test_get_all_pets_with_valid_key(filter=''):
+def test_get_all_pets_with_valid_key(pf, auth_key, filter=''):
     """ Проверяем что запрос всех питомцев возвращает не пустой список.
-        Для этого сначала получаем api ключ и сохраняем в переменную auth_key. Далее используя этого ключ
+        Api ключ получаем из фикстуры auth_key. Далее используя этот ключ
         запрашиваем список всех питомцев и проверяем что список не пустой.
         Доступное значение параметра filter - 'my_pets' либо '' (все питомцы) """
 
-    _, auth_key = pf.get_api_key(valid_email, valid_password)
     status, result = pf.get_list_of_pets(auth_key, filter)
     assert status == 200
     assert len(result['pets']) > 0
 
 
 @pytest.mark.positive
-def test_post_new_pet_with_valid_key(name='Hitch', animal_type='cat', age=10, pet_photo='images/cat.jpg'):
+def test_post_new_pet_with_valid_key(pf, auth_key, name='Hitch', animal_type='cat', age=10,
+                                     pet_photo='images/cat.jpg'):
     """ Проверяем, что можно добавить питомца с валидными данными """
-    # Запрашиваем ключ api и сохраняем в переменную auth_key
-    _, auth_key = pf.get_api_key(valid_email, valid_password)
-
     # # Для получения полного, а не относительного пути к фото питомца.
     # pet_photo = os.path.join(os.path.dirname(__file__), pet_photo)
     # pet_photo = os.path.normpath(pet_photo)
@@ -49,89 +46,51 @@ def test_post_new_pet_with_valid_key(name='Hitch', animal_type='cat', age=10, pe
 
 
 @pytest.mark.positive
-def test_put_update_pet(name='Hitchcock', animal_type='old_cat', age=18):
+def test_put_update_pet(pf, auth_key, my_pet, name='Hitchcock', animal_type='old_cat', age=18):
     """ Проверяем возможность обновления информации о питомце """
-    # Получаем ключ auth_key и запрашиваем список своих питомцев:
-    # (При запросе получаем статус и результат, но статус нам не нужен, ставим прочерк)
-    _, auth_key = pf.get_api_key(valid_email, valid_password)
-    _, my_pets = pf.get_list_of_pets(auth_key, 'my_pets')
-
-    # Если список не пустой, пробуем обновить вид животного и его возраст
-    if len(my_pets['pets']) > 0:
+    # Питомца для обновления создаёт фикстура my_pet, распечатаем его значения:
+    print('\n\nname: ', my_pet['name'])
+    print('animal_type: ', my_pet['animal_type'])
+    print('age: ', my_pet['age'])
 
-        # Разберемся с индексами, распечатаем отдельные значения:
-        print('\n\nname: ', my_pets['pets'][0]['name'])
-        print('animal_type: ', my_pets['pets'][0]['animal_type'])
-        print('age: ', my_pets['pets'][0]['age'])
+    pet_id = my_pet['id']
+    print('\n\n', pet_id)
 
-        # Найдем id нужного питомца по имени:
-        # pet_id = '0'
-        # for pet in my_pets['pets']:
-        #     if pet['name'] == name:
-        #         pet_id = pet['id']
-        #         break
-
-        # Или же возьмем id первого питомца из списка
-        pet_id = my_pets['pets'][0]['id']
-        print('\n\n', pet_id)
-
-        # и отправляем запрос на обновление:
-        status, result = pf.put_update_pet(auth_key, pet_id, name, animal_type, age)
-        assert status == 200
-        assert result['name'] == name
-    else:
-        # Если список пустой, выводим исключение с текстом об отсутствии своих питомцев
-        raise Exception("Список моих питомцев пуст")
+    # и отправляем запрос на обновление:
+    status, result = pf.put_update_pet(auth_key, pet_id, name, animal_type, age)
+    assert status == 200
+    assert result['name'] == name
 
 
 @pytest.mark.positive
-def test_delete_pet_for_valid_id():
+def test_delete_pet_for_valid_id(pf, auth_key, my_pet):
     """ Проверяем возможность удаления питомца """
-    # Получаем ключ auth_key и запрашиваем список своих питомцев:
-    _, auth_key = pf.get_api_key(valid_email, valid_password)
-    _, my_pets = pf.get_list_of_pets(auth_key, 'my_pets')
-
-    # Проверяем, есть ли питомцы в списке.
-    if len(my_pets['pets']) == 0:
-        # Берём id первого питомца из списка и отправляем запрос на удаление:
-        pet_id = my_pets['pets'][0]['id']
-        status, _ = pf.delete_pet(auth_key, pet_id)
+    # Берём id питомца из фикстуры my_pet и отправляем запрос на удаление:
+    pet_id = my_pet['id']
+    status, _ = pf.delete_pet(auth_key, pet_id)
 
-        # Еще раз запрашиваем список питомцев, чтобы проверить, нет ли в нем удаленного питомца:
-        _, my_pets = pf.get_list_of_pets(auth_key, 'my_pets')
+    # Еще раз запрашиваем список питомцев, чтобы проверить, нет ли в нем удаленного питомца:
+    _, my_pets = pf.get_list_of_pets(auth_key, 'my_pets')
 
-        # Проверяем, что статус ответа = 200, а в списке питомцев нет удаленного:
-        assert status == 200
-        assert pet_id not in my_pets.values()
+    # Проверяем, что статус ответа = 200, а в списке питомцев нет удаленного:
+    assert status == 200
+    assert pet_id not in [pet['id'] for pet in my_pets['pets']]
 
 
 @pytest.mark.positive
-def test_post_add_photo(pet_photo='images/cat1.jpg'):
+def test_post_add_photo(pf, auth_key, my_pet, pet_photo='images/cat1.jpg'):
     """ Проверяем возможность добавления фото в карточку питомца """
-    # Получаем ключ auth_key и запрашиваем список своих питомцев
-    _, auth_key = pf.get_api_key(valid_email, valid_password)
-    _, my_pets = pf.get_list_of_pets(auth_key, 'my_pets')
+    # Берём id питомца из фикстуры my_pet и отправляем запрос на добавление фото:
+    status, result = pf.post_add_photo(auth_key, my_pet['id'], pet_photo)
 
-    # Если список не пустой, пробуем обновить фото
-    if len(my_pets['pets']) != 0:
-        #  берём из этого списка id первого питомца и отправляем запрос на добавление фото:
-        pet_id = my_pets['pets'][0]['id']
-        status, result = pf.post_add_photo(auth_key, pet_id, pet_photo)
-
-        assert status == 200
-        assert result['pet_photo'] is not None
-        print(status)
-    else:
-        # если список пустой, выводим исключение с сообщением, что список пуст
-        raise Exception('Список ваших питомцев пуст, некуда добавить фото')
+    assert status == 200
+    assert result['pet_photo'] is not None
+    print(status)
 
 
 @pytest.mark.positive
-def test_post_new_pet_simple_with_valid_key(name='Joseph', animal_type='dog', age=5):
+def test_post_new_pet_simple_with_valid_key(pf, auth_key, name='Joseph', animal_type='dog', age=5):
     """ Проверяем, что можно добавить питомца с валидными данными, метод без фото """
-    # Запрашиваем ключ api и сохраняем в переменную auth_key
-    _, auth_key = pf.get_api_key(valid_email, valid_password)
-
     # Добавляем питомца без фото
     status, result = pf.post_new_pet_simple(auth_key, name, animal_type, str(age))
     # Сверяем полученный ответ с ожидаемым результатом
@@ -148,7 +107,7 @@ negative_email = ['', 'un-momento@yandex', '<script>alert(123)</script>',
 
 
 @pytest.mark.negative
-def test_get_api_key_for_invalid_user(email=negative_email, password=valid_password):
+def test_get_api_key_for_invalid_user(pf, email=negative_email, password=valid_password):
     """ Запрос api ключа не выполняется при неправильных данных e-mail и password. Ожидается, что тест
     выдаст 403: ошибку на стороне клиента (предоставленные данные не верны)"""
     print()
@@ -174,7 +133,7 @@ def test_get_api_key_for_invalid_user(email=negative_email, password=valid_passw
 
 # 2
 @pytest.mark.negative
-def test_get_all_pets_with_invalid_key(filter=''):
+def test_get_all_pets_with_invalid_key(pf, filter=''):
     """ Запрос списка питомцев с неправильным ключом должен быть отклонен сервером. Ожидается ошибка 403
     - на стороне клиента """
     # Ключ аутентификации нужной длины, но не верный
@@ -185,9 +144,9 @@ def test_get_all_pets_with_invalid_key(filter=''):
 
 # 3
 @pytest.mark.negative
-def test_post_new_pet_without_name(name='', animal_type='anonymous', age=10, pet_photo='images/cat1.jpg'):
+def test_post_new_pet_without_name(pf, auth_key, name='', animal_type='anonymous', age=10,
+                                   pet_photo='images/cat1.jpg'):
     """ Проверяем, что нельзя добавить питомца с пустым именем. Ожидается ошибка 403 - на стороне клиента """
-    _, auth_key = pf.get_api_key(valid_email, valid_password)
     # Пробуем добавить питомца
     status, result = pf.post_new_pet(auth_key, name, animal_type, str(age), pet_photo)
     # Сверяем полученный ответ с ожидаемым результатом
@@ -200,9 +159,9 @@ list_photo = ['images/cat1.jpeg', 'images/cat3.png']
 
 
 @pytest.mark.additional_positive
-def test_post_new_pet_with_diff_format_photo(name='Forrest', animal_type='cat', age=10, pet_photo=list_photo):
+def test_post_new_pet_with_diff_format_photo(pf, auth_key, name='Forrest', animal_type='cat', age=10,
+                                             pet_photo=list_photo):
     """ Проверяем, что можно добавить фото питомца в форматах .png, .jpeg. Ожидаем ответ 200 """
-    _, auth_key = pf.get_api_key(valid_email, valid_password)
     print()
     # Пробуем добавить питомца с разными форматами фото
     for i in list_photo:
@@ -225,10 +184,10 @@ Cсылке на фотографию (img src) не присваивается
 
 # 5
 @pytest.mark.negative
-def test_post_new_pet_with_invalid_animal_type(name='Fill', animal_type='007', age=10, pet_photo='images/cat.jpg'):
+def test_post_new_pet_with_invalid_animal_type(pf, auth_key, name='Fill', animal_type='007', age=10,
+                                               pet_photo='images/cat.jpg'):
     """ Проверяем, что нельзя добавить питомца с цифрами вместо вида животного.
     Ожидается ошибка 403 - на стороне клиента """
-    _, auth_key = pf.get_api_key(valid_email, valid_password)
     # Пробуем добавить питомца
     # ttt = os.path.normpath(os.path.abspath('test_pet_friends.py'))
     # os.chdir(os.path.normpath(os.path.abspath('test_pet_friends.py')))
@@ -241,10 +200,10 @@ def test_post_new_pet_with_invalid_animal_type(name='Fill', animal_type='007', a
 
 # 6
 @pytest.mark.negative
-def test_post_new_pet_with_invalid_age(name='Sam', animal_type='cat', age='десять', pet_photo='images/cat.jpg'):
+def test_post_new_pet_with_invalid_age(pf, auth_key, name='Sam', animal_type='cat', age='десять',
+                                       pet_photo='images/cat.jpg'):
     """ Проверяем, что нельзя добавить питомца с буквенным значением возраста.
     Ожидается ошибка 403 - на стороне клиента """
-    _, auth_key = pf.get_api_key(valid_email, valid_password)
     # Пробуем добавить питомца
     status, result = pf.post_new_pet(auth_key, name, animal_type, str(age), pet_photo)
     # Сверяем полученный ответ с ожидаемым результатом
@@ -268,10 +227,9 @@ long_name = 'jYzwgh108Fs9OwiTYvLMDzpENdG1wKIcuXcJNBexIaAFZnC321NehgMn9iDPNSs4g1d
 
 
 @pytest.mark.negative
-def test_post_new_pet_with_too_long_name(name=long_name, animal_type='cat', age='десять',
+def test_post_new_pet_with_too_long_name(pf, auth_key, name=long_name, animal_type='cat', age='десять',
                                          pet_photo='images/cat.jpg'):
     """ Проверяем, что при добавлении питомца поле name имеет ограничение по длине ввода символов """
-    _, auth_key = pf.get_api_key(valid_email, valid_password)
     # Пробуем добавить питомца
     status, result = pf.post_new_pet(auth_key, name, animal_type, str(age), pet_photo)
     # Сверяем полученный ответ с ожидаемым результатом
@@ -283,10 +241,8 @@ def test_post_new_pet_with_too_long_name(name=long_name, animal_type='cat', age=
 
 # 8
 @pytest.mark.negative
-def test_post_new_pet_simple_with_negative_number(name='Jon', animal_type='frog', age=-7):
+def test_post_new_pet_simple_with_negative_number(pf, auth_key, name='Jon', animal_type='frog', age=-7):
     """ Нельзя добавить питомца с отрицательным возрастом, метод без фото """
-    # Запрашиваем ключ api и сохраняем в переменную auth_key
-    _, auth_key = pf.get_api_key(valid_email, valid_password)
     # Добавляем питомца
     status, result = pf.post_new_pet_simple(auth_key, name, animal_type, str(age))
     # Сверяем полученный ответ с ожидаемым результатом
@@ -297,41 +253,22 @@ def test_post_new_pet_simple_with_negative_number(name='Jon', animal_type='frog'
 
 # 9
 @pytest.mark.negative
-def test_post_add_photo_with_invalid_format(pet_photo='images/test.txt'):
+def test_post_add_photo_with_invalid_format(pf, auth_key, my_pet, pet_photo='images/test.txt'):
     """ Нельзя добавить файл неподходящего формата """
-    # Получаем ключ auth_key и запрашиваем список своих питомцев
-    _, auth_key = pf.get_api_key(valid_email, valid_password)
-    _, my_pets = pf.get_list_of_pets(auth_key, 'my_pets')
-
-    # Если список не пустой, пробуем обновить фото
-    if len(my_pets['pets']) != 0:
-        #  берём из этого списка id первого питомца и отправляем запрос на добавление фото:
-        pet_id = my_pets['pets'][0]['id']
-        status, result = pf.post_add_photo(auth_key, pet_id, pet_photo)
+    # Берём id питомца из фикстуры my_pet и отправляем запрос на добавление фото:
+    status, result = pf.post_add_photo(auth_key, my_pet['id'], pet_photo)
 
-        assert status == 500
-    else:
-        # если список пустой, выводим исключение с сообщением, что список пуст
-        raise Exception('Список ваших питомцев пуст, некуда добавить фото')
+    assert status == 500
 
 """!!! Вообще-то должна быть ошибка 403, но на данный момент сервер выдает 500 !!! """
 
 
 # 10
 @pytest.mark.negative
-def test_put_update_alien_pet(name='Hitchcock', animal_type='old_cat', age=18):
+def test_put_update_alien_pet(pf, my_pet, name='Hitchcock', animal_type='old_cat', age=18):
     """ Нельзя обновить не своего питомца. Пробуем обновлять по чужому id """
-    # Получаем ключ auth_key и запрашиваем список своих питомцев:
-    _, auth_key = pf.get_api_key(valid_email, valid_password)
-    _, my_pets = pf.get_list_of_pets(auth_key, 'my_pets')
-    # Если список не пустой,
-
-    if len(my_pets['pets']) == 0:
-        # Добавляем питомца в список:
-        pf.post_new_pet_simple(auth_key, 'Lazutchik', 'abc', '1')
-
-    # Получаем ID последнего питомца в списке
-    pet_id = my_pets['pets'][-1]['id']
+    # Берём ID питомца, созданного фикстурой my_pet под основным пользователем
+    pet_id = my_pet['id']
 
     # Заходим под другими данными email и password, получаем другой аутентификационный ключ:
     _, auth_key = pf.get_api_key('igra@bk.ru', '111')
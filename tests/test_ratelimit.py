@@ -0,0 +1,73 @@
+from api import PetFriends
+from async_api import AsyncPetFriends
+from ratelimit import RateLimiter, endpoint_of
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import multiprocessing
+import time
+import pytest
+
+
+@pytest.mark.positive
+def test_endpoint_of_groups_paths_by_limit():
+    """ Пути с ID питомца сводятся к эндпоинтам из ТЗ """
+    assert endpoint_of('api/pets/123') == 'api/pets'
+    assert endpoint_of('api/pets/set_photo/123') == 'api/pets/set_photo'
+    assert endpoint_of('api/pets?filter=my_pets') == 'api/pets'
+    assert endpoint_of('api/create_pet_simple') == 'api/create_pet_simple'
+
+
+@pytest.mark.positive
+def test_rate_limiter_throttles_threads_per_endpoint(stub_transport):
+    """ 20 запросов к api/pets при лимите 100/с и всплеске 5 занимают не меньше 0.15 с,
+    а эндпоинт без лимита не ждёт """
+    stub_transport.add('GET', 'api/pets', body={'pets': []})
+    stub_transport.add('GET', 'api/key', body={'key': 'abc'})
+    limiter = RateLimiter({'api/pets': (100, 5)})
+    pf = PetFriends(base_url='http://stub/', transport=stub_transport, rate_limiter=limiter)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: pf.get_list_of_pets({'key': 'abc'}), range(20)))
+    assert time.perf_counter() - started >= 0.14
+    pf.get_api_key('email', 'password')
+
+    metrics = limiter.metrics()
+    assert metrics['api/pets']['requests'] == 20
+    assert metrics['api/pets']['delayed'] == 15
+    assert metrics['api/pets']['wait_total'] >= metrics['api/pets']['wait_max'] > 0
+    assert metrics['api/key']['wait_total'] == 0
+
+
+@pytest.mark.positive
+def test_rate_limiter_in_asyncio(stub_transport):
+    """ AsyncPetFriends ждёт лимит в цикле событий """
+    stub_transport.add('DELETE', 'api/pets/', body='')
+    limiter = RateLimiter({}, default=(200, 1))
+
+    async def run():
+        async with AsyncPetFriends(base_url='http://stub/', transport=stub_transport, rate_limiter=limiter) as apf:
+            return await apf.gather_delete_pets({'key': 'abc'}, [str(i) for i in range(21)])
+
+    started = time.perf_counter()
+    assert [status for status, _ in asyncio.run(run())] == [200] * 21
+    assert time.perf_counter() - started >= 0.09
+
+
+def take_tokens(state_dir: str, count: int):
+    limiter = RateLimiter({'api/create_pet_simple': (100, 1)}, state_dir=state_dir)
+    for _ in range(count):
+        limiter.acquire('api/create_pet_simple')
+
+
+@pytest.mark.positive
+def test_file_backend_shares_limit_between_processes(tmp_path):
+    """ Два процесса с общим каталогом состояния делят один лимит 100/с: 30 запросов - не меньше 0.29 с """
+    started = time.perf_counter()
+    processes = [multiprocessing.Process(target=take_tokens, args=(str(tmp_path), 15)) for _ in range(2)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert all(process.exitcode == 0 for process in processes)
+    assert time.perf_counter() - started >= 0.28
@@ -0,0 +1,69 @@
+import pytest
+
+from api import PetFriends
+from responses import LazyJSON, discard
+from tests.test_streaming import streaming_response
+
+
+@pytest.fixture
+def client(stub_transport):
+    stub_transport.add('GET', 'api/pets', body={'pets': [{'id': '1'}]})
+    stub_transport.add('DELETE', 'api/pets', body='')
+    return PetFriends(transport=stub_transport)
+
+
+@pytest.mark.positive
+def test_result_modes(client, stub_transport):
+    key = {'key': 'k'}
+    assert client.get_list_of_pets(key) == (200, {'pets': [{'id': '1'}]})
+    assert client.delete_pet(key, '1') == (200, '')
+    assert client.get_list_of_pets(key, result_mode='bytes') == (200, b'{"pets": [{"id": "1"}]}')
+
+    status, lazy = client.get_list_of_pets(key, result_mode='lazy')
+    assert isinstance(lazy, LazyJSON) and not lazy._parsed
+    assert lazy['pets'][0]['id'] == '1' and lazy == {'pets': [{'id': '1'}]}
+
+    assert client.delete_pet(key, '1', result_mode='status') == (200, None)
+    _, _, kwargs = stub_transport.calls[-1]
+    assert kwargs['stream'] is True
+
+
+@pytest.mark.negative
+def test_unknown_result_mode_is_rejected_before_sending(client, stub_transport):
+    with pytest.raises(ValueError):
+        client.get_list_of_pets({'key': 'k'}, result_mode='xml')
+    with pytest.raises(ValueError):
+        PetFriends(transport=stub_transport, result_mode='xml')
+    assert stub_transport.calls == []
+
+
+@pytest.mark.positive
+def test_client_default_mode_and_decode_phase(stub_transport):
+    stub_transport.add('GET', 'api/pets', body={'pets': []})
+    records = []
+    pf = PetFriends(transport=stub_transport, result_mode='lazy')
+    pf.add_hook(records.append)
+    status, result = pf.get_list_of_pets({'key': 'k'})
+    assert isinstance(result, LazyJSON) and result['pets'] == []
+    assert records[0].phases['decode'] >= 0
+    assert records[0].total >= sum(records[0].phases.values()) - 1e-6
+
+
+@pytest.mark.positive
+def test_discard_drains_small_bodies_and_drops_large_ones():
+    small = streaming_response(b'x' * 100)
+    small.headers['Content-Length'] = '100'
+    raw = small.raw
+    position = []
+    # тело должно быть дочитано до закрытия ответа, иначе соединение не вернётся в пул
+    small.close = lambda close=small.close: (position.append(raw.tell()), close())
+    discard(small)
+    assert position == [100]
+
+    large = streaming_response(b'x' * (1 << 20))
+    large.headers['Content-Length'] = str(1 << 20)
+    raw = large.raw
+    position = []
+    raw.close = lambda close=raw.close: (position.append(raw.tell()), close())
+    discard(large)
+    assert position == [0]
@@ -0,0 +1,131 @@
+from api import PetFriends
+from retry import CircuitBreaker, CircuitOpenError, RetryBudget, RetryPolicy
+from tests.conftest import make_response
+import requests
+import pytest
+
+
+def flaky(statuses):
+    """ Обработчик заглушки, отвечающий статусами из statuses по очереди (последний - дальше всегда) """
+    calls = []
+
+    def handler(method, url, kwargs):
+        calls.append(url)
+        status = statuses[min(len(calls), len(statuses)) - 1]
+        if status is None:
+            raise requests.ConnectionError('connection reset')
+        return make_response(status, {'pets': []} if status == 200 else 'error')
+
+    return handler, calls
+
+
+def make_client(stub_transport, **policy):
+    policy.setdefault('sleep', lambda delay: None)
+    return PetFriends(base_url='http://stub/', transport=stub_transport, retry=RetryPolicy(**policy))
+
+
+@pytest.mark.positive
+def test_idempotent_requests_are_retried(stub_transport):
+    """ GET переживает обрыв соединения и 503, DELETE - 502 """
+    handler, calls = flaky([None, 503, 200])
+    stub_transport.add('GET', 'api/pets', handler=handler)
+    stub_transport.add('DELETE', 'api/pets/', handler=flaky([502, 200])[0])
+    pf = make_client(stub_transport)
+
+    assert pf.get_list_of_pets({'key': 'abc'})[0] == 200
+    assert len(calls) == 3
+    assert pf.delete_pet({'key': 'abc'}, '1')[0] == 200
+
+
+@pytest.mark.negative
+def test_post_is_not_retried_without_rule(stub_transport):
+    """ Создание питомца не повторяется, чтобы не получить дубликат, а установка фото - повторяется """
+    handler, calls = flaky([500, 200])
+    stub_transport.add('POST', 'api/create_pet_simple', handler=handler)
+    photo_handler, photo_calls = flaky([503, 200])
+    stub_transport.add('POST', 'api/pets/set_photo/', handler=photo_handler)
+    pf = make_client(stub_transport)
+
+    assert pf.post_new_pet_simple({'key': 'abc'}, 'Joseph', 'dog', '5')[0] == 500
+    assert len(calls) == 1
+    assert pf.post_add_photo({'key': 'abc'}, '1', b'\xff\xd8\xff')[0] == 200
+    assert len(photo_calls) == 2
+
+
+@pytest.mark.negative
+def test_backoff_grows_and_budget_limits_retries(stub_transport):
+    """ Пауза удваивается между попытками, а бюджет не даёт повторять бесконечно """
+    handler, calls = flaky([503])
+    stub_transport.add('GET', 'api/pets', handler=handler)
+    delays = []
+    pf = make_client(stub_transport, max_attempts=4, jitter=False, sleep=delays.append, breaker=None,
+                     budget=RetryBudget(ratio=0, min_retries=5))
+
+    assert pf.get_list_of_pets({'key': 'abc'})[0] == 503
+    assert delays == [0.2, 0.4, 0.8]
+    assert pf.get_list_of_pets({'key': 'abc'})[0] == 503
+    # Из бюджета в 5 повторов на второй запрос осталось только 2
+    assert len(calls) == 4 + 3
+
+
+@pytest.mark.negative
+def test_circuit_breaker_fails_fast_and_recovers(stub_transport):
+    """ После серии ошибок запросы не уходят на сервер, пока не пройдёт reset_timeout """
+    now = [0.0]
+    handler, calls = flaky([500, 500, 500, 200])
+    stub_transport.add('GET', 'api/pets', handler=handler)
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=lambda: now[0])
+    pf = make_client(stub_transport, max_attempts=1, breaker=breaker)
+
+    for _ in range(3):
+        assert pf.get_list_of_pets({'key': 'abc'})[0] == 500
+    with pytest.raises(CircuitOpenError):
+        pf.get_list_of_pets({'key': 'abc'})
+    assert len(calls) == 3
+
+    now[0] = 31
+    assert pf.get_list_of_pets({'key': 'abc'})[0] == 200
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.negative
+def test_half_open_trial_released_after_client_exception(stub_transport):
+    """ Пробный запрос, упавший не с OSError (например, промах кассеты), не блокирует автомат навсегда """
+    from cassette import CassetteMiss
+
+    now = [0.0]
+    handler, calls = flaky([500, 200])
+    stub_transport.add('GET', 'api/pets', handler=handler)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=lambda: now[0])
+    pf = make_client(stub_transport, max_attempts=1, breaker=breaker)
+    assert pf.get_list_of_pets({'key': 'abc'})[0] == 500
+
+    now[0] = 31
+    request = stub_transport.request
+
+    def miss(method, url, **kwargs):
+        raise CassetteMiss(method, 'api/pets')
+
+    stub_transport.request = miss
+    with pytest.raises(CassetteMiss):
+        pf.get_list_of_pets({'key': 'abc'})
+    stub_transport.request = request
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert pf.get_list_of_pets({'key': 'abc'})[0] == 200
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.negative
+def test_bad_photo_upload_does_not_open_breaker():
+    """ 500 сервера на не-картинку в set_photo не повторяется и не размыкает автомат """
+    from local_server import PetFriendsServer
+
+    with PetFriendsServer({'user@example.com': 'password'}) as server:
+        pf = PetFriends(base_url=server.base_url, retry=RetryPolicy(backoff=0.01))
+        auth_key = pf.credential('user@example.com', 'password')
+        _, pet = pf.post_new_pet_simple(auth_key, 'Барсик', 'cat', '2')
+        for _ in range(pf.retry.breaker.failure_threshold + 1):
+            assert pf.post_add_photo(auth_key, pet['id'], 'images/test.txt')[0] == 500
+        assert pf.get_list_of_pets(auth_key, 'my_pets')[0] == 200
+        assert server.requests[('POST', 'api/pets/set_photo')] == pf.retry.breaker.failure_threshold + 1
+        pf.close()
@@ -0,0 +1,64 @@
+import io
+import json
+
+import pytest
+from requests.models import Response
+
+from api import PetFriends
+from models import Pet
+from streaming import PetListingError, iter_json_items
+from tests.conftest import local_accounts
+
+
+def streaming_response(body: bytes, status: int = 200) -> Response:
+    """ Ответ, тело которого читается из raw кусками, как при stream=True """
+    res = Response()
+    res.status_code = status
+    res.raw = io.BytesIO(body)
+    res.encoding = 'utf-8'
+    return res
+
+
+@pytest.mark.positive
+@pytest.mark.parametrize('chunk_size', [1, 5, 64, 1 << 20])
+def test_items_are_parsed_across_any_chunk_boundaries(chunk_size):
+    pets = [{'id': str(i), 'name': 'Шарик "%d" \\ ✓' % i, 'age': i, 'pet_photo': 'A' * (i * 37)} for i in range(50)]
+    body = json.dumps({'pets': pets}, ensure_ascii=False).encode('utf-8')
+    chunks = (body[i:i + chunk_size] for i in range(0, len(body), chunk_size))
+    assert list(iter_json_items(chunks)) == pets
+
+
+@pytest.mark.negative
+@pytest.mark.parametrize('body', [b'{"pets": [{"id": "1"}, {"id"', b'{"error": "no pets"}'])
+def test_truncated_or_foreign_body_raises(body):
+    with pytest.raises(ValueError):
+        list(iter_json_items([body]))
+
+
+@pytest.mark.positive
+def test_iter_pets_streams_with_predicate_and_models(stub_transport):
+    body = json.dumps({'pets': [{'id': str(i), 'name': 'pet%d' % i, 'animal_type': 'cat' if i % 2 else 'dog',
+                                 'age': str(i)} for i in range(10)]}).encode('utf-8')
+    stub_transport.add('GET', 'api/pets', handler=lambda method, url, kwargs: streaming_response(body))
+    pf = PetFriends(transport=stub_transport)
+    cats = list(pf.iter_pets({'key': 'k'}, predicate=lambda pet: pet.animal_type == 'cat', as_models=True))
+    assert [pet.id for pet in cats] == ['1', '3', '5', '7', '9'] and isinstance(cats[0], Pet)
+    _, _, kwargs = stub_transport.calls[0]
+    assert kwargs['stream'] is True and kwargs['params'] == {'filter': ''}
+
+
+@pytest.mark.negative
+def test_iter_pets_raises_on_error_status(stub_transport):
+    stub_transport.add('GET', 'api/pets', handler=lambda method, url, kwargs: streaming_response(b'Forbidden', 403))
+    with pytest.raises(PetListingError) as error:
+        next(PetFriends(transport=stub_transport).iter_pets({'key': 'bad'}))
+    assert error.value.status == 403
+
+
+@pytest.mark.positive
+def test_iter_pets_matches_get_list_of_pets_on_local_server(local_pf):
+    (email, password), = local_accounts().items()
+    auth_key = local_pf.credential(email, password)
+    for filter in ('', 'my_pets'):
+        _, result = local_pf.get_list_of_pets(auth_key, filter)
+        assert list(local_pf.iter_pets(auth_key, filter, chunk_size=256)) == result['pets']
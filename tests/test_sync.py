@@ -0,0 +1,79 @@
+import pytest
+
+from sync import PetSync, plan_sync
+from tests.conftest import local_accounts
+
+
+def pet(pet_id, name, animal_type='cat', age='1', pet_photo=''):
+    return {'id': pet_id, 'name': name, 'animal_type': animal_type, 'age': age, 'pet_photo': pet_photo}
+
+
+@pytest.mark.positive
+def test_plan_matches_by_fields_then_name_and_prunes_the_rest():
+    current = [pet('a', 'Tom'), pet('b', 'Rex', 'dog', '3'), pet('c', 'Old'), pet('d', 'Tom')]
+    desired = [{'name': 'Tom', 'animal_type': 'cat', 'age': 1},
+               {'name': 'Rex', 'animal_type': 'dog', 'age': '4'},
+               {'name': 'New', 'animal_type': 'cat', 'age': '2'},
+               {'id': 'c', 'name': 'Renamed', 'animal_type': 'cat', 'age': '1'}]
+    plan = plan_sync(current, desired)
+    assert plan.unchanged == 1
+    assert sorted((pet_id, spec['name']) for pet_id, spec in plan.updates) == [('b', 'Rex'), ('c', 'Renamed')]
+    assert [spec['name'] for spec in plan.creates] == ['New']
+    assert len(plan.deletes) == 1 and plan.deletes[0] in ('a', 'd')
+    assert plan_sync(current, desired, prune=False).deletes == []
+
+
+@pytest.mark.negative
+def test_plan_gives_explicit_id_priority_over_field_match():
+    """ Описание без id не забирает питомца, которого более позднее описание называет по id """
+    current = [pet('x', 'a')]
+    desired = [{'name': 'a', 'animal_type': 'cat', 'age': '1'},
+               {'id': 'x', 'name': 'b', 'animal_type': 'cat', 'age': '1'}]
+    plan = plan_sync(current, desired)
+    assert [(pet_id, spec['name']) for pet_id, spec in plan.updates] == [('x', 'b')]
+    assert [spec['name'] for spec in plan.creates] == ['a']
+    assert plan.unchanged == 0 and plan.deletes == []
+
+
+@pytest.mark.positive
+def test_plan_sets_photo_only_when_content_differs():
+    import base64
+    with open('images/cat1.jpg', 'rb') as f:
+        uri = 'data:image/jpeg;base64,' + base64.b64encode(f.read()).decode('ascii')
+    current = [pet('a', 'Same', pet_photo=uri), pet('b', 'Other', pet_photo=uri), pet('c', 'None')]
+    desired = [{'name': 'Same', 'animal_type': 'cat', 'age': '1', 'pet_photo': 'images/cat1.jpg'},
+               {'name': 'Other', 'animal_type': 'cat', 'age': '1', 'pet_photo': 'images/cat2.png'},
+               {'name': 'None', 'animal_type': 'cat', 'age': '1', 'pet_photo': 'images/cat1.jpg'}]
+    plan = plan_sync(current, desired)
+    assert sorted(plan.photos) == [('b', 'images/cat2.png'), ('c', 'images/cat1.jpg')]
+    assert plan.unchanged == 3 and not plan.updates and not plan.creates
+
+
+@pytest.mark.positive
+def test_sync_against_local_server_converges(petfriends_server):
+    from api import PetFriends
+    (email, password), = local_accounts().items()
+    with PetFriends(base_url=petfriends_server.base_url) as pf:
+        auth_key = pf.credential(email, password)
+        status, stale = pf.post_new_pet_simple(auth_key, 'SyncStale', 'cat', '1')
+        assert status == 200
+        _, mine = pf.get_list_of_pets(auth_key, 'my_pets')
+        desired = [{'id': pet['id'], 'name': pet['name'], 'animal_type': pet['animal_type'], 'age': pet['age']}
+                   for pet in mine['pets'] if pet['id'] != stale['id']]
+        desired += [{'name': 'Sync%d' % i, 'animal_type': 'dog', 'age': str(i)} for i in range(20)]
+        desired.append({'name': 'SyncPhoto', 'animal_type': 'cat', 'age': '2', 'pet_photo': 'images/cat1.jpg'})
+
+        syncer = PetSync(pf, auth_key, workers=4)
+        plan, results = syncer.sync(desired, dry_run=True)
+        assert plan.as_dict()['create'] == 21 and plan.deletes == [stale['id']] and results == []
+
+        plan, results = syncer.sync(desired)
+        assert len(results) == len(plan) == 22
+        assert all(status == 200 for _, _, status, _ in results)
+        assert syncer.summary.ok == 22
+
+        plan = syncer.plan(desired)
+        assert len(plan) == 0 and plan.unchanged == len(desired)
+        for name in ['Sync%d' % i for i in range(20)] + ['SyncPhoto']:
+            pf.delete_pet(auth_key, next(p['id'] for p in pf.get_list_of_pets(auth_key, 'my_pets')[1]['pets']
+                                          if p['name'] == name))
@@ -0,0 +1,44 @@
+from api import PetFriends
+from transport import HttpTransport
+import pytest
+
+
+@pytest.mark.positive
+def test_all_methods_use_injected_transport(stub_transport):
+    """ Все семь методов клиента идут через переданный транспорт и сохраняют контракт (status, result) """
+    stub_transport.add('GET', 'api/key', body={'key': 'abc'})
+    stub_transport.add('GET', 'api/pets', body={'pets': []})
+    stub_transport.add('POST', 'api/pets', body={'name': 'Hitch', 'pet_photo': ''})
+    stub_transport.add('POST', 'api/pets/set_photo/', body={'pet_photo': 'data:image/jpeg;base64,'})
+    stub_transport.add('POST', 'api/create_pet_simple', body={'name': 'Joseph'})
+    stub_transport.add('PUT', 'api/pets/', body={'name': 'Hitchcock'})
+    stub_transport.add('DELETE', 'api/pets/', body='')
+    pf = PetFriends(base_url='http://stub/', transport=stub_transport)
+
+    _, auth_key = pf.get_api_key('email', 'password')
+    assert auth_key == {'key': 'abc'}
+    assert pf.get_list_of_pets(auth_key, 'my_pets') == (200, {'pets': []})
+    assert pf.post_new_pet(auth_key, 'Hitch', 'cat', '10', 'images/cat1.jpg')[1]['name'] == 'Hitch'
+    assert pf.post_add_photo(auth_key, '1', 'images/cat1.jpg')[0] == 200
+    assert pf.post_new_pet_simple(auth_key, 'Joseph', 'dog', '5')[1]['name'] == 'Joseph'
+    assert pf.put_update_pet(auth_key, '1', 'Hitchcock', 'old_cat', 18)[1]['name'] == 'Hitchcock'
+    # Пустое тело при удалении возвращается строкой, как и раньше
+    assert pf.delete_pet(auth_key, '1') == (200, '')
+
+    assert len(stub_transport.calls) == 7
+    assert all(url.startswith('http://stub/api/') for _, url, _ in stub_transport.calls)
+    assert stub_transport.calls[1][2]['headers'] == {'auth_key': 'abc'}
+
+    pf.close()
+    assert stub_transport.closed
+
+
+@pytest.mark.positive
+def test_http_transport_shares_one_pooled_session():
+    """ HttpTransport держит одну сессию с адаптером нужного размера пула и таймаутами по умолчанию """
+    transport = HttpTransport(pool_maxsize=32, connect_timeout=3, read_timeout=20)
+    adapter = transport.session.get_adapter('https://petfriends.skillfactory.ru/')
+    assert adapter._pool_maxsize == 32
+    assert transport.timeout == (3, 20)
+    assert PetFriends(transport=transport).transport.session is transport.session
+    transport.close()
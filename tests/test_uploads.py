@@ -0,0 +1,153 @@
+from api import PetFriends
+from tests.conftest import make_response
+from uploads import PhotoUpload, guess_content_type
+import io
+import os
+import pytest
+
+
+def read_upload(stub_transport, path):
+    """ Заглушка загрузки: вычитывает тело multipart кусками по 8 КБ, как это делает http.client """
+    bodies = []
+
+    def handler(method, url, kwargs):
+        data, chunks = kwargs['data'], []
+        while True:
+            chunk = data.read(8192)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        bodies.append((kwargs['headers']['Content-Type'], b''.join(chunks)))
+        return make_response(200, {'pet_photo': 'data:image/png;base64,'})
+
+    stub_transport.add('POST', path, handler=handler)
+    return bodies
+
+
+def open_fds() -> int:
+    return len(os.listdir('/proc/self/fd'))
+
+
+@pytest.mark.positive
+@pytest.mark.skipif(not os.path.isdir('/proc/self/fd'), reason='нужен /proc для подсчёта дескрипторов')
+def test_post_add_photo_streams_and_releases_file(stub_transport):
+    """ Фото уходит целиком, с типом по содержимому файла, а дескрипторы не утекают """
+    bodies = read_upload(stub_transport, 'api/pets/set_photo/')
+    pf = PetFriends(base_url='http://stub/', transport=stub_transport)
+    photo_path = os.path.join(os.path.dirname(__file__), 'images', 'cat1.png')
+    with open(photo_path, 'rb') as f:
+        photo = f.read()
+    progress = []
+
+    fds = open_fds()
+    for _ in range(20):
+        status, _ = pf.post_add_photo({'key': 'abc'}, '1', photo_path,
+                                      progress=lambda sent, total, elapsed: progress.append((sent, total)))
+        assert status == 200
+    assert open_fds() == fds
+
+    content_type, body = bodies[-1]
+    assert content_type.startswith('multipart/form-data')
+    assert b'Content-Type: image/png' in body
+    assert photo in body
+    assert progress[-1] == (len(photo), len(photo))
+
+
+@pytest.mark.positive
+def test_photo_upload_accepts_buffers_and_open_files():
+    """ Источником фото может быть bytes, memoryview или уже открытый файл - он остаётся открытым """
+    jpeg = b'\xff\xd8\xff\xe0' + b'0' * 100
+    for source in (jpeg, memoryview(jpeg), bytearray(jpeg)):
+        with PhotoUpload(source) as photo:
+            assert photo.content_type == 'image/jpeg'
+            assert bytes(photo.read(10)) + bytes(photo.read()) == jpeg
+
+    buffer = io.BytesIO(jpeg)
+    with PhotoUpload(buffer) as photo:
+        assert photo.len == len(jpeg)
+    assert not buffer.closed
+
+
+@pytest.mark.positive
+def test_guess_content_type_by_signature_and_name():
+    """ Тип определяется по сигнатуре, а для нераспознанных данных - по расширению """
+    assert guess_content_type(b'\x89PNG\r\n\x1a\n....', 'cat.jpg') == 'image/png'
+    assert guess_content_type(b'text', 'images/test.txt') == 'text/plain'
+    assert guess_content_type(b'text') == 'application/octet-stream'
+
+
+class ChunkedReader(io.RawIOBase):
+    """ Файл без дескриптора, который запоминает размер самого большого прочитанного куска """
+
+    def __init__(self, data: bytes, seekable: bool):
+        self._data = io.BytesIO(data)
+        self._seekable = seekable
+        self.largest = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return self._seekable
+
+    def readinto(self, buffer):
+        count = self._data.readinto(buffer)
+        self.largest = max(self.largest, count)
+        return count
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._data.seek(offset, whence)
+
+    def tell(self):
+        return self._data.tell()
+
+
+@pytest.mark.additional_positive
+def test_photo_upload_streams_files_without_fileno_from_current_position(tmp_path):
+    """ Открытый файл отправляется с текущей позиции, а файл без дескриптора читается кусками """
+    jpeg = b'\xff\xd8\xff\xe0' + bytes(range(256)) * 1024
+    path = tmp_path / 'cat.jpg'
+    path.write_bytes(b'skip' + jpeg)
+    with open(path, 'rb') as f:
+        f.seek(4)
+        with PhotoUpload(f) as photo:
+            assert photo.content_type == 'image/jpeg' and bytes(photo.read()) == jpeg
+    buffer = io.BytesIO(b'skip' + jpeg)
+    buffer.seek(4)
+    with PhotoUpload(buffer) as photo:
+        assert photo.len == len(jpeg) and bytes(photo.read()) == jpeg
+
+    for seekable in (True, False):
+        reader = ChunkedReader(b'skip' + jpeg, seekable)
+        reader.read(4)
+        with PhotoUpload(reader) as photo:
+            assert photo.content_type == 'image/jpeg' and photo.total == len(jpeg)
+            assert not seekable or reader.tell() == 4
+            for _ in range(2):
+                photo.rewind()
+                chunks = iter(lambda: bytes(photo.read(8192)), b'')
+                assert b''.join(chunks) == jpeg
+        assert not reader.closed
+        assert reader.largest < len(jpeg)
+
+
+@pytest.mark.additional_positive
+def test_preprocessed_photo_is_closed_after_upload(stub_transport):
+    """ PhotoUpload, который вернул preprocessor.prepare(), закрывается после отправки """
+    closed = []
+
+    class TrackedUpload(PhotoUpload):
+        def close(self):
+            closed.append(self)
+            super().close()
+
+    class Preprocessor:
+        def prepare(self, source):
+            return TrackedUpload(source)
+
+    read_upload(stub_transport, 'api/pets/set_photo/')
+    read_upload(stub_transport, 'api/pets')
+    pf = PetFriends(base_url='http://stub/', transport=stub_transport, preprocessor=Preprocessor())
+    assert pf.post_add_photo({'key': 'abc'}, '1', b'\xff\xd8\xff\xe0')[0] == 200
+    assert pf.post_new_pet({'key': 'abc'}, 'Барсик', 'cat', '2', b'\xff\xd8\xff\xe0')[0] == 200
+    assert len(closed) == 2
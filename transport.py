@@ -0,0 +1,59 @@
+import threading
+
+
+class HttpTransport:
+    """ Транспорт для PetFriends: одна общая сессия requests с пулом keep-alive соединений.
+    Соединения к base_url переиспользуются между запросами, поэтому TCP+TLS рукопожатие
+    выполняется один раз на соединение, а не на каждый вызов API.
+
+    pool_connections - сколько разных хостов держать в пуле,
+    pool_maxsize - сколько соединений держать открытыми к одному хосту
+    (имеет смысл ставить не меньше числа потоков, работающих с клиентом),
+    connect_timeout / read_timeout - таймауты установки соединения и чтения ответа в секундах,
+    keep_alive=False - закрывать соединение после каждого ответа (старое поведение).
+    requests импортируется и сессия создаётся при первом запросе, а не при создании транспорта,
+    поэтому import api и PetFriends() не замедляют запуск коротких скриптов"""
+
+    def __init__(self, pool_connections: int = 4, pool_maxsize: int = 16, connect_timeout: float = 10,
+                 read_timeout: float = 60, keep_alive: bool = True):
+        self.timeout = (connect_timeout, read_timeout)
+        self.keep_alive = keep_alive
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        """ Сессия requests с пулом соединений; создаётся при первом обращении """
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize,
+                                          pool_block=False)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    if not self.keep_alive:
+                        session.headers['Connection'] = 'close'
+                    self._session = session
+        return self._session
+
+    def request(self, method: str, url: str, **kwargs):
+        """ Выполняет HTTP-запрос через общую сессию и возвращает объект requests.Response """
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def close(self):
+        """ Закрывает все соединения пула """
+        if self._session is not None:
+            self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,157 @@
+import io
+import mmap
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+# Сигнатуры форматов по первым байтам файла: расширение может не совпадать с содержимым
+_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+)
+
+
+def guess_content_type(head: bytes, filename: str = None) -> str:
+    """ Определяет Content-Type по первым байтам файла, а если формат не распознан - по имени файла """
+    for signature, content_type in _SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if filename:
+        import mimetypes
+
+        content_type, _ = mimetypes.guess_type(filename)
+        if content_type:
+            return content_type
+    return 'application/octet-stream'
+
+
+class PhotoUpload:
+    """ Источник фото для загрузки на сервер без чтения файла целиком в память.
+    source - путь к файлу (файл отображается в память через mmap), bytes/bytearray/memoryview
+    или любой объект с buffer protocol, либо уже открытый бинарный файл (BytesIO, файл на диске
+    или любой объект с read). Открытый файл отправляется с текущей позиции (file.tell()), а не с начала.
+    MultipartEncoder читает объект кусками по мере отправки, поэтому расход памяти не зависит
+    от размера фото. progress(sent, total, elapsed) вызывается после каждого отданного куска.
+    Открытые самим PhotoUpload файлы и mmap закрываются в close() / при выходе из with,
+    переданный снаружи открытый файл остаётся открытым """
+
+    def __init__(self, source, filename: str = None, content_type: str = None, progress=None):
+        self._file = None
+        self._mmap = None
+        self._stream = None
+        if isinstance(source, (str, os.PathLike)):
+            filename = filename or os.fspath(source)
+            self._file = open(source, 'rb')
+            view = self._map(self._file)
+        elif hasattr(source, 'read'):
+            filename = filename or getattr(source, 'name', None)
+            view = self._map(source)
+        else:
+            view = memoryview(source).cast('B')
+
+        self._view = view
+        self._pos = 0
+        if view is not None:
+            self.total = view.nbytes
+            head = bytes(view[:16])
+        else:
+            head = self._stream.read(16)
+            self._stream.seek(self._start)
+        self.filename = filename if isinstance(filename, str) else 'pet_photo'
+        self.content_type = content_type or guess_content_type(head, self.filename)
+        self.progress = progress
+        self._started = None
+
+    def _map(self, file):
+        """ Возвращает содержимое открытого файла с текущей позиции как memoryview без копирования.
+        Файл без дескриптора, поддерживающий seek, читается кусками прямо в read() (тогда возвращается
+        None), а поток без seek сначала кусками копируется во временный файл на диске """
+        if hasattr(file, 'getbuffer'):
+            return file.getbuffer()[file.tell():]
+        try:
+            fileno = file.fileno()
+        except (AttributeError, io.UnsupportedOperation):
+            if not (hasattr(file, 'seekable') and file.seekable()):
+                self._file = tempfile.TemporaryFile()
+                shutil.copyfileobj(file, self._file)
+                self._file.seek(0)
+                return self._map(self._file)
+            self._stream, self._start = file, file.tell()
+            self.total = file.seek(0, io.SEEK_END) - self._start
+            file.seek(self._start)
+            return None
+        start = file.tell()
+        if os.fstat(fileno).st_size <= start:
+            return memoryview(b'')
+        self._mmap = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+        return memoryview(self._mmap)[start:]
+
+    @property
+    def len(self) -> int:
+        """ Сколько байт осталось отдать - этот атрибут использует MultipartEncoder """
+        return self.total - self._pos
+
+    def read(self, size: int = -1) -> memoryview:
+        if self._started is None:
+            self._started = time.perf_counter()
+        end = self.total if size is None or size < 0 else min(self.total, self._pos + size)
+        chunk = self._view[self._pos:end] if self._stream is None else self._stream.read(end - self._pos)
+        self._pos = end
+        if self.progress is not None:
+            self.progress(self._pos, self.total, time.perf_counter() - self._started)
+        return chunk
+
+    def rewind(self):
+        """ Возвращает чтение в начало - для повторной отправки того же фото """
+        self._pos = 0
+        self._started = None
+        if self._stream is not None:
+            self._stream.seek(self._start)
+
+    def field(self) -> tuple:
+        """ Кортеж (filename, file, content_type) для поля pet_photo в MultipartEncoder """
+        return self.filename, self, self.content_type
+
+    def close(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._stream = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+@contextmanager
+def open_photo(source, progress=None, owned: bool = False):
+    """ Отдаёт PhotoUpload для source. Если source уже PhotoUpload, он возвращается как есть
+    и закрывать его должен вызывающий код, а при owned=True он закрывается на выходе из with,
+    как и объект, созданный здесь """
+    if isinstance(source, PhotoUpload):
+        if progress is not None:
+            source.progress = progress
+        source.rewind()
+        try:
+            yield source
+        finally:
+            if owned:
+                source.close()
+        return
+    with PhotoUpload(source, progress=progress) as photo:
+        yield photo